@@ -1,17 +1,30 @@
 # admin.py
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .manifest import import_manifest
 from .models import Delivery, DeliveryItem
+from unit.filters import LazyFilterMixin, LazyRelatedFieldListFilter
+from unit.paginators import KeysetPaginationMixin
 
 class DeliveryItemInline(admin.TabularInline):
     model = DeliveryItem
     extra = 0
-    fields = ('product', 'request_item', 'quantity_expected', 'quantity_received', 'price_per_unit')
-    readonly_fields = ('quantity_expected',)
-    raw_id_fields = ('product', 'request_item')
+    fields = ('product', 'request_item', 'quantity_expected', 'quantity_received', 'price_per_unit', 'received_at')
+    readonly_fields = ('quantity_expected', 'received_at')
+    # Варианты подгружаются постранично по мере ввода (поиск ProductAdmin / RequestItemAdmin)
+    autocomplete_fields = ('product', 'request_item')
+
+class ManifestImportForm(forms.Form):
+    manifest = forms.FileField(label='Файл манифеста (CSV или XLSX)')
+
 
 @admin.register(Delivery)
 class DeliveryAdmin(admin.ModelAdmin):
-    list_display = ('id', 'delivery_date', 'supplier', 'status', 'total_products')
+    list_display = ('id', 'delivery_date', 'supplier', 'status', 'total_products', 'manifest_link')
     list_filter = ('delivery_date', 'supplier', 'is_confirmed')
     search_fields = ('id', 'supplier__name')
     date_hierarchy = 'delivery_date'
@@ -22,19 +35,102 @@ class DeliveryAdmin(admin.ModelAdmin):
         return "Подтверждена" if obj.is_confirmed else "Ожидает"
     status.short_description = 'Статус'
 
+    def manifest_link(self, obj):
+        if obj.is_confirmed:
+            return "-"
+        url = reverse('admin:delivery_delivery_import_manifest', args=[obj.pk])
+        return format_html('<a href="{}">📄 Импорт манифеста</a>', url)
+    manifest_link.short_description = 'Манифест'
+
+    def get_urls(self):
+        return [
+            path(
+                '<path:object_id>/import-manifest/',
+                self.admin_site.admin_view(self.import_manifest_view),
+                name='delivery_delivery_import_manifest'
+            ),
+        ] + super().get_urls()
+
+    def import_manifest_view(self, request, object_id):
+        delivery = get_object_or_404(Delivery, pk=object_id)
+        if not self.has_change_permission(request, delivery):
+            return redirect('admin:delivery_delivery_changelist')
+
+        form = ManifestImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            manifest = form.cleaned_data['manifest']
+            try:
+                result = import_manifest(delivery, manifest.file, manifest.name)
+            except ValidationError as error:
+                form.add_error('manifest', error)
+            else:
+                self.message_user(
+                    request,
+                    f"Создано позиций: {result.imported}, отклонено строк: {result.rejected}",
+                    messages.WARNING if result.rejected else messages.SUCCESS
+                )
+                for line_number, message in result.errors:
+                    self.message_user(request, f"Строка {line_number}: {message}", messages.ERROR)
+                return redirect('admin:delivery_delivery_change', delivery.pk)
+
+        return render(request, 'admin/delivery/import_manifest.html', {
+            **self.admin_site.each_context(request),
+            'form': form,
+            'delivery': delivery,
+            'opts': self.model._meta,
+        })
+
+    def save_model(self, request, obj, form, change):
+        try:
+            super().save_model(request, obj, form, change)
+        except ValidationError:
+            # Приёмка (сигнал post_save) не прошла - она повторяется в save_related
+            # после сохранения позиций, там же сообщается ошибка и снимается подтверждение
+            pass
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Позиции из инлайна сохраняются после самой поставки - принимаем их здесь
+        if form.instance.is_confirmed:
+            try:
+                form.instance.receive()
+            except ValidationError as error:
+                # Как в Delivery.confirm(): без приёмки поставка остаётся неподтверждённой
+                # и её можно подтвердить повторно (в т.ч. действием confirm_delivery)
+                Delivery.objects.filter(pk=form.instance.pk).update(is_confirmed=False)
+                form.instance.is_confirmed = False
+                self.message_user(request, self._receive_error(form.instance, error), messages.ERROR)
+
     def total_products(self, obj):
         return obj.items.count()
     total_products.short_description = 'Товаров'
 
     def confirm_delivery(self, request, queryset):
-        queryset.update(is_confirmed=True)
+        # update() обошёл бы приёмку - подтверждаем каждую поставку через save()
+        confirmed = 0
+        for delivery in queryset.filter(is_confirmed=False):
+            try:
+                delivery.confirm()
+            except ValidationError as error:
+                # Остальные поставки подтверждаются дальше
+                self.message_user(request, self._receive_error(delivery, error), messages.ERROR)
+            else:
+                confirmed += 1
+        if confirmed:
+            self.message_user(request, f"Подтверждено поставок: {confirmed}", messages.SUCCESS)
     confirm_delivery.short_description = "Подтвердить выбранные поставки"
 
+    @staticmethod
+    def _receive_error(delivery, error):
+        return f"{delivery}: приёмка не выполнена - {' '.join(error.messages)}"
+
 @admin.register(DeliveryItem)
-class DeliveryItemAdmin(admin.ModelAdmin):
-    list_display = ('delivery', 'product', 'quantity_expected', 'quantity_received', 'status')
-    list_filter = ('delivery__delivery_date', 'product')
-    raw_id_fields = ('product', 'request_item')
+class DeliveryItemAdmin(LazyFilterMixin, KeysetPaginationMixin, admin.ModelAdmin):
+    list_display = ('delivery', 'product', 'quantity_expected', 'quantity_received', 'status', 'received_at')
+    list_select_related = ('delivery', 'product')
+    ordering = ('-id',)  # сортировка по ключу - для постраничного поиска без OFFSET
+    list_filter = ('delivery__delivery_date', ('product', LazyRelatedFieldListFilter))
+    autocomplete_fields = ('product', 'request_item')
 
     def status(self, obj):
         if obj.quantity_received == 0:
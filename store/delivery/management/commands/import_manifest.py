@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from delivery.manifest import import_manifest
+from delivery.models import Delivery
+
+
+class Command(BaseCommand):
+    help = 'Импортирует манифест поставщика (CSV/XLSX) в позиции поставки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('delivery_id', type=int, help='ID поставки')
+        parser.add_argument('path', help='Путь к файлу манифеста')
+        parser.add_argument(
+            '--report', help='Файл для отчёта об отклонённых строках (CSV); по умолчанию - stderr'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Строк в одной порции')
+
+    def handle(self, *args, **options):
+        try:
+            delivery = Delivery.objects.get(pk=options['delivery_id'])
+        except Delivery.DoesNotExist:
+            raise CommandError(f"Поставка #{options['delivery_id']} не найдена")
+
+        path = Path(options['path'])
+        report = open(options['report'], 'w', newline='', encoding='utf-8') if options['report'] else sys.stderr
+        try:
+            with path.open('rb') as file:
+                result = import_manifest(delivery, file, path.name, report=report, chunk_size=options['chunk_size'])
+        except ValidationError as error:
+            raise CommandError('; '.join(error.messages))
+        finally:
+            if report is not sys.stderr:
+                report.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано позиций: {result.imported}, отклонено строк: {result.rejected}"
+        ))
@@ -0,0 +1,210 @@
+# manifest.py
+"""
+Импорт манифеста поставщика (CSV или XLSX) в позиции поставки.
+
+Файл читается потоком порциями по chunk_size строк, поэтому память не растёт
+с размером файла. Коды товаров и открытые позиции заявок загружаются в словари
+один раз на импорт. Строки с ошибками не прерывают импорт: они считаются и,
+если передан report, записываются в него CSV-строками (номер строки, причина).
+
+Колонки (первая строка - заголовок, регистр не важен):
+    код / артикул / code           - код товара (обязательно)
+    количество / quantity          - количество в поставке (обязательно)
+    цена / price                   - цена за единицу (обязательно)
+    заявка / request               - номер заявки (необязательно)
+"""
+import csv
+import io
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from goods.models import Product
+from request.models import RequestItem
+from .models import DeliveryItem
+
+ManifestImportResult = namedtuple('ManifestImportResult', ['imported', 'rejected', 'errors'])
+
+COLUMN_ALIASES = {
+    'code': {'code', 'код', 'код товара', 'артикул'},
+    'quantity': {'quantity', 'qty', 'количество', 'кол-во'},
+    'price': {'price', 'цена', 'цена за единицу'},
+    'request': {'request', 'заявка', 'номер заявки'},
+}
+REQUIRED_COLUMNS = ('code', 'quantity', 'price')
+
+# Сколько ошибок сохраняется в результате для показа пользователю
+ERRORS_SAMPLE_SIZE = 20
+
+
+def import_manifest(delivery, file, filename, report=None, chunk_size=1000):
+    """
+    Загружает манифест file (двоичный файл) в поставку delivery одной транзакцией.
+    Формат определяется по расширению filename. Возвращает ManifestImportResult.
+    """
+    if delivery.is_confirmed:
+        raise ValidationError('Поставка уже подтверждена - импорт манифеста невозможен')
+    with transaction.atomic():
+        return _import_rows(delivery, file, filename, report, chunk_size)
+
+
+def _import_rows(delivery, file, filename, report, chunk_size):
+    rows = _read_rows(file, filename)
+    columns = _parse_header(next(rows, None))
+    products, request_items = _build_lookups()
+    report_writer = csv.writer(report) if report is not None else None
+
+    imported = rejected = 0  # imported - число созданных позиций поставки
+    errors = []
+    line_number = 1
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        items = []
+        for row in chunk:
+            line_number += 1
+            if not any(value not in (None, '') for value in row):
+                continue
+            try:
+                items.extend(_build_items(delivery, row, columns, products, request_items))
+            except ValidationError as error:
+                rejected += 1
+                message = '; '.join(error.messages)
+                if len(errors) < ERRORS_SAMPLE_SIZE:
+                    errors.append((line_number, message))
+                if report_writer:
+                    report_writer.writerow([line_number, message])
+        DeliveryItem.objects.bulk_create(items)
+        imported += len(items)
+
+    return ManifestImportResult(imported, rejected, errors)
+
+
+def _read_rows(file, filename):
+    """Итератор строк файла (списки значений)"""
+    if filename.lower().endswith('.xlsx'):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ValidationError('Для импорта XLSX установите пакет openpyxl')
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        return workbook.active.iter_rows(values_only=True)
+    if filename.lower().endswith('.csv'):
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        return csv.reader(text, dialect)
+    raise ValidationError('Поддерживаются манифесты в формате CSV и XLSX')
+
+
+def _parse_header(header):
+    """{колонка: индекс} по строке заголовка"""
+    if header is None:
+        raise ValidationError('Файл манифеста пуст')
+    columns = {}
+    for index, title in enumerate(header):
+        title = str(title or '').strip().lower()
+        for column, aliases in COLUMN_ALIASES.items():
+            if title in aliases:
+                columns.setdefault(column, index)
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValidationError(f"В манифесте нет колонок: {', '.join(missing)}")
+    return columns
+
+
+def _build_lookups():
+    """
+    Словари для разбора строк, загружаемые один раз на импорт:
+    {код товара: id товара} и {(id заявки, id товара): [(id, количество) открытых позиций заявки]}.
+    Открытая позиция - в незавершённой заявке, её единицы ждут поставки и
+    позиция ещё не привязана к другой позиции поставки.
+    """
+    products = dict(Product.objects.values_list('code', 'pk'))
+    request_items = {}
+    open_items = RequestItem.objects.filter(
+        request__is_completed=False,
+        deliveryitem__isnull=True
+    ).filter(
+        Q(units__status='in_request') | Q(product_unit__status='in_request')
+    ).distinct().order_by('pk').values_list('pk', 'quantity', 'request_id', 'product_id')
+    for item_id, quantity, request_id, product_id in open_items:
+        request_items.setdefault((request_id, product_id), []).append((item_id, quantity))
+    return products, request_items
+
+
+def _number(text):
+    """Конечное число из ячейки; бесконечность и NaN - не числа (InvalidOperation)"""
+    number = Decimal(text.replace(',', '.').replace(' ', ''))
+    if not number.is_finite():
+        raise InvalidOperation(text)
+    return number
+
+
+def _build_items(delivery, row, columns, products, request_items):
+    """
+    Позиции поставки по строке манифеста (ValidationError - строка отклоняется).
+    Строка с номером заявки делится по открытым позициям этой заявки (по одной
+    позиции поставки на позицию заявки), остаток сверх заявки - отдельной позицией.
+    """
+    def value(column):
+        index = columns.get(column)
+        cell = row[index] if index is not None and index < len(row) else None
+        return str(cell).strip() if cell is not None else ''
+
+    code = value('code')
+    product_id = products.get(code)
+    if product_id is None:
+        raise ValidationError(f'Неизвестный код товара "{code}"')
+
+    try:
+        quantity = int(_number(value('quantity')))
+        price = _number(value('price'))
+        if quantity < 1:
+            raise ValidationError('Количество не может быть меньше 1')
+        if price <= 0:
+            raise ValidationError('Цена должна быть положительной')
+    except (InvalidOperation, ValueError):
+        raise ValidationError('Количество и цена должны быть числами')
+
+    # Ожидаемое количество - по манифесту; полученное предзаполняется им же
+    # и исправляется кладовщиком при пересчёте до подтверждения поставки
+    def item(count, request_item_id=None):
+        return DeliveryItem(
+            delivery=delivery,
+            product_id=product_id,
+            request_item_id=request_item_id,
+            quantity_expected=count,
+            quantity_received=count,
+            price_per_unit=price
+        )
+
+    request_number = value('request')
+    if not request_number:
+        return [item(quantity)]
+
+    try:
+        request_id = int(_number(request_number))
+    except (InvalidOperation, ValueError):
+        raise ValidationError(f'Неверный номер заявки "{request_number}"')
+    open_items = request_items.get((request_id, product_id))
+    if not open_items:
+        raise ValidationError(f'В заявке #{request_id} нет открытых позиций товара "{code}"')
+
+    items = []
+    while open_items and open_items[0][1] <= quantity:
+        request_item_id, count = open_items.pop(0)
+        items.append(item(count, request_item_id))
+        quantity -= count
+    if quantity:
+        items.append(item(quantity))
+    return items
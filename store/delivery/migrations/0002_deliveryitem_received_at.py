@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:20
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_confirmed_items_received(apps, schema_editor):
+    # Позиции уже подтверждённых поставок были обработаны прежней приёмкой
+    DeliveryItem = apps.get_model('delivery', 'DeliveryItem')
+    DeliveryItem.objects.filter(delivery__is_confirmed=True).update(received_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryitem',
+            name='received_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Принята'),
+        ),
+        migrations.RunPython(mark_confirmed_items_received, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 # models.py
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
+from django.db.models import Case, Value, When
 from django.utils import timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -17,6 +18,9 @@ class Delivery(models.Model):
     is_confirmed = models.BooleanField('Подтверждена', default=False)
     notes = models.TextField('Примечания', blank=True)
 
+    # Единиц в одном UPDATE при приёмке (лимит параметров SQLite)
+    RECEIVE_CHUNK_SIZE = 2000
+
     class Meta:
         verbose_name = 'Поставка'
         verbose_name_plural = 'Поставки'
@@ -29,6 +33,139 @@ class Delivery(models.Model):
         if self.delivery_date > timezone.now().date():
             raise ValidationError('Дата поставки не может быть в будущем')
 
+    def confirm(self):
+        """
+        Подтверждение поставки (приёмка выполняется сигналом post_save).
+        Если приёмка не прошла, поставка остаётся неподтверждённой.
+        """
+        if not self.is_confirmed:
+            try:
+                with transaction.atomic():
+                    self.is_confirmed = True
+                    self.save()
+            except ValidationError:
+                self.is_confirmed = False
+                raise
+
+    def receive(self):
+        """
+        Приёмка всех ещё не принятых позиций поставки одной транзакцией.
+        Повторный вызов ничего не делает: принятая позиция помечается received_at.
+
+        Единицы в статусе in_request распределяются по позициям в порядке
+        очереди (created_at, id): позиция со ссылкой на заявку забирает единицы
+        своей позиции заявки, остальные - самые ранние единицы товара. Полученное
+        сверх найденных единиц создаётся как extra_add_delivery. Число запросов
+        не зависит от количества позиций (растёт только с порциями RECEIVE_CHUNK_SIZE).
+
+        Параллельные приёмки: строка поставки и очередь единиц её товаров
+        блокируются (SELECT ... FOR UPDATE), а все UPDATE условные - если единицу
+        или позицию уже забрала другая приёмка, транзакция откатывается с
+        ValidationError и подтверждение можно повторить.
+        """
+        from unit.models import ProductUnit
+
+        with transaction.atomic():
+            # Приёмки одной поставки выполняются строго по очереди
+            list(Delivery.objects.select_for_update().filter(pk=self.pk).values_list('pk'))
+            pending = self.items.filter(received_at__isnull=True)
+            items = list(pending.order_by('pk').values(
+                'pk', 'product_id', 'request_item_id', 'request_item__product_unit_id', 'quantity_received'
+            ))
+            if not items:
+                return
+
+            queue = ProductUnit.objects.select_for_update().filter(
+                status='in_request',
+                product_id__in=pending.values('product_id')
+            ).order_by('created_at', 'pk').values_list('pk', 'product_id', 'request_item_id')
+
+            allocation, surplus = self._allocate(items, queue)
+
+            claimed = DeliveryItem.objects.filter(
+                pk__in=[item['pk'] for item in items], received_at__isnull=True
+            ).update(received_at=timezone.now())
+            if claimed != len(items):
+                raise ValidationError('Позиции поставки уже приняты другой приёмкой - повторите подтверждение')
+
+            unit_ids = list(allocation)
+            for start in range(0, len(unit_ids), self.RECEIVE_CHUNK_SIZE):
+                chunk = {unit_id: allocation[unit_id] for unit_id in unit_ids[start:start + self.RECEIVE_CHUNK_SIZE]}
+                result = ProductUnit.objects.filter(pk__in=list(chunk), status='in_request').transition(
+                    'in_delivery',
+                    delivery_date=self.delivery_date,
+                    delivery_item=Case(
+                        *[When(pk__in=item_unit_ids, then=Value(item_id))
+                          for item_id, item_unit_ids in _group_by_value(chunk).items()],
+                        output_field=models.BigIntegerField()
+                    )
+                )
+                if result.moved != len(chunk):
+                    raise ValidationError('Единицы заявки уже распределены другой приёмкой - повторите подтверждение')
+            ProductUnit.objects.bulk_create([
+                ProductUnit(
+                    product_id=product_id,
+                    status='extra_add_delivery',
+                    is_extra_add_delivery_item=True,
+                    delivery_date=self.delivery_date,
+                    delivery_item_id=item_id
+                )
+                for item_id, product_id, count in surplus
+                for _ in range(count)
+            ], batch_size=1000)
+
+    @staticmethod
+    def _allocate(items, queue):
+        """
+        Распределение очереди единиц по позициям поставки.
+        Возвращает ({unit_id: delivery_item_id}, [(delivery_item_id, product_id, излишек)]).
+        """
+        unit_products = {}
+        by_request_item = {}
+        by_product = {}
+        for unit_id, product_id, request_item_id in queue:
+            unit_products[unit_id] = product_id
+            if request_item_id:
+                by_request_item.setdefault(request_item_id, []).append(unit_id)
+            by_product.setdefault(product_id, []).append(unit_id)
+
+        allocation = {}
+        remaining = {item['pk']: item['quantity_received'] for item in items}
+
+        # Сначала позиции, привязанные к заявке: единицы этой позиции заявки
+        for item in items:
+            if not item['request_item_id']:
+                continue
+            linked = by_request_item.get(item['request_item_id'], [])
+            if item['request_item__product_unit_id']:
+                linked = linked + [item['request_item__product_unit_id']]
+            for unit_id in linked:
+                if not remaining[item['pk']]:
+                    break
+                if unit_id not in allocation and unit_products.get(unit_id) == item['product_id']:
+                    allocation[unit_id] = item['pk']
+                    remaining[item['pk']] -= 1
+
+        # Затем остальные позиции - по очереди единиц товара
+        queues = {product_id: iter(unit_ids) for product_id, unit_ids in by_product.items()}
+        for item in items:
+            if item['request_item_id']:
+                continue
+            product_queue = queues.get(item['product_id'], iter(()))
+            while remaining[item['pk']]:
+                unit_id = next(product_queue, None)
+                if unit_id is None:
+                    break
+                if unit_id not in allocation:
+                    allocation[unit_id] = item['pk']
+                    remaining[item['pk']] -= 1
+
+        surplus = [
+            (item['pk'], item['product_id'], remaining[item['pk']])
+            for item in items if remaining[item['pk']]
+        ]
+        return allocation, surplus
+
 
 class DeliveryItem(models.Model):
     """Позиции в поставке"""
@@ -63,6 +200,12 @@ class DeliveryItem(models.Model):
         max_digits=10,
         decimal_places=2
     )
+    received_at = models.DateTimeField(
+        'Принята',
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Позиция поставки'
@@ -84,40 +227,17 @@ class DeliveryItem(models.Model):
             self.quantity_expected = self.request_item.quantity
         super().save(*args, **kwargs)
 
-    def process_units(self):
-        """Обработка единиц товара при подтверждении поставки"""
-        from unit.models import ProductUnit
-
-        # Получаем единицы из заявки
-        requested_units = ProductUnit.objects.filter(
-            status='in_request',
-            product=self.product
-        )[:self.quantity_received]
-
-        # Обновляем полученные единицы
-        requested_units.update(
-            status='in_delivery',
-            delivery_date=self.delivery.delivery_date,
-            delivery_item=self
-        )
-
-        # Обрабатываем излишки
-        if self.quantity_received > self.quantity_expected:
-            extra_count = self.quantity_received - self.quantity_expected
-            extra_units = [
-                ProductUnit(
-                    product=self.product,
-                    status='extra_add_delivery',
-                    delivery_date=self.delivery.delivery_date,
-                    delivery_item=self
-                ) for _ in range(extra_count)
-            ]
-            ProductUnit.objects.bulk_create(extra_units)
-
 
 @receiver(post_save, sender=Delivery)
-def update_delivery_status(sender, instance, **kwargs):
-    """Сигнал для подтверждения поставки"""
+def update_delivery_status(sender, instance, created, **kwargs):
+    """Приёмка подтверждённой поставки (принятые позиции повторно не обрабатываются)"""
     if instance.is_confirmed:
-        for item in instance.items.all():
-            item.process_units()
+        instance.receive()
+
+
+def _group_by_value(mapping):
+    """{ключ: значение} -> {значение: [ключи]}"""
+    groups = {}
+    for key, value in mapping.items():
+        groups.setdefault(value, []).append(key)
+    return groups
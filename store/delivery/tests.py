@@ -1,3 +1,336 @@
+import json
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from goods.models import Product
+from request.models import Request, RequestItem
+from suppliers.models import Supplier
+from unit.models import InventoryCounter, ProductUnit, ProductUnitQuerySet
+from .manifest import import_manifest
+from .models import Delivery, DeliveryItem
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+class DeliveryReceiveTest(TestCase):
+    """Приёмка поставки: распределение единиц из заявок и излишки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(name='Поставщик')
+        cls.product = Product.objects.create(code='DL-1', name='Дрель')
+        cls.request = Request.objects.create()
+
+    def requested_units(self, count, product=None):
+        units = ProductUnit.objects.bulk_create([
+            ProductUnit(product=product or self.product) for _ in range(count)
+        ])
+        items = RequestItem.objects.bulk_create([
+            RequestItem(request=self.request, product_id=unit.product_id, product_unit=unit, price_per_unit=100)
+            for unit in units
+        ])
+        ProductUnit.objects.filter(pk__in=[unit.pk for unit in units]).update(status='in_request')
+        return units, items
+
+    def create_delivery(self, *lines):
+        delivery = Delivery.objects.create(supplier=self.supplier)
+        DeliveryItem.objects.bulk_create([
+            DeliveryItem(delivery=delivery, price_per_unit=100, **line) for line in lines
+        ])
+        return delivery
+
+    def test_allocates_linked_then_fifo_and_creates_surplus(self):
+        units, request_items = self.requested_units(4)
+        delivery = self.create_delivery(
+            {'product': self.product, 'request_item': request_items[3], 'quantity_received': 1},
+            {'product': self.product, 'quantity_received': 4},
+        )
+        linked_item, fifo_item = delivery.items.order_by('pk')
+
+        delivery.confirm()
+
+        delivered = dict(
+            ProductUnit.objects.filter(status='in_delivery').values_list('pk', 'delivery_item_id')
+        )
+        self.assertEqual(delivered, {
+            units[3].pk: linked_item.pk,
+            units[0].pk: fifo_item.pk,
+            units[1].pk: fifo_item.pk,
+            units[2].pk: fifo_item.pk,
+        })
+        extra = ProductUnit.objects.get(status='extra_add_delivery')
+        self.assertEqual(extra.delivery_item_id, fifo_item.pk)
+        self.assertTrue(extra.is_extra_add_delivery_item)
+        self.assertEqual(
+            InventoryCounter.get_counts(self.product.pk), {'in_delivery': 4, 'extra_add_delivery': 1}
+        )
+
+    def test_resaving_confirmed_delivery_does_not_receive_again(self):
+        self.requested_units(1)
+        delivery = self.create_delivery({'product': self.product, 'quantity_received': 2})
+        delivery.confirm()
+
+        delivery.notes = 'Проверено'
+        delivery.save()
+        Delivery.objects.get(pk=delivery.pk).receive()
+
+        self.assertEqual(ProductUnit.objects.filter(delivery_item__delivery=delivery).count(), 2)
+        self.assertFalse(delivery.items.filter(received_at=None).exists())
+
+    def test_item_added_after_confirmation_is_received_once(self):
+        units, _ = self.requested_units(2)
+        delivery = self.create_delivery({'product': self.product, 'quantity_received': 1})
+        delivery.confirm()
+        late_item = DeliveryItem.objects.create(
+            delivery=delivery, product=self.product, quantity_received=1, price_per_unit=100
+        )
+
+        delivery.save()
+        delivery.save()
+
+        self.assertEqual(
+            list(ProductUnit.objects.filter(delivery_item=late_item).values_list('pk', flat=True)),
+            [units[1].pk]
+        )
+        self.assertEqual(ProductUnit.objects.filter(delivery_item__delivery=delivery).count(), 2)
+
+    def test_units_claimed_by_another_receiving_roll_back(self):
+        units, _ = self.requested_units(1)
+        delivery = self.create_delivery({'product': self.product, 'quantity_received': 1})
+        Delivery.objects.filter(pk=delivery.pk).update(is_confirmed=True)
+        allocate = Delivery._allocate
+
+        def allocate_then_lose_race(items, queue):
+            result = allocate(items, queue)
+            # Другая приёмка успела забрать единицу между чтением очереди и UPDATE
+            ProductUnit.objects.filter(pk=units[0].pk).update(status='in_delivery')
+            return result
+
+        with mock.patch.object(Delivery, '_allocate', staticmethod(allocate_then_lose_race)):
+            with self.assertRaises(ValidationError):
+                delivery.receive()
+
+        self.assertTrue(delivery.items.filter(received_at=None).exists())
+
+    def test_query_count_does_not_depend_on_number_of_lines(self):
+        def count_queries(lines):
+            products = Product.objects.bulk_create([
+                Product(code=f'DL-{lines}-{index}', name='Товар') for index in range(lines)
+            ])
+            for product in products:
+                self.requested_units(1, product=product)
+            delivery = self.create_delivery(*[
+                {'product': product, 'quantity_received': 2} for product in products
+            ])
+            with CaptureQueriesContext(connection) as queries:
+                delivery.confirm()
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(30))
+
+
+class DeliveryAdminReceiveErrorTest(TestCase):
+    """Ошибка приёмки в админке - сообщение, а не 500"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.supplier = Supplier.objects.create(name='Поставщик')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def failing_receive(*failing):
+        def receive(delivery):
+            if not failing or delivery.pk in failing:
+                raise ValidationError('Позиции поставки уже приняты другой приёмкой - повторите подтверждение')
+        return receive
+
+    def test_action_reports_error_and_confirms_the_rest(self):
+        failing, other = Delivery.objects.create(supplier=self.supplier), Delivery.objects.create(supplier=self.supplier)
+
+        with mock.patch.object(Delivery, 'receive', self.failing_receive(failing.pk)):
+            response = self.client.post(reverse('admin:delivery_delivery_changelist'), {
+                'action': 'confirm_delivery', '_selected_action': [failing.pk, other.pk],
+            }, follow=True)
+
+        self.assertContains(response, 'приёмка не выполнена')
+        self.assertContains(response, 'Подтверждено поставок: 1')
+        failing.refresh_from_db()
+        other.refresh_from_db()
+        self.assertFalse(failing.is_confirmed)
+        self.assertTrue(other.is_confirmed)
+
+    def test_change_form_reports_error(self):
+        delivery = Delivery.objects.create(supplier=self.supplier)
+
+        with mock.patch.object(Delivery, 'receive', self.failing_receive()):
+            response = self.client.post(reverse('admin:delivery_delivery_change', args=[delivery.pk]), {
+                'supplier': self.supplier.pk, 'delivery_date': timezone.localdate().isoformat(),
+                'is_confirmed': 'on', 'notes': '',
+                'items-TOTAL_FORMS': '0', 'items-INITIAL_FORMS': '0',
+                'items-MIN_NUM_FORMS': '0', 'items-MAX_NUM_FORMS': '1000',
+            }, follow=True)
+
+        self.assertEqual(response.status_code, 200)
+        # Ошибка в save_model не дублируется: сообщение одно, из повторной приёмки в save_related
+        errors = [str(message) for message in response.context['messages'] if 'приёмка не выполнена' in str(message)]
+        self.assertEqual(len(errors), 1)
+        delivery.refresh_from_db()
+        self.assertFalse(delivery.is_confirmed)
+
+
+class ManifestImportTest(TestCase):
+    """Импорт манифеста поставщика в позиции поставки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.drill = Product.objects.create(code='MF-1', name='Дрель')
+        cls.saw = Product.objects.create(code='MF-2', name='Пила')
+        cls.request = Request.objects.create()
+        units = ProductUnit.objects.bulk_create([ProductUnit(product=cls.drill) for _ in range(2)])
+        cls.request_items = RequestItem.objects.bulk_create([
+            RequestItem(request=cls.request, product=cls.drill, product_unit=unit, price_per_unit=100)
+            for unit in units
+        ])
+        ProductUnit.objects.filter(pk__in=[unit.pk for unit in units]).update(status='in_request')
+
+    def setUp(self):
+        self.delivery = Delivery.objects.create(supplier=Supplier.objects.create(name='Поставщик'))
+
+    def import_csv(self, text, **kwargs):
+        return import_manifest(self.delivery, BytesIO(text.encode('utf-8')), 'manifest.csv', **kwargs)
+
+    def test_imports_rows_and_reports_bad_ones(self):
+        report = StringIO()
+        result = self.import_csv(
+            'Код;Количество;Цена;Заявка\n'
+            f'MF-1;3;120,50;{self.request.pk}\n'
+            'MF-2;5;80;\n'
+            'NOPE;1;10;\n'
+            'MF-2;много;10;\n',
+            report=report, chunk_size=2
+        )
+
+        self.assertEqual((result.imported, result.rejected), (4, 2))
+        self.assertEqual([line for line, _ in result.errors], [4, 5])
+        self.assertEqual(len(report.getvalue().splitlines()), 2)
+        items = list(self.delivery.items.order_by('pk').values_list(
+            'product__code', 'request_item_id', 'quantity_expected', 'quantity_received'
+        ))
+        self.assertEqual(items, [
+            ('MF-1', self.request_items[0].pk, 1, 1),
+            ('MF-1', self.request_items[1].pk, 1, 1),
+            ('MF-1', None, 1, 1),
+            ('MF-2', None, 5, 5),
+        ])
+
+    def test_non_finite_numbers_are_rejected_rows(self):
+        result = self.import_csv(
+            'Код;Количество;Цена;Заявка\n'
+            'MF-2;inf;10;\n'
+            'MF-2;1;NaN;\n'
+            'MF-2;1;-Infinity;\n'
+            'MF-2;1;10;inf\n'
+            'MF-2;2;10;\n'
+        )
+
+        self.assertEqual((result.imported, result.rejected), (1, 4))
+        self.assertEqual([line for line, _ in result.errors], [2, 3, 4, 5])
+        self.assertEqual(list(self.delivery.items.values_list('quantity_expected', flat=True)), [2])
+
+    def test_missing_columns_abort_import(self):
+        with self.assertRaises(ValidationError):
+            self.import_csv('Код,Цена\nMF-1,10\n')
+        self.assertFalse(self.delivery.items.exists())
+
+    @skipUnless(openpyxl, 'openpyxl не установлен')
+    def test_imports_xlsx(self):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['Артикул', 'Кол-во', 'Цена'])
+        workbook.active.append(['MF-2', 2, 99.9])
+        file = BytesIO()
+        workbook.save(file)
+        file.seek(0)
+
+        result = import_manifest(self.delivery, file, 'manifest.xlsx')
+
+        self.assertEqual((result.imported, result.rejected), (1, 0))
+        self.assertEqual(self.delivery.items.get().quantity_received, 2)
+
+
+class StoreArrivalScansTest(TestCase):
+    """Приход в магазин по пакету сканов серийных номеров"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('clerk', 'clerk@example.com', 'password')
+        product = Product.objects.create(code='SC-1', name='Дрель')
+        cls.units = ProductUnit.objects.bulk_create([ProductUnit(product=product) for _ in range(4)])
+        for unit, status in zip(cls.units, ['in_delivery', 'extra_add_delivery', 'in_store', 'sold']):
+            ProductUnit.objects.filter(pk=unit.pk).update(status=status)
+
+    def scan(self, serials):
+        self.client.force_login(self.user)
+        return self.client.post(
+            reverse('delivery:store_arrival_scans'),
+            data=json.dumps({'serials': serials}),
+            content_type='application/json'
+        )
+
+    def test_batch_results_per_serial(self):
+        serials = [unit.serial_number for unit in self.units]
+
+        response = self.scan(serials + ['RF-NOPE', serials[0]])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'results': {
+                serials[0]: 'stored',
+                serials[1]: 'stored',
+                serials[2]: 'already_in_store',
+                serials[3]: 'wrong_status',
+                'RF-NOPE': 'not_found',
+            },
+            'stored': 2,
+        })
+        stored = ProductUnit.objects.filter(pk__in=[self.units[0].pk, self.units[1].pk])
+        self.assertEqual(set(stored.values_list('status', flat=True)), {'in_store'})
+        self.assertFalse(stored.filter(store_arrival_date=None).exists())
+
+        repeated = self.scan(serials[:1]).json()
+        self.assertEqual(repeated['results'], {serials[0]: 'already_in_store'})
+
+    def test_serial_taken_by_concurrent_scan_is_not_reported_twice(self):
+        unit = self.units[0]
+        transition = ProductUnitQuerySet.transition
+
+        def scanned_elsewhere_first(queryset, *args, **kwargs):
+            # Параллельный скан успел принять единицу между чтением и UPDATE
+            ProductUnit.objects.filter(pk=unit.pk).update(status='in_store')
+            return transition(queryset, *args, **kwargs)
+
+        with mock.patch.object(ProductUnitQuerySet, 'transition', scanned_elsewhere_first):
+            results = ProductUnit.objects.arrive_in_store([unit.serial_number])
+
+        self.assertEqual(results, {unit.serial_number: 'already_in_store'})
+        self.assertEqual(InventoryCounter.get_counts(unit.product_id)['in_store'], 2)
 
-# Create your tests here.
+    def test_rejects_malformed_payload(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('delivery:store_arrival_scans'), data='{"serials": "RF-1"}', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
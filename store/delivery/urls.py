@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'delivery'
+
+urlpatterns = [
+    path('scans/', views.store_arrival_scans, name='store_arrival_scans'),
+]
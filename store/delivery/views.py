@@ -1,3 +1,35 @@
-from django.shortcuts import render
+import json
 
-# Create your views here.
+from django.contrib.auth.decorators import permission_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from unit.models import ProductUnit
+
+# Максимум номеров в одном пакете сканов (лимит параметров SQLite)
+MAX_SCAN_BATCH = 1000
+
+
+@require_POST
+@permission_required('unit.change_productunit', raise_exception=True)
+def store_arrival_scans(request):
+    """
+    Приём пакета сканов серийных номеров на складе магазина.
+    Тело запроса: {"serials": ["RF-1-0000001", ...]}.
+    Ответ: {"results": {серийный номер: результат}, "stored": число принятых}.
+    """
+    try:
+        serials = json.loads(request.body)['serials']
+        if not isinstance(serials, list):
+            raise TypeError
+        serials = [str(serial).strip() for serial in serials]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Ожидается JSON вида {"serials": [...]}'}, status=400)
+    if len(serials) > MAX_SCAN_BATCH:
+        return JsonResponse({'error': f'Не более {MAX_SCAN_BATCH} номеров за запрос'}, status=400)
+
+    results = ProductUnit.objects.arrive_in_store([serial for serial in serials if serial])
+    return JsonResponse({
+        'results': results,
+        'stored': sum(1 for result in results.values() if result == 'stored'),
+    })
@@ -1,21 +1,22 @@
 # app files\admin
 from django.contrib import admin
+from django.template.defaultfilters import filesizeformat
 from django.utils.html import format_html
 from .models import ProductImage
 
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
-    list_display = ('product_link', 'image_preview', 'code', 'is_main', 'created_short')
-    list_filter = ('is_main', 'product__category')
+    list_display = ('product_link', 'image_preview', 'image_info', 'code', 'is_main', 'created_short')
+    list_filter = ('is_main', 'format', 'product__category')
     search_fields = ('product__name', 'product__code', 'code')
     list_editable = ('is_main',)
-    readonly_fields = ('image_preview', 'created_short')
+    readonly_fields = ('image_preview', 'image_info', 'content_hash', 'created_short')
     fieldsets = (
         (None, {
             'fields': ('product', 'code', 'is_main')
         }),
         ('Изображение', {
-            'fields': ('image', 'image_preview'),
+            'fields': ('image', 'image_preview', 'image_info', 'content_hash'),
         }),
         ('Даты', {
             'fields': ('created_short',),
@@ -37,11 +38,19 @@ class ProductImageAdmin(admin.ModelAdmin):
             return format_html(
                 '<img src="{}" style="max-height: 100px; max-width: 100px; '
                 'border: 1px solid #ddd; border-radius: 4px;"/>',
-                obj.image.url
+                obj.thumbnail_url('admin')
             )
         return "Нет изображения"
     image_preview.short_description = 'Превью'
 
+    def image_info(self, obj):
+        # Из сохранённых метаданных - файл не открывается
+        if obj.file_size is None:
+            return '-'
+        return ', '.join(filter(None, [obj.dimensions, obj.format, filesizeformat(obj.file_size)]))
+    image_info.short_description = 'Параметры'
+    image_info.admin_order_field = 'file_size'
+
     def created_short(self, obj):
         return obj.created_at.strftime('%d.%m.%Y %H:%M')
     created_short.short_description = 'Создано'
\ No newline at end of file
@@ -0,0 +1,84 @@
+# app files/blobs.py
+"""
+Хранение изображений товаров по содержимому.
+
+Файл сохраняется один раз под именем из SHA-256 содержимого:
+products/blobs/<первые 2 символа>/<хэш>.<расширение>. Одинаковое фото,
+загруженное для разных товаров или повторно, - один файл, на который
+указывают несколько строк ProductImage. Число ссылок на файл - число строк
+с этим именем (поле image проиндексировано); когда последняя ссылка
+удаляется, файл, его миниатюры и WebP-варианты удаляются из хранилища (release).
+
+Загрузка, которая переиспользует файл, и release, который его удаляет,
+берут блокировку имени (lock) и выполняются по очереди: release видит
+ссылку, добавленную загрузкой, или загрузка видит, что файла уже нет.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import thumbnails
+
+BLOBS_DIR = 'products/blobs'
+CHUNK_SIZE = 1024 * 1024
+
+# Одно расширение для одного формата - иначе одинаковые файлы разошлись бы по именам
+EXTENSION_ALIASES = {'.jpeg': '.jpg', '.jpe': '.jpg', '.tif': '.tiff'}
+
+
+def hash_file(file):
+    """SHA-256 содержимого файла (читается порциями, позиция возвращается в начало)"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def blob_name(content_hash, filename):
+    """Имя файла в хранилище по хэшу содержимого; расширение - из исходного имени"""
+    extension = os.path.splitext(filename)[1].lower()
+    extension = EXTENSION_ALIASES.get(extension, extension)
+    return f'{BLOBS_DIR}/{content_hash[:2]}/{content_hash}{extension}'
+
+
+def is_blob_name(name):
+    return name.startswith(f'{BLOBS_DIR}/')
+
+
+def lock(name):
+    """
+    Блокирует файл name до конца текущей транзакции (вызывается внутри atomic).
+    Блокировка - UPDATE строки BlobLock, поэтому действует и на SQLite,
+    где select_for_update игнорируется.
+    """
+    from .models import BlobLock
+
+    now = timezone.now()
+    if not BlobLock.objects.filter(pk=name).update(locked_at=now):
+        BlobLock.objects.get_or_create(pk=name)
+        BlobLock.objects.filter(pk=name).update(locked_at=now)
+
+
+def release(names, storage=None):
+    """Удаляет файлы names с миниатюрами и WebP-вариантами, если на них не ссылается ни одна строка"""
+    from .models import BlobLock, ProductImage
+
+    storage = storage or default_storage
+    names = set(filter(None, names))
+    with transaction.atomic():
+        # В одном порядке во всех транзакциях - без взаимных блокировок
+        for name in sorted(names):
+            lock(name)
+        # Ссылки проверяются под блокировкой: параллельная загрузка могла
+        # сослаться на файл после того, как была удалена прежняя ссылка
+        unused = names - set(ProductImage.objects.filter(image__in=names).values_list('image', flat=True))
+        for name in unused:
+            for target in [name, *(thumbnails.thumbnail_name(name, size) for size in thumbnails.SIZES)]:
+                for variant in thumbnails.variant_names(target):
+                    storage.delete(variant)
+        BlobLock.objects.filter(pk__in=unused).delete()
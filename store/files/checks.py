@@ -0,0 +1,16 @@
+# app files/checks.py
+"""Проверки настроек приложения files (manage.py check --deploy)"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.files, deploy=True)
+def check_media_handoff(app_configs, **kwargs):
+    """В продакшене медиафайлы отдаёт фронтенд-сервер, а не рабочие процессы Django"""
+    if settings.DEBUG or settings.MEDIA_ACCEL_REDIRECT_PREFIX or settings.MEDIA_SENDFILE:
+        return []
+    return [Error(
+        'Медиафайлы отдаёт Django: не задан MEDIA_ACCEL_REDIRECT_PREFIX или MEDIA_SENDFILE.',
+        hint='Задайте одну из переменных окружения (см. store/settings.py и files/serving.py).',
+        id='files.E001',
+    )]
@@ -0,0 +1,80 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from files import blobs, pool
+from files.models import ProductImage
+from goods import catalog
+from goods.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит изображения товаров в хранилище по содержимому: одинаковые файлы '
+        'сводятся к одному, строки ProductImage переводятся на него, копии удаляются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов для подсчёта хэшей (по умолчанию - по числу ядер)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, сколько места освободится')
+
+    def handle(self, *args, **options):
+        names = list(
+            ProductImage.objects.exclude(image='').order_by().values_list('image', flat=True).distinct()
+        )
+
+        groups = {}  # хэш -> [(имя, метаданные)]
+        failed = 0
+        with pool.executor(options['workers']) as executor:
+            for name, values, error in executor.map(pool.read_metadata, names, chunksize=16):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                groups.setdefault(values['content_hash'], []).append((name, values))
+
+        moved = sum(1 for files in groups.values() for name, _ in files if not blobs.is_blob_name(name))
+        freed = sum(values['file_size'] for files in groups.values() for _, values in files[1:])
+        self.stdout.write(
+            f'Файлов: {len(names)}, уникальных: {len(groups)}, ошибок: {failed}; '
+            f'будет освобождено {freed / 1024 / 1024:.1f} МБ'
+        )
+        if options['dry_run']:
+            return
+
+        for files in groups.values():
+            self.merge([name for name, _ in files], files[0][1])
+        catalog.bump_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: перенесено файлов {moved}, осталось уникальных {len(groups)}'
+        ))
+
+    def merge(self, names, values):
+        """
+        Один файл на хэш: строки переводятся на него (заодно получая метаданные
+        файла), остальные копии удаляются
+        """
+        target = blobs.blob_name(values['content_hash'], names[0])
+        if names == [target]:
+            ProductImage.objects.filter(image=target).filter(
+                Q(content_hash='') | Q(file_size__isnull=True)
+            ).update(**values)
+            return
+        with transaction.atomic():
+            # Пока строки не переведены на файл, release не должен его удалить
+            blobs.lock(target)
+            if not default_storage.exists(target):
+                with default_storage.open(names[0], 'rb') as file:
+                    target = default_storage.save(target, file)
+            images = ProductImage.objects.filter(image__in=names)
+            product_ids = list(images.values_list('product_id', flat=True).distinct())
+            images.update(image=target, **values)
+            # Адреса изображений в карточках изменились
+            Product.refresh_image_fields(product_ids)
+        blobs.release([name for name in names if name != target])
@@ -0,0 +1,55 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from files import pool
+from files.models import ProductImage
+
+# Результатов на одну транзакцию: запись в БД не блокируется на весь проход
+COMMIT_EVERY = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Считывает размеры, объём, формат и хэш уже загруженных изображений товаров '
+        'в пуле процессов и сохраняет их в ProductImage'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов (по умолчанию - по числу ядер)'
+        )
+        parser.add_argument('--all', action='store_true', help='Перечитать и уже заполненные изображения')
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.exclude(image='')
+        if not options['all']:
+            images = images.filter(Q(file_size__isnull=True) | Q(content_hash=''))
+        names = list(images.order_by().values_list('image', flat=True).distinct())
+
+        updated = failed = 0
+        batch = []
+        with pool.executor(options['workers']) as executor:
+            for name, values, error in executor.map(pool.read_metadata, names, chunksize=16):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                batch.append((name, values))
+                if len(batch) >= COMMIT_EVERY:
+                    updated += self.save(batch)
+                    batch = []
+        if batch:
+            updated += self.save(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов: {len(names)}, обновлено изображений: {updated}, ошибок: {failed}'
+        ))
+
+    def save(self, batch):
+        """Метаданные порции файлов одной транзакцией; возвращает число обновлённых строк"""
+        with transaction.atomic():
+            # Один файл может быть у нескольких строк (files/blobs.py)
+            return sum(ProductImage.objects.filter(image=name).update(**values) for name, values in batch)
@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from files import pool, thumbnails
+from files.models import ProductImage
+
+
+def _generate(args):
+    """Миниатюры и WebP-вариант одного файла в процессе пула: (имя, создано файлов, ошибка)"""
+    name, overwrite = args
+    try:
+        created = thumbnails.generate(name, overwrite=overwrite)
+        webp = thumbnails.generate_webp(name, overwrite=overwrite)
+        return name, len(created) + bool(webp), None
+    except (UnidentifiedImageError, OSError) as error:
+        return name, 0, str(error)
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры и WebP-варианты изображений товаров в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов (по умолчанию - по числу ядер)'
+        )
+        parser.add_argument('--overwrite', action='store_true', help='Пересоздать и существующие файлы')
+
+    def handle(self, *args, **options):
+        names = list(ProductImage.objects.exclude(image='').values_list('image', flat=True).distinct())
+        tasks = [(name, options['overwrite']) for name in names]
+
+        created = failed = 0
+        with pool.executor(options['workers']) as executor:
+            for name, count, error in executor.map(_generate, tasks, chunksize=16):
+                created += count
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Создано файлов: {created}, ошибок: {failed}'))
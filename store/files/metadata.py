@@ -0,0 +1,49 @@
+# app files/metadata.py
+"""
+Метаданные изображений товаров: размеры, объём, формат и хэш содержимого.
+
+Считываются один раз - при загрузке (ProductImage.save) или командой
+fill_image_metadata для уже загруженных файлов - и хранятся в полях
+ProductImage, поэтому спискам, API и проверкам не нужно открывать файлы
+из MEDIA_ROOT. Pillow читает только заголовок файла, пиксели не декодируются.
+"""
+import os
+
+from django.core.files.storage import default_storage
+from PIL import Image, UnidentifiedImageError
+
+from . import blobs
+
+FIELDS = ('content_hash', 'width', 'height', 'file_size', 'format')
+
+
+def read(file):
+    """
+    Метаданные открытого файла {поле ProductImage: значение}. Если файл
+    не читается как изображение, размеры и формат остаются пустыми.
+    """
+    content_hash = blobs.hash_file(file)
+    file_size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    width = height = None
+    image_format = ''
+    try:
+        with Image.open(file) as image:
+            (width, height), image_format = image.size, image.format or ''
+    except (UnidentifiedImageError, OSError):
+        pass
+    file.seek(0)
+    return {
+        'content_hash': content_hash,
+        'width': width,
+        'height': height,
+        'file_size': file_size,
+        'format': image_format,
+    }
+
+
+def read_name(name, storage=None):
+    """Метаданные файла name из хранилища"""
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as file:
+        return read(file)
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:38
+
+import files.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='SHA-256 содержимого'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(db_index=True, upload_to=files.models.product_image_upload_path, verbose_name='Изображение'),
+        ),
+    ]
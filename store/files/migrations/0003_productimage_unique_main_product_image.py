@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:41
+
+from django.db import migrations, models
+
+
+def keep_single_main_image(apps, schema_editor):
+    # Из нескольких главных изображений товара остаётся самое раннее
+    ProductImage = apps.get_model('files', 'ProductImage')
+    seen = set()
+    extra = []
+    for pk, product_id in ProductImage.objects.filter(is_main=True).order_by(
+        'product_id', 'created_at', 'pk'
+    ).values_list('pk', 'product_id'):
+        if product_id in seen:
+            extra.append(pk)
+        seen.add(product_id)
+    ProductImage.objects.filter(pk__in=extra).update(is_main=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0002_productimage_content_hash'),
+        ('goods', '0004_product_updated_at_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_single_main_image, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productimage',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_main', True)), fields=('product',), name='unique_main_product_image'),
+        ),
+    ]
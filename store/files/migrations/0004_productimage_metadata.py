@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0003_productimage_unique_main_product_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, verbose_name='Размер файла, байт'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='format',
+            field=models.CharField(blank=True, editable=False, max_length=10, verbose_name='Формат'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота, px'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина, px'),
+        ),
+    ]
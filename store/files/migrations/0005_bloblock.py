@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_productimage_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobLock',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('locked_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Заблокирован')),
+            ],
+            options={
+                'verbose_name': 'Блокировка файла',
+                'verbose_name_plural': 'Блокировки файлов',
+            },
+        ),
+    ]
@@ -1,11 +1,19 @@
 # app files/models
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
-import os
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from PIL import UnidentifiedImageError
+
+from goods import catalog
+from goods.models import Product
+from . import blobs, metadata, thumbnails
 
 def product_image_upload_path(instance, filename):
-    """Генерирует путь для сохранения изображений товаров"""
-    return os.path.join('products', instance.product.code, filename)
+    """Путь файла изображения по хэшу содержимого (см. files/blobs.py)"""
+    return blobs.blob_name(instance.content_hash, filename)
 
 class ProductImage(models.Model):
     """
@@ -19,8 +27,21 @@ class ProductImage(models.Model):
     )
     image = models.ImageField(
         upload_to=product_image_upload_path,
-        verbose_name='Изображение'
+        verbose_name='Изображение',
+        db_index=True  # число ссылок на общий файл (files/blobs.py)
+    )
+    content_hash = models.CharField(
+        'SHA-256 содержимого',
+        max_length=64,
+        blank=True,
+        editable=False,
+        db_index=True
     )
+    # Метаданные файла считываются при загрузке (files/metadata.py)
+    width = models.PositiveIntegerField('Ширина, px', blank=True, null=True, editable=False)
+    height = models.PositiveIntegerField('Высота, px', blank=True, null=True, editable=False)
+    file_size = models.PositiveBigIntegerField('Размер файла, байт', blank=True, null=True, editable=False)
+    format = models.CharField('Формат', max_length=10, blank=True, editable=False)
     code = models.CharField(
         max_length=100,
         verbose_name='Код изображения',
@@ -40,12 +61,117 @@ class ProductImage(models.Model):
         verbose_name = 'Изображение товара'
         verbose_name_plural = 'Изображения товаров'
         ordering = ['-is_main', 'created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'],
+                condition=models.Q(is_main=True),
+                name='unique_main_product_image'
+            ),
+        ]
 
     def __str__(self):
         return f"Изображение {self.id} для товара {self.product.code}"
 
+    def validate_constraints(self, exclude=None):
+        # Прежнее главное изображение снимается в save(), поэтому отметка
+        # второго главного в форме (в т.ч. list_editable) - не ошибка
+        super().validate_constraints(exclude={*(exclude or ()), 'product'})
+
     def save(self, *args, **kwargs):
         # Автоматически устанавливаем code равным коду товара
         if not self.code:
             self.code = self.product.code
-        super().save(*args, **kwargs)
\ No newline at end of file
+        old_name = old_product_id = None
+        if self.pk:
+            old_name, old_product_id = ProductImage.objects.filter(pk=self.pk).values_list(
+                'image', 'product_id'
+            ).first() or (None, None)
+        with transaction.atomic():
+            self._use_existing_blob()
+            if self.is_main:
+                # Главное изображение у товара одно - остальные снимаются
+                ProductImage.objects.filter(product_id=self.product_id, is_main=True).exclude(
+                    pk=self.pk
+                ).update(is_main=False)
+            super().save(*args, **kwargs)
+            if old_product_id and old_product_id != self.product_id:
+                Product.refresh_image_fields([old_product_id])
+        if self.image.name != old_name:
+            self._generate_variants()
+        if old_name and old_name != self.image.name:
+            # Заменённый файл удаляется, если на него больше никто не ссылается
+            transaction.on_commit(lambda: blobs.release([old_name]))
+
+    def _use_existing_blob(self):
+        """
+        Новая загрузка: метаданные и хэш содержимого; если такой файл уже есть,
+        строка ссылается на него, а загруженный файл не сохраняется. Файл
+        блокируется до конца транзакции (files/blobs.py lock), чтобы release
+        не удалил его, пока ссылка на него не сохранена
+        """
+        if not self.image or self.image._committed:
+            return
+        for field, value in metadata.read(self.image.file).items():
+            setattr(self, field, value)
+        name = blobs.blob_name(self.content_hash, self.image.name)
+        blobs.lock(name)
+        storage = self.image.storage
+        if not storage.exists(name):
+            self.image.save(self.image.name, self.image.file, save=False)
+            if self.image.name == name:
+                return
+            # Файл с тем же содержимым появился под этим именем, а хранилище
+            # сохранило копию под другим - копия не нужна
+            storage.delete(self.image.name)
+        self.image = name
+
+    def _generate_variants(self):
+        """Миниатюры и WebP-вариант нового файла (уже созданные пропускаются)"""
+        if not self.image:
+            return
+        try:
+            thumbnails.generate(self.image.name)
+            thumbnails.generate_webp(self.image.name)
+        except (UnidentifiedImageError, OSError):
+            # Файл не читается как изображение - миниатюра будет
+            # создана (или получит 404) при первом запросе
+            pass
+
+    @property
+    def dimensions(self):
+        """Размеры 'ширина×высота' из сохранённых метаданных (файл не открывается)"""
+        return f'{self.width}×{self.height}' if self.width and self.height else ''
+
+    def thumbnail_url(self, size='admin'):
+        """Адрес миниатюры size (см. files/thumbnails.py SIZES)"""
+        return thumbnails.thumbnail_url(self.image.name, size) if self.image else ''
+
+
+class BlobLock(models.Model):
+    """
+    Блокировка файла хранилища по содержимому (files/blobs.py lock)
+    """
+    name = models.CharField('Файл', max_length=255, primary_key=True)
+    locked_at = models.DateTimeField('Заблокирован', default=timezone.now)
+
+    class Meta:
+        app_label = 'files'
+        verbose_name = 'Блокировка файла'
+        verbose_name_plural = 'Блокировки файлов'
+
+    def __str__(self):
+        return self.name
+
+
+@receiver(post_delete, sender=ProductImage)
+def release_image_file(sender, instance, **kwargs):
+    """Последняя ссылка на файл удалена - файл больше не нужен (после фиксации транзакции)"""
+    name = instance.image.name
+    transaction.on_commit(lambda: blobs.release([name]))
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def refresh_product(sender, instance, **kwargs):
+    """Главное изображение, число изображений и updated_at товара; новая версия каталога"""
+    Product.refresh_image_fields([instance.product_id])
+    catalog.bump_version()
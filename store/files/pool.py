@@ -0,0 +1,33 @@
+# app files/pool.py
+"""
+Пул процессов для команд, которые читают файлы изображений
+(fill_image_metadata, deduplicate_product_images, generate_thumbnails).
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections
+
+from . import metadata
+
+
+def executor(workers):
+    """
+    Пул из workers процессов с настроенным Django. Открытые соединения с БД
+    закрываются заранее - дочерние процессы не должны их наследовать.
+    """
+    connections.close_all()
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+
+
+def init_worker():
+    # Процессы, запущенные не через fork, начинают без настроенного Django
+    django.setup()
+
+
+def read_metadata(name):
+    """Метаданные (с хэшем) файла в процессе пула: (имя, метаданные, ошибка)"""
+    try:
+        return name, metadata.read_name(name), None
+    except OSError as error:
+        return name, None, str(error)
@@ -0,0 +1,187 @@
+# app files/serving.py
+"""
+Отдача медиафайлов (MEDIA_URL) и миниатюр.
+
+Django только решает, какой файл отдать, и проверяет условные заголовки по
+stat() файла (ETag из размера и времени изменения, Last-Modified) - без
+обращений к БД. Сам файл при настроенном фронтенд-сервере отдаёт он:
+
+* MEDIA_ACCEL_REDIRECT_PREFIX - внутренний location nginx, ответ с
+  X-Accel-Redirect (nginx сам обрабатывает Range):
+
+      location /protected-media/ {
+          internal;
+          alias /path/to/media/;
+      }
+
+* MEDIA_SENDFILE = True - заголовок X-Sendfile с путём к файлу
+  (Apache mod_xsendfile, lighttpd).
+
+Обе настройки читаются из окружения (store/settings.py); без DEBUG одна из
+них обязательна (manage.py check --deploy, files/checks.py). При разработке
+файл отдаёт Django: целиком через
+wsgi.file_wrapper или диапазоном (Range: bytes=...). Клиентам, которые принимают image/webp, отдаётся
+WebP-вариант изображения, если он есть (files/thumbnails.py), иначе оригинал.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from . import blobs, thumbnails
+
+# Файлы хранилища по содержимому и их миниатюры не меняются - браузер хранит их год
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Остальные медиафайлы проверяются условным запросом раз в сутки
+MEDIA_MAX_AGE = 24 * 60 * 60
+# Ответы, которые можно кэшировать (416 и ошибки не кэшируются)
+CACHEABLE_STATUSES = (200, 206, 304)
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_media_name(name):
+    """Имя внутри MEDIA_ROOT без выхода за его пределы"""
+    parts = name.split('/')
+    return bool(name) and not name.startswith('/') and '..' not in parts and '' not in parts
+
+
+def accepts_webp(request):
+    return any(
+        part.split(';')[0].strip() == 'image/webp'
+        for part in request.headers.get('Accept', '').split(',')
+    )
+
+
+def choose_variant(request, name, storage=None):
+    """
+    Имя файла для ответа и признак, что выбор зависел от Accept
+    (тогда ответ помечается Vary: Accept)
+    """
+    storage = storage or default_storage
+    content_type = mimetypes.guess_type(name)[0] or ''
+    if not content_type.startswith('image/') or not thumbnails.has_webp_variant(name):
+        return name, False
+    variant = thumbnails.webp_name(name)
+    if accepts_webp(request) and storage.exists(variant):
+        return variant, True
+    return name, True
+
+
+def _etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _byte_range(request, size, etag, last_modified):
+    """
+    (начало, конец) из заголовка Range, None - отдать файл целиком,
+    False - диапазон вне файла. Несколько диапазонов не поддерживаются
+    (отдаётся весь файл, что допускает RFC 9110).
+    """
+    header = request.headers.get('Range')
+    if not header or request.method != 'GET':
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        # Синтаксически неверный диапазон игнорируется (RFC 9110, 14.1.1)
+        return None
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _read_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def serve(request, name, storage=None, max_age=None, immutable=None):
+    """
+    Ответ с файлом name из хранилища (с учётом WebP-варианта, условных
+    заголовков и Range). Неизменяемыми по умолчанию считаются файлы
+    хранилища по содержимому (files/blobs.py) и их производные.
+    """
+    storage = storage or default_storage
+    name, negotiated = choose_variant(request, name, storage)
+    try:
+        path = storage.path(name)
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('Файл не найден')
+    if not os.path.isfile(path):
+        raise Http404('Файл не найден')
+
+    if immutable is None:
+        immutable = blobs.is_blob_name(name)
+    if max_age is None:
+        max_age = IMMUTABLE_MAX_AGE if immutable else MEDIA_MAX_AGE
+    etag = _etag(stat)
+    last_modified = int(stat.st_mtime)
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    def finish(response):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+        if response.status_code in CACHEABLE_STATUSES:
+            patch_cache_control(response, public=True, max_age=max_age)
+            if immutable:
+                patch_cache_control(response, immutable=True)
+        if negotiated:
+            patch_vary_headers(response, ['Accept'])
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return finish(not_modified)
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', None)
+    if accel_prefix or getattr(settings, 'MEDIA_SENDFILE', False):
+        # Файл (и Range) отдаёт фронтенд-сервер, рабочий процесс сразу освобождается
+        response = HttpResponse(content_type=content_type)
+        if accel_prefix:
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(name)
+        else:
+            response['X-Sendfile'] = path
+        return finish(response)
+
+    byte_range = _byte_range(request, stat.st_size, etag, last_modified)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return finish(response)
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(open(path, 'rb'), start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    return finish(response)
@@ -1,3 +1,408 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from goods.models import Product
+from . import blobs, checks, thumbnails
+from .management.commands import fill_image_metadata
+from .models import BlobLock, ProductImage
+
+
+def image_file(name='photo.png', size=(1600, 1200), mode='RGBA', color=(200, 30, 30)):
+    buffer = BytesIO()
+    Image.new(mode, size, (*color, 255) if mode == 'RGBA' else color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class MediaRootMixin:
+    """Файлы теста пишутся во временный MEDIA_ROOT"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def tearDown(self):
+        # Откат транзакции теста файлы не удаляет
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+
+class ThumbnailTest(MediaRootMixin, TestCase):
+    """Миниатюры изображений товаров"""
+
+    def setUp(self):
+        self.product = Product.objects.create(code='TH-1', name='Дрель')
+
+    def test_generated_at_upload_next_to_original(self):
+        image = ProductImage.objects.create(product=self.product, image=image_file())
+
+        for size, box in thumbnails.SIZES.items():
+            name = thumbnails.thumbnail_name(image.image.name, size)
+            self.assertEqual(os.path.dirname(name), os.path.join(os.path.dirname(image.image.name), 'thumbs'))
+            with default_storage.open(name) as file, Image.open(file) as thumbnail:
+                self.assertEqual(thumbnail.format, 'JPEG')
+                self.assertLessEqual(thumbnail.size, box)
+            self.assertLess(default_storage.size(name), default_storage.size(image.image.name))
+
+    def test_lazy_generation_on_first_request(self):
+        image = ProductImage.objects.create(product=self.product, image=image_file())
+        name = thumbnails.thumbnail_name(image.image.name, 'list')
+        default_storage.delete(name)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(image.thumbnail_url('list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(default_storage.exists(name))
+
+    def test_concurrent_generation_leaves_no_extra_files(self):
+        image = ProductImage.objects.create(product=self.product, image=image_file())
+        thumbs_dir = os.path.dirname(default_storage.path(thumbnails.thumbnail_name(image.image.name, 'list')))
+        files = sorted(os.listdir(thumbs_dir))
+
+        # Второй запрос не увидел миниатюру, которую тут же записал первый
+        exists = default_storage.exists
+        checks = iter([False, False])
+        with mock.patch.object(default_storage, 'exists', side_effect=lambda name: next(checks, exists(name))):
+            thumbnails.generate(image.image.name, ['list'])
+
+        self.assertEqual(sorted(os.listdir(thumbs_dir)), files)
+
+    def test_rejects_unknown_size_and_paths_outside_products(self):
+        image = ProductImage.objects.create(product=self.product, image=image_file())
+
+        self.assertEqual(self.client.get(reverse('files:thumbnail', args=['huge', image.image.name])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('files:thumbnail', args=['list', 'secret/file.png'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('files:thumbnail', args=['list', 'products/x/none.png'])).status_code, 404)
+
+    def test_backfill_command(self):
+        image = ProductImage.objects.create(product=self.product, image=image_file(mode='RGB'))
+        for size in thumbnails.SIZES:
+            default_storage.delete(thumbnails.thumbnail_name(image.image.name, size))
+
+        webp = thumbnails.webp_name(thumbnails.thumbnail_name(image.image.name, 'list'))
+        webp_mtime = os.stat(default_storage.path(webp)).st_mtime_ns
+
+        out = StringIO()
+        call_command('generate_thumbnails', workers=2, stdout=out, stderr=StringIO())
+
+        # Пересозданы только удалённые JPEG, WebP-варианты остались прежними
+        self.assertIn(f'Создано файлов: {len(thumbnails.SIZES)}', out.getvalue())
+        self.assertEqual(os.stat(default_storage.path(webp)).st_mtime_ns, webp_mtime)
+        self.assertTrue(all(
+            default_storage.exists(name)
+            for size in thumbnails.SIZES
+            for name in thumbnails.variant_names(thumbnails.thumbnail_name(image.image.name, size))
+        ))
+
+    def test_admin_list_uses_thumbnails(self):
+        image = ProductImage.objects.create(product=self.product, image=image_file(), is_main=True)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        response = self.client.get(reverse('admin:goods_product_changelist'))
+
+        self.assertContains(response, image.thumbnail_url('admin'))
+        self.assertNotContains(response, image.image.url)
+
+
+class ContentAddressedStorageTest(MediaRootMixin, TestCase):
+    """Одинаковые изображения хранятся одним файлом"""
+
+    def setUp(self):
+        self.drill = Product.objects.create(code='CA-1', name='Дрель')
+        self.saw = Product.objects.create(code='CA-2', name='Пила')
+
+    def files_on_disk(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+            if os.path.basename(root) != thumbnails.THUMBS_DIR and thumbnails.has_webp_variant(name)
+        )
+
+    def test_same_photo_is_stored_once_and_released_with_last_reference(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ProductImage.objects.create(product=self.drill, image=image_file('a.PNG', color=(1, 2, 3)))
+            second = ProductImage.objects.create(product=self.saw, image=image_file('b.png', color=(1, 2, 3)))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image.name, blobs.blob_name(first.content_hash, 'x.png'))
+        self.assertEqual(self.files_on_disk(), [first.image.name])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(second.image.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.files_on_disk(), [])
+        self.assertFalse(default_storage.exists(thumbnails.thumbnail_name(second.image.name, 'list')))
+
+    def test_existing_file_under_exact_name_is_reused(self):
+        first = ProductImage.objects.create(product=self.drill, image=image_file(color=(11, 12, 13)))
+
+        # Параллельная загрузка того же фото записала файл после проверки exists()
+        exists = default_storage.exists
+        checks = iter([False])
+        with mock.patch.object(default_storage, 'exists', side_effect=lambda name: next(checks, exists(name))):
+            second = ProductImage.objects.create(product=self.saw, image=image_file(color=(11, 12, 13)))
+
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(self.files_on_disk(), [first.image.name])
+
+    def test_upload_and_release_take_file_lock(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.drill, image=image_file(color=(14, 15, 16)))
+            # Блокировка взята в транзакции загрузки - release ждёт её фиксации
+            self.assertTrue(BlobLock.objects.filter(pk=image.image.name).exists())
+
+        with mock.patch.object(blobs, 'lock', wraps=blobs.lock) as lock:
+            with self.captureOnCommitCallbacks(execute=True):
+                image.delete()
+        lock.assert_called_once_with(image.image.name)
+        self.assertEqual(self.files_on_disk(), [])
+        self.assertFalse(BlobLock.objects.exists())
+
+    def test_replaced_file_is_released(self):
+        image = ProductImage.objects.create(product=self.drill, image=image_file(color=(4, 5, 6)))
+        old_name = image.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = image_file(color=(7, 8, 9))
+            image.save()
+
+        self.assertNotEqual(image.image.name, old_name)
+        self.assertEqual(self.files_on_disk(), [image.image.name])
+
+    def test_deduplicate_command_merges_legacy_copies(self):
+        content = image_file(color=(10, 20, 30)).read()
+        for product in (self.drill, self.saw):
+            name = default_storage.save(f'products/{product.code}/photo.png', BytesIO(content))
+            ProductImage.objects.create(product=product, image=name)
+        other = default_storage.save('products/CA-2/other.png', image_file(color=(40, 50, 60)))
+        ProductImage.objects.create(product=self.saw, image=other)
+
+        out = StringIO()
+        call_command('deduplicate_product_images', workers=2, stdout=out, stderr=StringIO())
+
+        names = set(ProductImage.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(blobs.is_blob_name(name) for name in names))
+        self.assertEqual(self.files_on_disk(), sorted(names))
+        self.assertFalse(ProductImage.objects.filter(content_hash='').exists())
+        self.assertFalse(ProductImage.objects.filter(width__isnull=True).exists())
+        self.assertIn('Файлов: 3, уникальных: 2', out.getvalue())
+
+
+class ImageMetadataTest(MediaRootMixin, TestCase):
+    """Размеры, объём, формат и хэш считываются один раз и хранятся в БД"""
+
+    def setUp(self):
+        self.product = Product.objects.create(code='MD-1', name='Лобзик')
+
+    def test_read_at_upload(self):
+        image = ProductImage.objects.create(product=self.product, image=image_file(size=(640, 480)))
+
+        self.assertEqual((image.width, image.height, image.format), (640, 480, 'PNG'))
+        self.assertEqual(image.file_size, default_storage.size(image.image.name))
+        self.assertEqual(image.content_hash, blobs.hash_file(default_storage.open(image.image.name)))
+        self.assertEqual(image.dimensions, '640×480')
+
+    def test_backfill_command(self):
+        name = default_storage.save('products/MD-1/legacy.png', image_file(size=(300, 200)))
+        broken_name = default_storage.save('products/MD-1/broken.png', BytesIO(b'not an image'))
+        image = ProductImage.objects.create(product=self.product, image=name)
+        broken = ProductImage.objects.create(product=self.product, image=broken_name)
+        self.assertIsNone(image.file_size)
+
+        out = StringIO()
+        # Каждая порция результатов фиксируется своей транзакцией
+        with mock.patch.object(fill_image_metadata, 'COMMIT_EVERY', 1), \
+                mock.patch.object(fill_image_metadata.transaction, 'atomic', wraps=transaction.atomic) as atomic:
+            call_command('fill_image_metadata', workers=2, stdout=out, stderr=StringIO())
+        self.assertEqual(atomic.call_count, 2)
+
+        image.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual((image.width, image.height, image.format), (300, 200, 'PNG'))
+        self.assertEqual(image.file_size, default_storage.size(name))
+        self.assertEqual((broken.width, broken.format, broken.file_size), (None, '', 12))
+        self.assertIn('обновлено изображений: 2', out.getvalue())
+
+        # Заполненные изображения повторно не читаются
+        out = StringIO()
+        call_command('fill_image_metadata', workers=1, stdout=out, stderr=StringIO())
+        self.assertIn('Файлов: 0', out.getvalue())
+
+
+class ProductImageSummaryTest(MediaRootMixin, TestCase):
+    """Главное изображение и число изображений хранятся в товаре"""
+
+    def setUp(self):
+        self.product = Product.objects.create(code='IS-1', name='Шуруповёрт')
+
+    def add_image(self, color, is_main=False, product=None):
+        return ProductImage.objects.create(
+            product=product or self.product, image=image_file(size=(20, 20), color=color), is_main=is_main
+        )
+
+    def test_single_main_image_and_count(self):
+        first = self.add_image((1, 1, 1), is_main=True)
+        second = self.add_image((2, 2, 2), is_main=True)
+
+        first.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertFalse(first.is_main)
+        self.assertEqual(self.product.main_image, second)
+        self.assertEqual(self.product.images_count, 2)
+
+        second.delete()
+        self.product.refresh_from_db()
+        self.assertIsNone(self.product.main_image)
+        self.assertEqual(self.product.images_count, 1)
+
+    def test_moving_image_updates_both_products(self):
+        image = self.add_image((3, 3, 3), is_main=True)
+        other = Product.objects.create(code='IS-2', name='Перфоратор')
+
+        image.product = other
+        image.save()
+
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.product.main_image, self.product.images_count), (None, 0))
+        self.assertEqual((other.main_image, other.images_count), (image, 1))
+
+    def test_list_editable_toggle(self):
+        first = self.add_image((4, 4, 4), is_main=True)
+        second = self.add_image((5, 5, 5))
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        response = self.client.post(reverse('admin:files_productimage_changelist'), {
+            'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '2',
+            'form-MIN_NUM_FORMS': '0', 'form-MAX_NUM_FORMS': '1000',
+            'form-0-id': first.pk, 'form-1-id': second.pk, 'form-1-is_main': 'on',
+            '_save': 'Сохранить',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.main_image, second)
+        self.assertEqual(list(ProductImage.objects.filter(is_main=True)), [second])
+
+    def test_product_changelist_has_no_per_row_image_queries(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.add_image((6, 6, 6), is_main=True)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(reverse('admin:goods_product_changelist')).status_code, 200)
+            return len(queries)
+
+        expected = count_queries()
+        for number in range(5):
+            product = Product.objects.create(code=f'IS-N{number}', name=f'Товар {number}')
+            self.add_image((7, number, 7), is_main=True, product=product)
+        self.assertEqual(count_queries(), expected)
+
+
+class MediaServingTest(MediaRootMixin, TestCase):
+    """Медиафайлы: Range, условные запросы, WebP-варианты и передача фронтенд-серверу"""
+
+    def setUp(self):
+        product = Product.objects.create(code='MS-1', name='Рубанок')
+        self.image = ProductImage.objects.create(product=product, image=image_file())
+        self.name = self.image.image.name
+        self.url = reverse('media', args=[self.name])
+        with default_storage.open(self.name, 'rb') as file:
+            self.content = file.read()
+
+    def test_full_file_with_cache_headers(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept', response['Vary'])
+
+        response = self.client.get(self.url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-5'})
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertNotIn('Cache-Control', response)
+
+        # Неверный диапазон (конец раньше начала) игнорируется
+        response = self.client.get(self.url, headers={'Range': 'bytes=5-3'})
+        self.assertEqual(response.status_code, 200)
+
+        # Файл изменился - If-Range не совпал, отдаётся целиком
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_webp_variant_for_accepting_clients(self):
+        variant = thumbnails.webp_name(self.name)
+        self.assertTrue(default_storage.exists(variant))
+
+        response = self.client.get(self.url, headers={'Accept': 'image/avif,image/webp,*/*'})
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(b''.join(response.streaming_content), default_storage.open(variant).read())
+
+        thumbnail = self.client.get(self.image.thumbnail_url('list'), headers={'Accept': 'image/webp'})
+        self.assertEqual(thumbnail['Content-Type'], 'image/webp')
+        self.assertIn('Accept', thumbnail['Vary'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.image.delete()
+        self.assertFalse(default_storage.exists(variant))
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_handoff_to_front_end_server(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    def test_deploy_check_requires_front_end_server(self):
+        with override_settings(DEBUG=False, MEDIA_ACCEL_REDIRECT_PREFIX=None, MEDIA_SENDFILE=False):
+            self.assertEqual([error.id for error in checks.check_media_handoff(None)], ['files.E001'])
+        with override_settings(DEBUG=False, MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            self.assertEqual(checks.check_media_handoff(None), [])
+
+    def test_rejects_paths_outside_media_root(self):
+        self.assertEqual(self.client.get('/media/products/../../manage.py').status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['products/none.png'])).status_code, 404)
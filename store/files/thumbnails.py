@@ -0,0 +1,179 @@
+# app files/thumbnails.py
+"""
+Миниатюры изображений товаров.
+
+Для каждого исходного файла строятся JPEG фиксированных размеров SIZES и
+сохраняются рядом с ним: products/blobs/<xx>/thumbs/<хэш>-<размер>.jpg
+для файлов хранилища по содержимому (files/blobs.py), <каталог>/thumbs/<имя>-<размер>.jpg
+для ещё не перенесённых туда файлов.
+Миниатюры создаются при загрузке изображения (сигнал в files/models.py),
+а недостающие - при первом запросе (files.views.thumbnail) или командой
+generate_thumbnails в пуле процессов.
+
+Рядом с каждой миниатюрой и исходным файлом лежит вариант в WebP
+(<имя>.webp): files/serving.py отдаёт его клиентам, которые принимают
+image/webp. Вариант исходного файла сохраняется, только если он меньше оригинала.
+
+Имя миниатюры выводится из имени исходного файла, а имя файла - из хэша его
+содержимого: другое изображение получает другое имя, поэтому адрес миниатюры
+неизменяем и её можно кэшировать в браузере сколь угодно долго. Файлы записываются атомарно
+под этим именем (_write): параллельные первые запросы одной миниатюры не
+видят недописанный файл и не оставляют копий под альтернативными именами.
+"""
+import os
+import tempfile
+from contextlib import suppress
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+# Размер -> (ширина, высота) рамки, в которую вписывается изображение
+SIZES = {
+    'list': (50, 50),  # строки списков админки
+    'admin': (100, 100),  # превью в карточке
+    'catalog': (400, 400),  # каталог для кассы и сайта
+}
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+# Формат файла миниатюры -> параметры сохранения
+SAVE_OPTIONS = {
+    'JPEG': {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True},
+    'WEBP': {'quality': WEBP_QUALITY},
+}
+THUMBS_DIR = 'thumbs'
+WEBP_SUFFIX = '.webp'
+
+
+def thumbnail_name(name, size):
+    """Имя файла миниатюры size для исходного файла name"""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, THUMBS_DIR, f'{stem}-{size}.jpg')
+
+
+def webp_name(name):
+    """Имя WebP-варианта файла name"""
+    return name + WEBP_SUFFIX
+
+
+def variant_names(name):
+    """Файл и его WebP-вариант"""
+    return [name, webp_name(name)]
+
+
+def has_webp_variant(name):
+    """Для файла может быть WebP-вариант (сам файл - не WebP)"""
+    return not name.lower().endswith(WEBP_SUFFIX)
+
+
+def thumbnail_url(name, size):
+    """Адрес миниатюры; если её ещё нет, она будет создана при первом запросе"""
+    return reverse('files:thumbnail', args=[size, name])
+
+
+def is_source_name(name):
+    """Имя исходного изображения товара (защита представления от произвольных путей)"""
+    parts = name.split('/')
+    return parts[0] == 'products' and '..' not in parts and THUMBS_DIR not in parts[:-1]
+
+
+def generate(name, sizes=None, storage=None, overwrite=False):
+    """
+    Создаёт миниатюры sizes (по умолчанию все) для исходного файла name -
+    только недостающие файлы (JPEG и WebP проверяются по отдельности).
+    Исходный файл читается и декодируется один раз. Возвращает имена созданных файлов.
+    """
+    storage = storage or default_storage
+    missing = {}  # размер -> [(имя файла, формат)]
+    for size in sizes or SIZES:
+        target = thumbnail_name(name, size)
+        files = [
+            (file_name, image_format)
+            for file_name, image_format in ((target, 'JPEG'), (webp_name(target), 'WEBP'))
+            if overwrite or not storage.exists(file_name)
+        ]
+        if files:
+            missing[size] = files
+    if not missing:
+        return []
+
+    with storage.open(name, 'rb') as file:
+        source = Image.open(file)
+        # Большие JPEG декодируются сразу в уменьшенном масштабе
+        source.draft('RGB', max(SIZES[size] for size in missing))
+        source = ImageOps.exif_transpose(source)
+        if source.mode != 'RGB':
+            background = Image.new('RGB', source.size, 'white')
+            background.paste(source, mask=source.convert('RGBA').getchannel('A'))
+            source = background
+
+    created = []
+    # От большего размера к меньшему: каждый следующий уменьшается из предыдущего
+    for size in sorted(missing, key=lambda size: SIZES[size], reverse=True):
+        source = source.copy()
+        source.thumbnail(SIZES[size], Image.LANCZOS)
+        for file_name, image_format in missing[size]:
+            created.append(_save(storage, file_name, source, image_format, **SAVE_OPTIONS[image_format]))
+    return created
+
+
+def generate_webp(name, storage=None, overwrite=False):
+    """
+    WebP-вариант исходного файла name. Не сохраняется, если не меньше оригинала
+    (тогда клиенты получают оригинал). Возвращает имя созданного файла или None.
+    """
+    storage = storage or default_storage
+    target = webp_name(name)
+    if not has_webp_variant(name) or (not overwrite and storage.exists(target)):
+        return None
+
+    with storage.open(name, 'rb') as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA')
+        buffer = BytesIO()
+        source.save(buffer, 'WEBP', quality=WEBP_QUALITY)
+    if buffer.tell() >= storage.size(name):
+        return None
+    return _write(storage, target, buffer.getvalue())
+
+
+def _save(storage, target, image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return _write(storage, target, buffer.getvalue())
+
+
+def _write(storage, target, content):
+    """
+    Записывает content ровно под именем target (storage.save при занятом имени
+    выбрал бы другое). В локальном хранилище - через временный файл в том же
+    каталоге и os.replace; в остальных, если файл под этим именем успел
+    записать параллельный запрос, копия под другим именем удаляется.
+    """
+    try:
+        path = storage.path(target)
+    except NotImplementedError:
+        if storage.exists(target):
+            storage.delete(target)
+        saved = storage.save(target, ContentFile(content))
+        if saved != target:
+            storage.delete(saved)
+        return target
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.chmod(temp_path, storage.file_permissions_mode or 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+    return target
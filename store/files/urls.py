@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'files'
+
+urlpatterns = [
+    path('thumbnails/<str:size>/<path:name>', views.thumbnail, name='thumbnail'),
+]
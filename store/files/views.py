@@ -1,3 +1,35 @@
-from django.shortcuts import render
+from django.core.files.storage import default_storage
+from django.http import Http404
+from django.views.decorators.http import require_safe
+from PIL import UnidentifiedImageError
 
-# Create your views here.
+from . import serving, thumbnails
+
+# Адрес миниатюры неизменяем (см. files/thumbnails.py) - браузер хранит её год
+THUMBNAIL_MAX_AGE = 365 * 24 * 60 * 60
+
+
+@require_safe
+def media(request, name):
+    """Файл из MEDIA_ROOT (отдаёт фронтенд-сервер, если настроен; см. files/serving.py)"""
+    if not serving.is_media_name(name):
+        raise Http404('Файл не найден')
+    return serving.serve(request, name)
+
+
+@require_safe
+def thumbnail(request, size, name):
+    """Миниатюра изображения товара; создаётся при первом запросе, без обращений к БД"""
+    if size not in thumbnails.SIZES or not thumbnails.is_source_name(name):
+        raise Http404('Миниатюра не найдена')
+
+    target = thumbnails.thumbnail_name(name, size)
+    if not default_storage.exists(target):
+        if not default_storage.exists(name):
+            raise Http404('Изображение не найдено')
+        try:
+            thumbnails.generate(name, [size])
+        except (UnidentifiedImageError, OSError):
+            raise Http404('Файл не является изображением')
+
+    return serving.serve(request, target, max_age=THUMBNAIL_MAX_AGE, immutable=True)
@@ -1,9 +1,13 @@
 # app goods/admin.py
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.utils.html import format_html
 from django.utils.text import slugify
 from .models import Category, Product
+from . import search
 from files.models import ProductImage
+from unit.filters import LazyFilterMixin, LazyRelatedFieldListFilter
+from unit.paginators import KeysetPaginationMixin
 
 
 class ProductImageInline(admin.TabularInline):
@@ -21,12 +25,30 @@ class ProductImageInline(admin.TabularInline):
     created_short.short_description = 'Создано'
 
 
+class CategoryChangeList(ChangeList):
+    """Список категорий: итоги по поддеревьям считаются разом для всей страницы"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = list(self.result_list)
+        counts = Category.get_rolled_up_counts(self.result_list)
+        for category in self.result_list:
+            category.rolled_up_counts = counts[category.pk]
+
+
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'parent_link', 'slug_display', 'product_count')
-    list_filter = ('parent',)
+class CategoryAdmin(LazyFilterMixin, KeysetPaginationMixin, admin.ModelAdmin):
+    list_display = ('name', 'parent_link', 'slug_display', 'product_count', 'units_in_store')
+    list_select_related = ('parent',)
+    # Обход дерева в глубину; сортировка по ключу - для постраничного поиска без OFFSET
+    ordering = ('path', 'id')
+    list_filter = (('parent', LazyRelatedFieldListFilter),)
     search_fields = ('name',)
-    fields = ('name', 'parent')
+    fields = ('name', 'parent', 'breadcrumbs')
+    readonly_fields = ('breadcrumbs',)
+
+    def get_changelist(self, request, **kwargs):
+        return CategoryChangeList
 
     def parent_link(self, obj):
         if obj.parent:
@@ -34,13 +56,23 @@ class CategoryAdmin(admin.ModelAdmin):
         return "-"
     parent_link.short_description = 'Родительская категория'
 
+    def breadcrumbs(self, obj):
+        if not obj.pk:
+            return "-"
+        return ' / '.join(category.name for category in obj.get_breadcrumbs())
+    breadcrumbs.short_description = 'Путь'
+
     def slug_display(self, obj):
         return obj.slug or "Не сгенерирован"
     slug_display.short_description = 'ЧПУ'
 
     def product_count(self, obj):
-        return obj.products.count()
-    product_count.short_description = 'Товаров'
+        return obj.rolled_up_counts[0]
+    product_count.short_description = 'Товаров (с подкатегориями)'
+
+    def units_in_store(self, obj):
+        return obj.rolled_up_counts[1]
+    units_in_store.short_description = 'Единиц в магазине'
 
     def save_model(self, request, obj, form, change):
         if not obj.slug:
@@ -59,6 +91,9 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'code', 'category', 'main_image_preview', 'images_count')
+    # Главное изображение и число изображений хранятся в товаре - без запросов на строку
+    list_select_related = ('category', 'main_image')
+    search_fields = ('name', 'code', 'description')
     readonly_fields = ('main_image_preview', 'images_list', 'add_images')
     fieldsets = (
         ('Основная информация', {
@@ -74,6 +109,13 @@ class ProductAdmin(admin.ModelAdmin):
     )
     inlines = [ProductImageInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо icontains по всей таблице
+        results = search.search_products(queryset, search_term)
+        if results is None:
+            return super().get_search_results(request, queryset, search_term)
+        return results, False
+
     def add_images(self, obj):
         if obj.pk:
             return format_html(
@@ -86,12 +128,12 @@ class ProductAdmin(admin.ModelAdmin):
     add_images.short_description = 'Действия'
 
     def main_image_preview(self, obj):
-        main_image = obj.product_images.filter(is_main=True).first()
+        main_image = obj.main_image
         if main_image:
             return format_html(
                 '<img src="{}" style="max-height: 100px; max-width: 100px; '
                 'border: 1px solid #ddd; border-radius: 4px;"/>',
-                main_image.image.url
+                main_image.thumbnail_url('admin')
             )
         return "Нет главного изображения"
     main_image_preview.short_description = 'Главное изображение'
@@ -101,7 +143,7 @@ class ProductAdmin(admin.ModelAdmin):
         if images:
             return format_html(' '.join(
                 f'<a href="/admin/files/productimage/{img.id}/change/" title="Редактировать">'
-                f'<img src="{img.image.url}" style="max-height: 50px; margin: 5px; '
+                f'<img src="{img.thumbnail_url("list")}" style="max-height: 50px; margin: 5px; '
                 'border: 1px solid #ddd; border-radius: 3px;"/></a>'
                 for img in images
             ))
@@ -109,11 +151,12 @@ class ProductAdmin(admin.ModelAdmin):
     images_list.short_description = 'Все изображения'
 
     def images_count(self, obj):
-        count = obj.product_images.count()
+        count = obj.images_count
         return format_html(
             '<a href="/admin/files/productimage/?product__id__exact={}" style="{}">{}</a>',
             obj.id,
             'color: #417690; font-weight: bold;' if count else 'color: #999;',
             count
         )
-    images_count.short_description = 'Изобр.'
\ No newline at end of file
+    images_count.short_description = 'Изобр.'
+    images_count.admin_order_field = 'images_count'
\ No newline at end of file
@@ -0,0 +1,135 @@
+# app goods/availability.py
+"""
+Наличие товаров по кодам - для корзин кассы и страниц каталога.
+
+Остатки берутся из счётчиков InventoryCounter одним запросом на все коды
+(LEFT JOIN по уникальному индексу кода товара и индексу (товар, статус)).
+Результаты хранятся в LRU-кэше процесса с коротким TTL: повторная корзина
+или страница обходится без запросов. Изменение единиц товара или пересчёт
+счётчиков (InventoryCounter.invalidate_availability) сбрасывает его записи
+в кэше этого процесса; в остальных процессах запись устаревает не дольше
+чем на CACHE_TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.db.models import FilteredRelation, Q
+
+CACHE_SIZE = 20_000
+CACHE_TTL = 5  # секунд
+
+IN_STORE = 'В наличии'
+EXPECTED = 'Ожидается поставка'
+OUT_OF_STOCK = 'Нет в наличии'
+
+# Статусы единиц, от которых зависит наличие
+STOCK_STATUSES = ('in_store', 'in_delivery', 'extra_add_delivery')
+
+
+def availability_status(counts):
+    """Статус доступности по остаткам {status: count}"""
+    if counts.get('in_store'):
+        return IN_STORE
+    if counts.get('in_delivery') or counts.get('extra_add_delivery'):
+        return EXPECTED
+    return OUT_OF_STOCK
+
+
+class AvailabilityCache:
+    """
+    LRU-кэш {код товара: наличие} с временем жизни записей
+    и сбросом по id товара. Потокобезопасен.
+    """
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # код -> (истекает, id товара, наличие)
+        self._codes = {}  # id товара -> код
+        self._lock = threading.Lock()
+
+    def get_many(self, codes):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for code in codes:
+                entry = self._entries.get(code)
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    self._remove(code)
+                    continue
+                self._entries.move_to_end(code)
+                found[code] = entry[2]
+        return found
+
+    def set_many(self, entries):
+        """entries: {код: (id товара или None, наличие)}"""
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for code, (product_id, value) in entries.items():
+                self._remove(code)
+                self._entries[code] = (expires, product_id, value)
+                if product_id is not None:
+                    self._codes[product_id] = code
+            while len(self._entries) > self.size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, product_ids=None):
+        """Сброс записей товаров product_ids (None - всего кэша)"""
+        with self._lock:
+            if product_ids is None:
+                self._entries.clear()
+                self._codes.clear()
+                return
+            for product_id in product_ids:
+                code = self._codes.get(product_id)
+                if code is not None:
+                    self._remove(code)
+
+    def _remove(self, code):
+        entry = self._entries.pop(code, None)
+        if entry is not None and entry[1] is not None:
+            self._codes.pop(entry[1], None)
+
+
+cache = AvailabilityCache()
+
+
+def get_availability(codes):
+    """
+    Наличие товаров по кодам: {код: {'in_store': n, 'expected': n, 'status': str}}.
+    Неизвестных кодов в ответе нет. Не больше одного запроса на любое число кодов.
+    """
+    from .models import Product
+
+    codes = list(dict.fromkeys(codes))
+    result = cache.get_many(codes)
+    missing = [code for code in codes if code not in result]
+    if not missing:
+        return {code: value for code, value in result.items() if value is not None}
+
+    counts = {}
+    rows = Product.objects.filter(code__in=missing).annotate(
+        stock=FilteredRelation(
+            'inventory_counters',
+            condition=Q(inventory_counters__status__in=STOCK_STATUSES, inventory_counters__count__gt=0)
+        )
+    ).values_list('pk', 'code', 'stock__status', 'stock__count')
+    for product_id, code, status, count in rows:
+        product_counts = counts.setdefault(code, (product_id, {}))[1]
+        if status:
+            product_counts[status] = count
+
+    fresh = {}
+    for code in missing:
+        product_id, product_counts = counts.get(code, (None, None))
+        fresh[code] = (product_id, None if product_counts is None else {
+            'in_store': product_counts.get('in_store', 0),
+            'expected': product_counts.get('in_delivery', 0) + product_counts.get('extra_add_delivery', 0),
+            'status': availability_status(product_counts),
+        })
+    cache.set_many(fresh)
+    result.update({code: value for code, (_, value) in fresh.items()})
+    return {code: value for code, value in result.items() if value is not None}
@@ -0,0 +1,73 @@
+# app goods/catalog.py
+"""
+Версия каталога для HTTP-кэширования API товаров.
+
+Версия - счётчик в единственной строке CatalogVersion. Он увеличивается
+сигналами (см. goods/models.py, files/models.py) в той же транзакции, что и
+изменение товаров, категорий или изображений: все процессы видят одну и ту же
+версию, увеличение атомарно (F() + 1) и откатывается вместе с изменением.
+Из версии строятся ETag и Last-Modified списков, поэтому условный GET клиента,
+у которого каталог не менялся, получает 304 за один запрос по первичному ключу.
+Отрендеренные ответы кэшируются с версией в ключе: после изменения старые
+ключи просто перестают использоваться и истекают сами.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+RESPONSE_CACHE_TIMEOUT = 3600
+
+
+def get_version(request=None):
+    """
+    Текущая версия каталога (version, updated_at). Читается из БД один раз
+    на запрос request (ETag, Last-Modified и ключ кэша используют одну версию).
+    """
+    from .models import CatalogVersion
+
+    version = getattr(request, '_catalog_version', None)
+    if version is None:
+        version = CatalogVersion.objects.filter(pk=CatalogVersion.SINGLETON_PK).values_list(
+            'version', 'updated_at'
+        ).first() or (0, None)
+        if request is not None:
+            request._catalog_version = version
+    return version
+
+
+def bump_version(**kwargs):
+    """Каталог изменился (подходит как приёмник сигналов)"""
+    from .models import CatalogVersion
+
+    changes = {'version': F('version') + 1, 'updated_at': timezone.now()}
+    if not CatalogVersion.objects.filter(pk=CatalogVersion.SINGLETON_PK).update(**changes):
+        CatalogVersion.objects.get_or_create(pk=CatalogVersion.SINGLETON_PK)
+        CatalogVersion.objects.filter(pk=CatalogVersion.SINGLETON_PK).update(**changes)
+
+
+def last_modified(request, *args, **kwargs):
+    return get_version(request)[1]
+
+
+def etag(request, *args, **kwargs):
+    """ETag ответа: версия каталога и адрес запроса с параметрами"""
+    return f'{get_version(request)[0]}-{_digest(request.get_full_path())}'
+
+
+def cached_response(request, build):
+    """
+    Тело ответа из кэша по версии каталога и адресу запроса;
+    при промахе - build() и сохранение.
+    """
+    key = f'catalog:response:{get_version(request)[0]}:{_digest(request.get_full_path())}'
+    content = cache.get(key)
+    if content is None:
+        content = build()
+        cache.set(key, content, RESPONSE_CACHE_TIMEOUT)
+    return content
+
+
+def _digest(text):
+    return hashlib.md5(text.encode(), usedforsecurity=False).hexdigest()
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from goods import search
+
+
+class Command(BaseCommand):
+    help = 'Пересоздаёт полнотекстовый индекс товаров (название, код, описание)'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Полнотекстовый индекс поддерживается только для SQLite')
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Индекс поиска товаров пересоздан'))
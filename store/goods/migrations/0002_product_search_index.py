@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# SQL зафиксирован в миграции, а не берётся из кода приложения: миграция
+# должна выполнять то же, что и при создании, независимо от последующих правок
+NORMALIZED = (
+    "replace(replace(coalesce({0}name, ''), 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce({0}code, ''), 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce({0}description, ''), 'ё', 'е'), 'Ё', 'Е')"
+)
+INSERT_NEW = (
+    "INSERT INTO goods_product_fts (rowid, name, code, description) "
+    f"VALUES (new.id, {NORMALIZED.format('new.')});"
+)
+DELETE_OLD = "DELETE FROM goods_product_fts WHERE rowid = old.id;"
+
+CREATE_INDEX_SQL = [
+    "CREATE VIRTUAL TABLE goods_product_fts USING fts5("
+    "name, code, description, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO goods_product_fts (rowid, name, code, description) "
+    f"SELECT id, {NORMALIZED.format('')} FROM goods_product",
+    f"CREATE TRIGGER goods_product_fts_ai AFTER INSERT ON goods_product BEGIN {INSERT_NEW} END",
+    f"CREATE TRIGGER goods_product_fts_ad AFTER DELETE ON goods_product BEGIN {DELETE_OLD} END",
+    "CREATE TRIGGER goods_product_fts_au AFTER UPDATE OF name, code, description ON goods_product "
+    f"BEGIN {DELETE_OLD} {INSERT_NEW} END",
+]
+DROP_INDEX_SQL = [
+    "DROP TRIGGER IF EXISTS goods_product_fts_ai",
+    "DROP TRIGGER IF EXISTS goods_product_fts_ad",
+    "DROP TRIGGER IF EXISTS goods_product_fts_au",
+    "DROP TABLE IF EXISTS goods_product_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # Полнотекстовый индекс FTS5 есть только в SQLite; на других СУБД
+    # админка ищет штатным icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_INDEX_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_INDEX_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:32
+
+from django.db import migrations, models
+
+
+def fill_category_paths(apps, schema_editor):
+    # Историческая модель без методов - путь считается здесь так же, как Category.rebuild_paths
+    Category = apps.get_model('goods', 'Category')
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    paths = {}
+
+    def path_of(pk):
+        if pk not in paths:
+            parent_id = parents[pk]
+            paths[pk] = (path_of(parent_id) if parent_id else '') + f'{pk:08d}/'
+        return paths[pk]
+
+    categories = [Category(pk=pk, path=path_of(pk)) for pk in parents]
+    for category in categories:
+        category.depth = category.path.count('/') - 1
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0002_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='Путь в дереве'),
+        ),
+        migrations.RunPython(fill_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0003_category_path'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at', 'id'], name='goods_produ_updated_8be7e0_idx'),
+        ),
+    ]
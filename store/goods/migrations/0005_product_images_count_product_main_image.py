@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# SQL индекса из 0002 зафиксирован в миграции, а не берётся из кода приложения: миграция
+# должна выполнять то же, что и при создании, независимо от последующих правок
+NORMALIZED = (
+    "replace(replace(coalesce({0}name, ''), 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce({0}code, ''), 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce({0}description, ''), 'ё', 'е'), 'Ё', 'Е')"
+)
+INSERT_NEW = (
+    "INSERT INTO goods_product_fts (rowid, name, code, description) "
+    f"VALUES (new.id, {NORMALIZED.format('new.')});"
+)
+DELETE_OLD = "DELETE FROM goods_product_fts WHERE rowid = old.id;"
+
+CREATE_INDEX_SQL = [
+    "CREATE VIRTUAL TABLE goods_product_fts USING fts5("
+    "name, code, description, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO goods_product_fts (rowid, name, code, description) "
+    f"SELECT id, {NORMALIZED.format('')} FROM goods_product",
+    f"CREATE TRIGGER goods_product_fts_ai AFTER INSERT ON goods_product BEGIN {INSERT_NEW} END",
+    f"CREATE TRIGGER goods_product_fts_ad AFTER DELETE ON goods_product BEGIN {DELETE_OLD} END",
+    "CREATE TRIGGER goods_product_fts_au AFTER UPDATE OF name, code, description ON goods_product "
+    f"BEGIN {DELETE_OLD} {INSERT_NEW} END",
+]
+DROP_INDEX_SQL = [
+    "DROP TRIGGER IF EXISTS goods_product_fts_ai",
+    "DROP TRIGGER IF EXISTS goods_product_fts_ad",
+    "DROP TRIGGER IF EXISTS goods_product_fts_au",
+    "DROP TABLE IF EXISTS goods_product_fts",
+]
+
+
+def recreate_search_index(apps, schema_editor):
+    # SQLite пересоздаёт goods_product при добавлении внешнего ключа,
+    # и триггеры полнотекстового индекса (0002) теряются
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_INDEX_SQL + CREATE_INDEX_SQL:
+        schema_editor.execute(sql)
+
+
+def fill_image_fields(apps, schema_editor):
+    # Историческая модель без методов - то же, что Product.refresh_image_fields
+    Product = apps.get_model('goods', 'Product')
+    ProductImage = apps.get_model('files', 'ProductImage')
+    images = ProductImage.objects.filter(product=OuterRef('pk')).order_by()
+    Product.objects.update(
+        main_image=Subquery(images.filter(is_main=True).values('pk')[:1]),
+        images_count=Coalesce(
+            Subquery(images.values('product').annotate(count=Count('pk')).values('count')),
+            0
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0003_productimage_unique_main_product_image'),
+        ('goods', '0004_product_updated_at_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_search_index),
+        migrations.AddField(
+            model_name='product',
+            name='images_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Изображений'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='files.productimage', verbose_name='Главное изображение'),
+        ),
+        migrations.RunPython(fill_image_fields, migrations.RunPython.noop),
+        migrations.RunPython(recreate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    apps.get_model('goods', 'CatalogVersion').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0005_product_images_count_product_main_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменён')),
+            ],
+            options={
+                'verbose_name': 'Версия каталога',
+                'verbose_name_plural': 'Версия каталога',
+            },
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,34 @@
 # app goods/models
-from django.db import models
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Concat, Length, StrIndex, Substr
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.text import slugify
 
+from . import catalog
+from .availability import OUT_OF_STOCK, get_availability
+
 
 class Category(models.Model):
     """
-    Категория товаров
+    Категория товаров.
+
+    Кроме parent дерево хранится материализованным путём path - id предков и самой
+    категории сегментами фиксированной ширины ("00000001/00000005/"). Поддерево
+    выбирается одним диапазоном по индексу path, предки - по id из пути, а сортировка
+    по path даёт обход дерева в глубину. При перемещении пути всего поддерева
+    пересчитываются одним UPDATE.
     """
+    PATH_SEGMENT_WIDTH = 8
+    COUNTS_CACHE_TIMEOUT = 300
+
     name = models.CharField('Название', max_length=255)
     slug = models.SlugField(unique=True, blank=True)
 
@@ -19,6 +40,8 @@ class Category(models.Model):
         blank=True,
         null=True
     )
+    path = models.CharField('Путь в дереве', max_length=255, blank=True, editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField('Уровень', default=0, editable=False)
 
     class Meta:
         app_label = 'goods'
@@ -32,7 +55,145 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_path()
+
+    def clean(self):
+        if self.pk and self.parent_id and (
+            self.parent_id == self.pk or self.parent.path.startswith(self.path or '-')
+        ):
+            raise ValidationError({'parent': 'Категорию нельзя перенести в её собственную подкатегорию'})
+
+    # === Дерево ===
+    @classmethod
+    def path_segment(cls, pk):
+        return f'{pk:0{cls.PATH_SEGMENT_WIDTH}d}/'
+
+    @staticmethod
+    def subtree_q(path, field='path'):
+        """
+        Условие "путь начинается с path" в виде диапазона, чтобы использовался
+        индекс path (LIKE 'x%' в SQLite его не использует). field - путь к полю path.
+        """
+        return Q(**{f'{field}__gte': path, f'{field}__lt': path + '~'})
+
+    def _update_path(self):
+        """Пересчитывает путь категории, а при перемещении - пути всего её поддерева"""
+        paths = dict(Category.objects.filter(pk__in=[self.pk, self.parent_id]).values_list('pk', 'path'))
+        old_path = paths[self.pk]
+        parent_path = paths.get(self.parent_id, '')
+        new_path = parent_path + self.path_segment(self.pk)
+        if old_path and parent_path.startswith(old_path):
+            raise ValidationError('Категорию нельзя перенести в её собственную подкатегорию')
+        if not old_path:
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=self.depth_of(new_path))
+        elif new_path != old_path:
+            Category.objects.filter(self.subtree_q(old_path)).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + self.depth_of(new_path) - self.depth_of(old_path)
+            )
+        self.path, self.depth = new_path, self.depth_of(new_path)
+        catalog.bump_version()
+
+    @classmethod
+    def depth_of(cls, path):
+        """Уровень по длине пути (у корня 0)"""
+        return len(path) // len(cls.path_segment(0)) - 1
+
+    @classmethod
+    def rebuild_paths(cls):
+        """Пересчёт путей всех категорий по parent (после bulk_create и ручных правок БД)"""
+        parents = dict(cls.objects.values_list('pk', 'parent_id'))
+        paths = {}
+
+        def path_of(pk):
+            if pk not in paths:
+                parent_id = parents[pk]
+                paths[pk] = (path_of(parent_id) if parent_id else '') + cls.path_segment(pk)
+            return paths[pk]
+
+        categories = [cls(pk=pk) for pk in parents]
+        for category in categories:
+            category.path = path_of(category.pk)
+            category.depth = cls.depth_of(category.path)
+        cls.objects.bulk_update(categories, ['path', 'depth'], batch_size=1000)
+        catalog.bump_version()
+
+    def ancestor_ids(self):
+        """id предков от корня - прямо из пути, без запросов"""
+        width = len(self.path_segment(0))
+        return [int(self.path[start:start + width - 1]) for start in range(0, len(self.path) - width, width)]
+
+    def get_ancestors(self):
+        """Предки от корня одним запросом"""
+        return Category.objects.filter(pk__in=self.ancestor_ids()).order_by('depth')
+
+    def get_breadcrumbs(self):
+        """Цепочка категорий от корня до этой"""
+        return [*self.get_ancestors(), self]
+
+    def get_descendants(self, include_self=False):
+        """Все подкатегории любого уровня одним запросом по диапазону путей"""
+        queryset = Category.objects.filter(self.subtree_q(self.path))
+        return queryset if include_self else queryset.exclude(pk=self.pk)
+
+    def get_products(self):
+        """Товары категории и всех её подкатегорий"""
+        return Product.objects.filter(self.subtree_q(self.path, 'category__path'))
+
+    @classmethod
+    def get_rolled_up_counts(cls, categories):
+        """
+        {id категории: (товаров, единиц в магазине)} вместе со всеми подкатегориями.
+        Для страницы категорий - три запроса независимо от глубины дерева;
+        результат по каждой категории кэшируется на COUNTS_CACHE_TIMEOUT.
+        """
+        from unit.models import InventoryCounter
+
+        keys = {category.pk: f'category-counts:{category.pk}' for category in categories}
+        cached = cache.get_many(keys.values())
+        result = {pk: cached[key] for pk, key in keys.items() if key in cached}
+        missing = [category for category in categories if category.pk not in result]
+        if not missing:
+            return result
+
+        def subtree(field):
+            return reduce(or_, (cls.subtree_q(category.path, field) for category in missing))
+
+        paths = dict(cls.objects.filter(subtree('path')).values_list('pk', 'path'))
+        products = dict(
+            Product.objects.filter(subtree('category__path'))
+            .order_by().values_list('category_id').annotate(count=Count('pk'))
+        )
+        units = dict(
+            InventoryCounter.objects.filter(subtree('product__category__path'), status='in_store')
+            .order_by().values_list('product__category_id').annotate(count=Sum('count'))
+        )
+
+        totals = {category.pk: [0, 0] for category in missing}
+        for pk, path in paths.items():
+            for ancestor_id in [*Category(path=path).ancestor_ids(), pk]:
+                if ancestor_id in totals:
+                    totals[ancestor_id][0] += products.get(pk, 0)
+                    totals[ancestor_id][1] += units.get(pk, 0)
+        fresh = {pk: tuple(counts) for pk, counts in totals.items()}
+        cache.set_many({keys[pk]: counts for pk, counts in fresh.items()}, cls.COUNTS_CACHE_TIMEOUT)
+        return {**result, **fresh}
+
+
+@receiver(post_delete, sender=Category)
+def reroot_category_subtree(sender, instance, **kwargs):
+    """
+    Подкатегории удалённой категории становятся корнями (parent = NULL через SET_NULL):
+    из путей её поддерева убирается всё до её сегмента включительно.
+    """
+    segment = Category.path_segment(instance.pk)
+    new_path = Substr('path', StrIndex('path', Value(segment)) + len(segment))
+    Category.objects.filter(path__contains=segment).update(
+        path=new_path,
+        depth=Length(new_path) / len(segment) - 1
+    )
 
 
 class Product(models.Model):
@@ -69,24 +230,88 @@ class Product(models.Model):
         auto_now=True,
         verbose_name='Дата последнего обновления'
     )
+    # Денормализация изображений для списков: поддерживается ProductImage (refresh_image_fields)
+    main_image = models.ForeignKey(
+        'files.ProductImage',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name='Главное изображение',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    images_count = models.PositiveIntegerField('Изображений', default=0, editable=False)
 
     class Meta:
         app_label = 'goods'
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ['name']
+        indexes = [
+            # Постраничная выдача каталога по курсору (updated_at, id)
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.code})"
 
+    def get_stock_counts(self) -> dict:
+        """Остатки товара по статусам единиц (из счётчиков, без подсчёта единиц)"""
+        from unit.models import InventoryCounter
+        return InventoryCounter.get_counts(self.pk)
+
     def get_availability_status(self) -> str:
         """
-        Возвращает статус доступности товара
-        (заглушка - нужно реализовать логику)
+        Возвращает статус доступности товара (через кэш наличия, см. goods/availability.py)
+        """
+        availability = get_availability([self.code]).get(self.code)
+        return availability['status'] if availability else OUT_OF_STOCK
+
+    @classmethod
+    def refresh_image_fields(cls, product_ids):
+        """
+        Пересчёт главного изображения и числа изображений товаров одним UPDATE
+        (вызывается при сохранении и удалении ProductImage). Изображения - часть
+        карточки, поэтому сдвигается и updated_at.
         """
-        return "В наличии"
+        from files.models import ProductImage
+
+        images = ProductImage.objects.filter(product=OuterRef('pk')).order_by()
+        cls.objects.filter(pk__in=product_ids).update(
+            main_image=Subquery(images.filter(is_main=True).values('pk')[:1]),
+            images_count=Coalesce(
+                Subquery(images.values('product').annotate(count=Count('pk')).values('count')),
+                0
+            ),
+            updated_at=timezone.now()
+        )
 
     @property
     def images(self):
         """Возвращает все изображения товара"""
-        return self.product_images.all()
\ No newline at end of file
+        return self.product_images.all()
+
+
+class CatalogVersion(models.Model):
+    """
+    Версия каталога для ETag и кэша ответов API (goods/catalog.py).
+    Одна строка; счётчик увеличивается в транзакции изменения каталога.
+    """
+    SINGLETON_PK = 1
+
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    updated_at = models.DateTimeField('Изменён', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Версия каталога'
+        verbose_name_plural = 'Версия каталога'
+
+    def __str__(self):
+        return f"{self.version} ({self.updated_at:%d.%m.%Y %H:%M:%S})"
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def catalog_changed(sender, **kwargs):
+    """Новая версия каталога для ETag и кэша ответов API"""
+    catalog.bump_version()
@@ -0,0 +1,126 @@
+# app goods/search.py
+"""
+Полнотекстовый поиск по товарам.
+
+Индекс - виртуальная таблица SQLite FTS5 goods_product_fts (rowid = id товара),
+которую поддерживают триггеры БД. Поэтому индекс не отстаёт от таблицы товаров
+и при массовых операциях (QuerySet.update, bulk_create), минуя save() и сигналы.
+
+Русские названия: токенизатор unicode61 приводит кириллицу к нижнему регистру,
+а "ё" заменяется на "е" и при индексации, и в запросе. Каждое слово запроса
+ищется как префикс ("дрел" находит "дрель", "дрели"), что заменяет стемминг.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'goods_product_fts'
+
+# Выражение SQL, которым текст нормализуется при индексации (см. normalize)
+_NORMALIZE_SQL = "replace(replace(coalesce({}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+_WORD_RE = re.compile(r'\w+')
+
+# Верхняя граница диапазона для поиска по префиксу через B-tree индекс
+_PREFIX_UPPER_BOUND = '\U0010ffff'
+
+
+def normalize(text):
+    """Нормализация текста так же, как при индексации"""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def is_available(using=None):
+    """Полнотекстовый индекс есть только в SQLite (создаётся миграцией goods)"""
+    return connections[using or 'default'].vendor == 'sqlite'
+
+
+def build_match_query(term):
+    """
+    Строка запроса FTS5: все слова term, каждое как префикс.
+    Пустая строка - если в term нет ни одного слова.
+    """
+    words = _WORD_RE.findall(normalize(term).lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def product_ids_matching(term):
+    """Подзапрос id товаров, у которых название/код/описание содержат все слова term"""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [build_match_query(term)]
+    )
+
+
+def prefix_q(field_name, term):
+    """
+    Условие "field начинается с term" в виде диапазона (field >= term AND field < term + max),
+    чтобы использовался обычный индекс поля - LIKE 'x%' в SQLite его не использует.
+    Проверяются варианты как введено и в верхнем регистре (коды и серийные номера).
+    """
+    condition = Q()
+    for prefix in {term, term.upper()}:
+        condition |= Q(**{
+            f'{field_name}__gte': prefix,
+            f'{field_name}__lt': prefix + _PREFIX_UPPER_BOUND,
+        })
+    return condition
+
+
+def product_q(term, product_field=None, using=None):
+    """
+    Условие "товар найден по строке term": все слова в названии/коде/описании
+    или код начинается с term. product_field - путь к товару (None - сам товар).
+    Возвращает None, если полнотекстовый индекс недоступен или в term нет слов.
+    """
+    term = term.strip()
+    if not is_available(using) or not build_match_query(term):
+        return None
+
+    prefix = f'{product_field}__' if product_field else ''
+    return Q(**{f'{prefix}pk__in': product_ids_matching(term)}) | prefix_q(f'{prefix}code', term)
+
+
+def search_products(queryset, term):
+    """Фильтрует товары по строке поиска; None - если индекс недоступен"""
+    condition = product_q(term, using=queryset.db)
+    return None if condition is None else queryset.filter(condition)
+
+
+def create_index_sql():
+    """SQL создания индекса, его заполнения и триггеров синхронизации"""
+    columns = ('name', 'code', 'description')
+    new_values = ', '.join(_NORMALIZE_SQL.format(f'new.{column}') for column in columns)
+    insert_new = (
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(columns)}) VALUES (new.id, {new_values});"
+    )
+    delete_old = f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id;"
+    select_values = ', '.join(_NORMALIZE_SQL.format(column) for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"{', '.join(columns)}, tokenize = 'unicode61 remove_diacritics 2')",
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(columns)}) "
+        f"SELECT id, {select_values} FROM goods_product",
+        f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON goods_product BEGIN {insert_new} END",
+        f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON goods_product BEGIN {delete_old} END",
+        f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF name, code, description ON goods_product "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def drop_index_sql():
+    return [
+        f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+        f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+        f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    ]
+
+
+def rebuild_index(using='default'):
+    """Пересоздание индекса с нуля (после ручных правок БД или восстановления из копии)"""
+    with connections[using].cursor() as cursor:
+        for sql in drop_index_sql() + create_index_sql():
+            cursor.execute(sql)
@@ -1,3 +1,331 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from files.models import ProductImage
+from unit.models import InventoryCounter, ProductUnit
+from .models import Category, Product
+from . import availability, catalog, search
+
+
+class ProductSearchIndexTest(TestCase):
+    """Полнотекстовый индекс товаров следует за изменениями таблицы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.drill = Product.objects.create(code='DR-100', name='Дрель ударная', description='Ёмкий аккумулятор')
+        cls.saw = Product.objects.create(code='SW-200', name='Пила циркулярная')
+
+    def found(self, term):
+        return set(search.search_products(Product.objects.all(), term))
+
+    def test_russian_words_match_by_prefix_and_case(self):
+        self.assertEqual(self.found('ДРЕЛ'), {self.drill})
+        self.assertEqual(self.found('пила циркул'), {self.saw})
+
+    def test_yo_matches_ye(self):
+        self.assertEqual(self.found('емкий'), {self.drill})
+        self.assertEqual(self.found('ёмкий'), {self.drill})
+
+    def test_code_prefix(self):
+        self.assertEqual(self.found('sw-2'), {self.saw})
+
+    def test_index_follows_bulk_update_and_delete(self):
+        Product.objects.filter(pk=self.saw.pk).update(name='Лобзик')
+        self.assertEqual(self.found('пила'), set())
+        self.assertEqual(self.found('лобзик'), {self.saw})
+
+        self.saw.delete()
+        self.assertEqual(self.found('лобзик'), set())
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5-индекс есть только в SQLite')
+    def test_index_and_triggers_exist_after_migrate(self):
+        # Пересоздание таблицы товаров в SQLite (AlterField, AddField с ключом)
+        # удаляет триггеры - миграция, которая это делает, должна их вернуть
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+                [f'{search.FTS_TABLE}%']
+            )
+            names = {name for name, in cursor.fetchall()}
+        self.assertLessEqual(
+            {search.FTS_TABLE, *(f'{search.FTS_TABLE}_{suffix}' for suffix in ('ai', 'ad', 'au'))}, names
+        )
+
+    def test_unit_serial_prefix(self):
+        unit = ProductUnit.objects.create(product=self.drill)
+        condition = search.prefix_q('serial_number', unit.serial_number[:-2].lower())
+
+        self.assertEqual(list(ProductUnit.objects.filter(condition)), [unit])
+
+
+class CategoryTreeTest(TestCase):
+    """Материализованный путь дерева категорий"""
+
+    def setUp(self):
+        cache.clear()
+        self.tools = Category.objects.create(name='Инструменты', slug='tools')
+        self.power = Category.objects.create(name='Электроинструмент', slug='power', parent=self.tools)
+        self.drills = Category.objects.create(name='Дрели', slug='drills', parent=self.power)
+        self.garden = Category.objects.create(name='Сад', slug='garden')
+
+    def refresh(self):
+        for category in (self.tools, self.power, self.drills, self.garden):
+            category.refresh_from_db()
+
+    def test_subtree_ancestors_and_breadcrumbs_in_one_query(self):
+        self.assertEqual(self.drills.depth, 2)
+        self.assertEqual(set(self.tools.get_descendants()), {self.power, self.drills})
+        with self.assertNumQueries(1):
+            self.assertEqual(self.drills.get_breadcrumbs(), [self.tools, self.power, self.drills])
+
+    def test_move_updates_whole_subtree(self):
+        self.power.parent = self.garden
+        self.power.save()
+        self.refresh()
+
+        self.assertEqual(self.drills.get_breadcrumbs(), [self.garden, self.power, self.drills])
+        self.assertEqual((self.power.depth, self.drills.depth), (1, 2))
+        self.assertEqual(list(self.tools.get_descendants()), [])
+
+        self.power.parent = None
+        self.power.save()
+        self.drills.refresh_from_db()
+        self.assertEqual((self.drills.depth, self.drills.ancestor_ids()), (1, [self.power.pk]))
+
+    def test_cannot_move_into_own_subtree(self):
+        self.tools.parent = self.drills
+        with self.assertRaises(ValidationError):
+            self.tools.full_clean()
+        with self.assertRaises(ValidationError):
+            self.tools.save()
+        self.refresh()
+        self.assertIsNone(self.tools.parent_id)
+
+    def test_deleted_category_subtree_becomes_root(self):
+        self.power.delete()
+        self.drills.refresh_from_db()
+
+        self.assertIsNone(self.drills.parent_id)
+        self.assertEqual((self.drills.depth, self.drills.path), (0, Category.path_segment(self.drills.pk)))
+
+    def test_rebuild_paths_after_bulk_create(self):
+        child, = Category.objects.bulk_create([Category(name='Пилы', slug='saws', parent=self.power)])
+        Category.rebuild_paths()
+        child.refresh_from_db()
+
+        self.assertEqual(child.ancestor_ids(), [self.tools.pk, self.power.pk])
+        self.assertIn(child, self.tools.get_descendants())
+
+    def test_rolled_up_counts_and_products(self):
+        drill = Product.objects.create(code='CT-1', name='Дрель', category=self.drills)
+        Product.objects.create(code='CT-2', name='Ящик', category=self.tools)
+        InventoryCounter.objects.create(product=drill, status='in_store', count=3)
+
+        counts = Category.get_rolled_up_counts([self.tools, self.power, self.garden])
+
+        self.assertEqual(counts, {self.tools.pk: (2, 3), self.power.pk: (1, 3), self.garden.pk: (0, 0)})
+        self.assertEqual(list(self.power.get_products()), [drill])
+        with self.assertNumQueries(0):
+            Category.get_rolled_up_counts([self.tools])
+
+
+class CategoryChangelistTest(TestCase):
+    """Число запросов списка категорий не зависит от их количества"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def count_changelist_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:goods_category_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def create_branch(self, size):
+        root = Category.objects.create(name=f'Корень {size}', slug=f'root-{size}')
+        for index in range(size):
+            child = Category.objects.create(name=f'Ветка {size}-{index}', slug=f'branch-{size}-{index}', parent=root)
+            Product.objects.create(code=f'CL-{size}-{index}', name='Товар', category=child)
+
+    def test_query_count_does_not_depend_on_number_of_categories(self):
+        self.create_branch(2)
+        few = self.count_changelist_queries()
+        self.create_branch(20)
+        self.assertEqual(self.count_changelist_queries(), few)
+
+
+class CatalogApiTest(TestCase):
+    """JSON-каталог: курсор, изображения без N+1 и условные GET"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tools = Category.objects.create(name='Инструменты', slug='api-tools')
+        cls.drills = Category.objects.create(name='Дрели', slug='api-drills', parent=cls.tools)
+        cls.products = [
+            Product.objects.create(code=f'API-{index}', name=f'Товар {index}', category=cls.drills)
+            for index in range(5)
+        ]
+        Product.objects.create(code='API-OTHER', name='Без категории')
+        for product in cls.products:
+            ProductImage.objects.create(product=product, image=f'products/{product.code}/main.jpg', is_main=True)
+            ProductImage.objects.create(product=product, image=f'products/{product.code}/side.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, params=None, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {}, **headers)
+        return response, len(queries)
+
+    def test_cursor_pages_through_category_subtree(self):
+        url = reverse('goods:product_list')
+        first, queries = self.get(url, {'category': self.tools.pk, 'limit': 3})
+        data = first.json()
+        second = self.client.get(data['next']).json()
+
+        codes = [item['code'] for item in data['results'] + second['results']]
+        self.assertEqual(sorted(codes), sorted(product.code for product in self.products))
+        self.assertIsNone(second['next'])
+        self.assertEqual(len(data['results'][0]['images']), 2)
+        self.assertTrue(data['results'][0]['images'][0]['is_main'])
+        # Версия каталога, категория, товары страницы, изображения страницы
+        self.assertEqual(queries, 4)
+
+    def test_conditional_get_returns_304_after_version_lookup(self):
+        url = reverse('goods:product_list')
+        response, _ = self.get(url)
+        etag = response['ETag']
+
+        cached, queries = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((cached.status_code, queries), (304, 1))
+        since, queries = self.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual((since.status_code, queries), (304, 1))
+
+    def test_product_change_invalidates_cached_list(self):
+        url = reverse('goods:product_list')
+        etag = self.client.get(url)['ETag']
+        _, queries = self.get(url)
+        self.assertEqual(queries, 1)  # версия каталога, ответ из кэша
+
+        product = self.products[0]
+        product.name = 'Переименован'
+        product.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Переименован', [item['name'] for item in response.json()['results']])
+
+    def test_version_bumped_by_another_process_is_visible(self):
+        url = reverse('goods:product_list')
+        etag = self.client.get(url)['ETag']
+
+        # Другой рабочий процесс со своим локальным кэшем меняет каталог
+        with mock.patch.object(catalog, 'cache', LocMemCache('other-worker', {})):
+            Product.objects.filter(code='API-OTHER').get().save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_etag_follows_updated_at_and_images(self):
+        product = self.products[0]
+        url = reverse('goods:product_detail', args=[product.code])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        ProductImage.objects.filter(product=product, is_main=False).first().delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['images']), 1)
+        self.assertEqual(self.client.get(reverse('goods:product_detail', args=['NOPE'])).status_code, 404)
+
+    def test_categories_in_tree_order(self):
+        response = self.client.get(reverse('goods:category_list'), {'limit': 1})
+        data = response.json()
+
+        self.assertEqual([item['id'] for item in data['results']], [self.tools.pk])
+        self.assertEqual(
+            [item['id'] for item in self.client.get(data['next']).json()['results']], [self.drills.pk]
+        )
+
+    def test_bad_cursor(self):
+        response = self.client.get(reverse('goods:product_list'), {'cursor': '!!!'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AvailabilityTest(TestCase):
+    """Наличие по списку кодов: один запрос на корзину, кэш сбрасывается сменой статуса единиц"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = Product.objects.bulk_create([
+            Product(code=f'AV-{index:03d}', name=f'Товар {index}') for index in range(200)
+        ])
+        cls.codes = [product.code for product in cls.products]
+
+    def setUp(self):
+        availability.cache.invalidate()
+
+    def test_whole_basket_in_one_query_then_from_cache(self):
+        ProductUnit.objects.bulk_create(
+            [ProductUnit(product=self.products[0], status='in_store') for _ in range(3)]
+            + [ProductUnit(product=self.products[1], status='in_delivery')]
+        )
+
+        with self.assertNumQueries(1):
+            result = availability.get_availability(self.codes + ['NOPE'])
+        with self.assertNumQueries(0):
+            self.assertEqual(availability.get_availability(self.codes), result)
+
+        self.assertEqual(len(result), 200)
+        self.assertEqual(result['AV-000'], {'in_store': 3, 'expected': 0, 'status': 'В наличии'})
+        self.assertEqual(result['AV-001']['status'], 'Ожидается поставка')
+        self.assertEqual(result['AV-002']['status'], 'Нет в наличии')
+
+    def test_unit_status_change_invalidates_cache(self):
+        unit = ProductUnit.objects.create(product=self.products[5], status='in_delivery')
+        self.assertEqual(self.products[5].get_availability_status(), 'Ожидается поставка')
+
+        ProductUnit.objects.filter(pk=unit.pk).update(status='in_store')
+
+        self.assertEqual(availability.get_availability(['AV-005'])['AV-005']['in_store'], 1)
+
+    def test_cache_evicts_least_recently_used_and_expires(self):
+        cache = availability.AvailabilityCache(size=2, ttl=60)
+        cache.set_many({'A': (1, 'a'), 'B': (2, 'b')})
+        cache.get_many(['A'])
+        cache.set_many({'C': (3, 'c')})
+        self.assertEqual(cache.get_many(['A', 'B', 'C']), {'A': 'a', 'C': 'c'})
+
+        cache.invalidate([1])
+        self.assertEqual(cache.get_many(['A', 'C']), {'C': 'c'})
+
+        cache.ttl = -1
+        cache.set_many({'D': (4, 'd')})
+        self.assertEqual(cache.get_many(['D']), {})
+
+    def test_api(self):
+        response = self.client.get(reverse('goods:availability'), {'codes': 'AV-000,NOPE'})
 
-# Create your tests here.
+        self.assertEqual(response.json(), {
+            'results': {'AV-000': {'in_store': 0, 'expected': 0, 'status': 'Нет в наличии'}},
+            'unknown': ['NOPE'],
+        })
+        too_many = ','.join(['X'] * 501)
+        self.assertEqual(self.client.get(reverse('goods:availability'), {'codes': too_many}).status_code, 400)
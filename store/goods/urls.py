@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'goods'
+
+urlpatterns = [
+    path('products/', views.product_list, name='product_list'),
+    path('products/<str:code>/', views.product_detail, name='product_detail'),
+    path('availability/', views.availability, name='availability'),
+    path('categories/', views.category_list, name='category_list'),
+]
@@ -1,3 +1,229 @@
-from django.shortcuts import render
+# app goods/views.py
+"""
+Каталог товаров для кассы и сайта: JSON только для чтения.
 
-# Create your views here.
+Списки постраничные по курсору (сортировка по ключу, без OFFSET и COUNT),
+изображения подгружаются одним запросом на страницу. Условные GET
+обрабатываются до построения ответа (см. goods/catalog.py).
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch, Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
+
+from files.models import ProductImage
+from . import catalog
+from .availability import get_availability
+from .models import Category, Product
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Максимум кодов в одном запросе наличия (лимит параметров SQLite)
+MAX_AVAILABILITY_CODES = 500
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _json(content):
+    response = HttpResponse(content, content_type='application/json')
+    # Клиент может хранить ответ, но перед использованием переспрашивает (получая 304)
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    return response
+
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error):
+        raise BadRequest('Неверный курсор')
+
+
+def _page_size(request):
+    try:
+        return min(max(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise BadRequest('limit должен быть числом')
+
+
+def _next_url(request, cursor):
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def _serialize_product(product, request):
+    return {
+        'id': product.pk,
+        'code': product.code,
+        'name': product.name,
+        'description': product.description or '',
+        'category': product.category_id,
+        'updated_at': product.updated_at,
+        'main_image': product.main_image and request.build_absolute_uri(
+            product.main_image.thumbnail_url('catalog')
+        ),
+        'images_count': product.images_count,
+        'images': [
+            {
+                'url': request.build_absolute_uri(image.image.url),
+                'thumbnail': request.build_absolute_uri(image.thumbnail_url('catalog')),
+                'is_main': image.is_main,
+                'width': image.width,
+                'height': image.height,
+            }
+            for image in product.product_images.all()
+        ],
+    }
+
+
+def _products():
+    return Product.objects.select_related('main_image').prefetch_related(
+        Prefetch('product_images', queryset=ProductImage.objects.order_by('-is_main', 'created_at', 'pk'))
+    )
+
+
+def _bad_request(view):
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return JsonResponse({'error': str(error)}, status=400)
+    return wrapper
+
+
+@require_GET
+@condition(etag_func=catalog.etag, last_modified_func=catalog.last_modified)
+@_bad_request
+def product_list(request):
+    """
+    Товары по (updated_at, id): новые и изменённые - в конце, поэтому клиент
+    может продолжать синхронизацию с последнего курсора.
+    Параметры: category - id категории (с подкатегориями), limit, cursor.
+    """
+    size = _page_size(request)
+    queryset = _products().order_by('updated_at', 'pk')
+
+    category_id = request.GET.get('category')
+    if category_id:
+        path = None
+        if category_id.isdigit():
+            path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first()
+        if path is None:
+            raise BadRequest('Неизвестная категория')
+        queryset = queryset.filter(Category.subtree_q(path, 'category__path'))
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            updated_at, pk = _decode_cursor(cursor)
+            updated_at = datetime.fromisoformat(updated_at)
+        except (TypeError, ValueError):
+            raise BadRequest('Неверный курсор')
+        # Граница updated_at >= x позволяет СУБД сразу сузить диапазон индекса
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk),
+            updated_at__gte=updated_at
+        )
+
+    def build():
+        products = list(queryset[:size + 1])
+        more = len(products) > size
+        products = products[:size]
+        next_url = None
+        if more:
+            last = products[-1]
+            next_url = _next_url(request, _encode_cursor([last.updated_at.isoformat(), last.pk]))
+        return json.dumps({
+            'results': [_serialize_product(product, request) for product in products],
+            'next': next_url,
+        }, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+    return _json(catalog.cached_response(request, build))
+
+
+def _product_updated_at(request, code):
+    return Product.objects.filter(code=code).values_list('updated_at', flat=True).first()
+
+
+def _product_etag(request, code):
+    updated_at = _product_updated_at(request, code)
+    return f'{code}-{updated_at.timestamp():.6f}' if updated_at else None
+
+
+@require_GET
+@condition(etag_func=_product_etag, last_modified_func=_product_updated_at)
+def product_detail(request, code):
+    """Карточка товара по коду; ETag и Last-Modified - по Product.updated_at"""
+    def build():
+        product = _products().filter(code=code).first()
+        if product is None:
+            return None
+        return json.dumps(_serialize_product(product, request), cls=DjangoJSONEncoder, ensure_ascii=False)
+
+    content = catalog.cached_response(request, build)
+    if content is None:
+        raise Http404('Товар не найден')
+    return _json(content)
+
+
+@require_GET
+@condition(etag_func=catalog.etag, last_modified_func=catalog.last_modified)
+@_bad_request
+def category_list(request):
+    """Категории в порядке обхода дерева (по path). Параметры: limit, cursor."""
+    size = _page_size(request)
+    queryset = Category.objects.order_by('path', 'pk')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        path = _decode_cursor(cursor)
+        if not isinstance(path, str):
+            raise BadRequest('Неверный курсор')
+        queryset = queryset.filter(path__gt=path)
+
+    def build():
+        categories = list(queryset.values('id', 'name', 'slug', 'parent_id', 'depth', 'path')[:size + 1])
+        more = len(categories) > size
+        categories = categories[:size]
+        return json.dumps({
+            'results': [
+                {key: value for key, value in category.items() if key != 'path'} for category in categories
+            ],
+            'next': _next_url(request, _encode_cursor(categories[-1]['path'])) if more else None,
+        }, ensure_ascii=False)
+
+    return _json(catalog.cached_response(request, build))
+
+
+@require_GET
+def availability(request):
+    """
+    Наличие товаров корзины или страницы каталога одним запросом.
+    Параметр codes - коды товаров через запятую (или несколько параметров codes).
+    Ответ: {"results": {код: {"in_store", "expected", "status"}}, "unknown": [коды]}.
+    """
+    codes = [
+        code.strip()
+        for value in request.GET.getlist('codes')
+        for code in value.split(',')
+        if code.strip()
+    ]
+    if len(codes) > MAX_AVAILABILITY_CODES:
+        return JsonResponse({'error': f'Не более {MAX_AVAILABILITY_CODES} кодов за запрос'}, status=400)
+
+    results = get_availability(codes)
+    return JsonResponse({
+        'results': results,
+        'unknown': [code for code in dict.fromkeys(codes) if code not in results],
+    })
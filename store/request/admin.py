@@ -4,15 +4,19 @@ from django.urls import reverse
 from django.utils.html import format_html
 from django.core.exceptions import ValidationError
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from goods import search
 from .models import Request, RequestItem
 from unit.models import ProductUnit
+from unit.filters import LazyFilterMixin, LazyRelatedFieldListFilter
+from unit.paginators import KeysetPaginationMixin, autocomplete_source, is_autocomplete
 
 
 class RequestItemForm(forms.ModelForm):
     class Meta:
         model = RequestItem
-        fields = ['product_unit', 'quantity', 'price_per_unit', 'supplier']
+        fields = ['product', 'product_unit', 'quantity', 'price_per_unit', 'supplier']
         widgets = {
             'quantity': forms.NumberInput(attrs={'min': 1}),
             'price_per_unit': forms.NumberInput(attrs={'min': 0.01, 'step': 0.01})
@@ -20,6 +24,11 @@ class RequestItemForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # Товар можно не указывать при выборе единицы - он берётся из неё (RequestItem.clean)
+        self.fields['product'].required = False
+        # Виджет автодополнения выводит только выбранную единицу, а варианты
+        # подгружает постранично (ProductUnitAdmin.get_search_results);
+        # queryset здесь нужен лишь для проверки выбранного значения
         queryset = ProductUnit.objects.filter(status='candidate_in_request')
 
         if self.instance and self.instance.pk:
@@ -32,8 +41,9 @@ class RequestItemInline(admin.TabularInline):
     model = RequestItem
     form = RequestItemForm
     extra = 1
-    fields = ['product_unit', 'quantity', 'price_per_unit', 'supplier', 'total_cost']
+    fields = ['product', 'product_unit', 'quantity', 'price_per_unit', 'supplier', 'total_cost']
     readonly_fields = ['total_cost']
+    autocomplete_fields = ['product', 'product_unit']
     verbose_name = "Позиция заявки"
     min_num = 1
 
@@ -42,10 +52,33 @@ class RequestItemInline(admin.TabularInline):
 
 
 @admin.register(RequestItem)
-class RequestItemAdmin(admin.ModelAdmin):
-    list_display = ['id', 'request', 'product_unit', 'quantity', 'price_per_unit', 'supplier']
-    list_filter = ['request', 'supplier']
-    search_fields = ['product_unit__product__name']
+class RequestItemAdmin(LazyFilterMixin, KeysetPaginationMixin, admin.ModelAdmin):
+    list_display = ['id', 'request', 'product', 'quantity', 'price_per_unit', 'supplier']
+    list_select_related = ['request', 'product', 'supplier']
+    ordering = ['-id']  # сортировка по ключу - для постраничного поиска без OFFSET
+    list_filter = [('request', LazyRelatedFieldListFilter), 'supplier']
+    search_fields = ['product__name', 'product__code', 'request__id']
+    autocomplete_fields = ['product', 'product_unit']
+
+    # Поле позиции поставки, для которого автодополнение предлагает только строки незавершённых заявок
+    OPEN_AUTOCOMPLETE_FIELDS = {('delivery', 'deliveryitem', 'request_item')}
+
+    def get_search_results(self, request, queryset, search_term):
+        if is_autocomplete(request):
+            # Текст варианта - название товара строки
+            queryset = queryset.select_related('product')
+            if autocomplete_source(request) in self.OPEN_AUTOCOMPLETE_FIELDS:
+                queryset = queryset.filter(request__is_completed=False)
+
+        # Товар - через полнотекстовый индекс товаров, номер заявки - точным совпадением
+        condition = search.product_q(search_term, product_field='product', using=queryset.db)
+        if condition is None:
+            return super().get_search_results(request, queryset, search_term)
+
+        term = search_term.strip()
+        if term.isdigit():
+            condition |= Q(request_id=int(term))
+        return queryset.filter(condition), False
 
 
 @admin.register(Request)
@@ -53,6 +86,7 @@ class RequestAdmin(admin.ModelAdmin):
     inlines = [RequestItemInline]
     list_display = ['id', 'created_at', 'status_badge', 'total_units', 'total_amount', 'units_link']
     list_filter = ['created_at', 'is_completed']
+    search_fields = ['=id', 'notes']  # для фильтров и автодополнения по заявке
     fieldsets = (
         (None, {'fields': ('is_completed', 'notes')}),
         ('Системная информация', {'fields': ('created_at',), 'classes': ('collapse',)}),
@@ -60,12 +94,25 @@ class RequestAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
     actions = ['mark_as_completed', 'mark_as_in_progress', 'view_units_in_request']
 
+    def get_queryset(self, request):
+        # Итоги по позициям считаются в БД одним GROUP BY, а не по строке в Python
+        return super().get_queryset(request).annotate(
+            items_count=Count('items'),
+            units_total=Coalesce(Sum('items__quantity'), 0),
+            amount_total=Coalesce(
+                Sum(F('items__quantity') * F('items__price_per_unit')),
+                Value(0),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            ),
+        )
+
     def units_link(self, obj):
         url = reverse(
             'admin:unit_productunit_changelist') + f'?status=in_request&request_item__request__id__exact={obj.id}'
-        return format_html('<a href="{}">Юниты ({})</a>', url, obj.items.count())
+        return format_html('<a href="{}">Юниты ({})</a>', url, obj.items_count)
 
     units_link.short_description = 'Юниты'
+    units_link.admin_order_field = 'items_count'
 
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
@@ -75,11 +122,16 @@ class RequestAdmin(admin.ModelAdmin):
             instance.save()
 
     def total_units(self, obj):
-        return sum(item.quantity for item in obj.items.all())
+        return obj.units_total
+
+    total_units.short_description = 'Единиц'
+    total_units.admin_order_field = 'units_total'
 
     def total_amount(self, obj):
-        total = sum(item.total_cost for item in obj.items.all() if item.price_per_unit)
-        return f"{total:.2f} ₽"
+        return f"{obj.amount_total:.2f} ₽"
+
+    total_amount.short_description = 'Сумма'
+    total_amount.admin_order_field = 'amount_total'
 
     def status_badge(self, obj):
         color = '#4CAF50' if obj.is_completed else '#FF9800'
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('request', '0002_remove_requestitem_product_requestitem_product_unit'),
+        ('unit', '0008_productunit_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='requestitem',
+            name='product_unit',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='unit.productunit'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_request_item_product(apps, schema_editor):
+    # Товар строки - из её единицы (product_unit), привязанных единиц или архива
+    RequestItem = apps.get_model('request', 'RequestItem')
+    ProductUnit = apps.get_model('unit', 'ProductUnit')
+    ArchivedProductUnit = apps.get_model('unit', 'ArchivedProductUnit')
+    RequestItem.objects.filter(product__isnull=True).update(
+        product=Coalesce(
+            Subquery(ProductUnit.objects.filter(pk=OuterRef('product_unit')).values('product')[:1]),
+            Subquery(ProductUnit.objects.filter(request_item=OuterRef('pk')).values('product')[:1]),
+            Subquery(ArchivedProductUnit.objects.filter(request_item=OuterRef('pk')).values('product')[:1]),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0002_product_search_index'),
+        ('request', '0003_alter_requestitem_product_unit'),
+        ('unit', '0009_archivedproductunit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestitem',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='request_items', to='goods.product', verbose_name='Товар'),
+        ),
+        migrations.AlterField(
+            model_name='requestitem',
+            name='product_unit',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='unit.productunit'),
+        ),
+        migrations.RunPython(fill_request_item_product, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from datetime import timezone
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
+from django.db.models import Count, Q, Value
+from django.db.models.functions import Coalesce
 
 class Request(models.Model):
     """Заявка (заголовок)"""
@@ -16,10 +18,58 @@ class Request(models.Model):
     def __str__(self):
         return f"Заявка #{self.id}"
 
+    def add_units(self, units, supplier=None):
+        """
+        Добавляет единицы (QuerySet ProductUnit) в заявку строками товар x цена:
+        одна строка на группу с количеством, единицы привязываются к строке и
+        переводятся в in_request. Цена - из поставки единицы, если она есть,
+        иначе 0 до уточнения (RequestItem.clean это допускает).
+        Число запросов зависит от количества строк, а не единиц. Возвращает строки.
+        """
+        price = Coalesce('delivery_item__price_per_unit', Value(0), output_field=models.DecimalField())
+        groups = list(
+            units.order_by().values('product_id').annotate(price=price, count=Count('pk'))
+            .values_list('product_id', 'price', 'count')
+        )
+        with transaction.atomic():
+            lines = RequestItem.objects.bulk_create([
+                RequestItem(
+                    request=self,
+                    product_id=product_id,
+                    supplier=supplier,
+                    quantity=count,
+                    price_per_unit=price
+                )
+                for product_id, price, count in groups
+            ])
+            for line in lines:
+                line_units = units.filter(product_id=line.product_id)
+                if line.price_per_unit:
+                    line_units = line_units.filter(delivery_item__price_per_unit=line.price_per_unit)
+                else:
+                    line_units = line_units.filter(
+                        Q(delivery_item__isnull=True) | Q(delivery_item__price_per_unit=0)
+                    )
+                line_units.transition('in_request', request_item=line)
+        return lines
+
 
 class RequestItem(models.Model):
+    """
+    Строка заявки: товар x поставщик x цена с количеством.
+    Единицы строки привязаны к ней через ProductUnit.request_item (related_name='units');
+    product_unit - ссылка строки, заведённой вручную на одну единицу.
+    """
     request = models.ForeignKey('Request', on_delete=models.CASCADE, related_name='items')
-    product_unit = models.ForeignKey('unit.ProductUnit', on_delete=models.PROTECT)  # Изменено с product на product_unit
+    product = models.ForeignKey(
+        'goods.Product',
+        on_delete=models.PROTECT,
+        null=True,
+        related_name='request_items',
+        verbose_name='Товар'
+    )
+    # При переносе единицы в архив ссылка обнуляется
+    product_unit = models.ForeignKey('unit.ProductUnit', on_delete=models.SET_NULL, null=True, blank=True)
     quantity = models.PositiveIntegerField(default=1)
     price_per_unit = models.DecimalField(max_digits=10, decimal_places=2)
     supplier = models.ForeignKey(
@@ -29,31 +79,48 @@ class RequestItem(models.Model):
         blank=True
     )
 
-    @property
-    def product(self):
-        """Для обратной совместимости с кодом, ожидающим product"""
-        return self.product_unit.product
-
     def save(self, *args, **kwargs):
-        if not self.pk:  # Только при создании
-            self._update_unit_status()
+        self._fill_product()
+        creating = not self.pk
         super().save(*args, **kwargs)
+        if creating and self.product_unit_id:  # Только при создании
+            self._update_unit_status()
+
+    def _fill_product(self):
+        """Товар строки, заведённой на одну единицу, берётся из единицы"""
+        if self.product_unit_id and not self.product_id:
+            self.product_id = self.product_unit.product_id
 
     def _update_unit_status(self):
-        """Обновляет статус product_unit"""
-        if self.product_unit.status != 'in_request':
-            self.product_unit.status = 'in_request'
-            self.product_unit.save()
+        """Переводит product_unit в статус in_request и привязывает к строке"""
+        unit = self.product_unit
+        if unit.status != 'in_request' or unit.request_item_id != self.pk:
+            unit.status = 'in_request'
+            unit.request_item = self
+            unit.save()
+
+    def _has_units(self):
+        """
+        К строке привязаны единицы - строка собрана Request.add_units, и у единиц
+        без поставки цена ещё не известна (0 до уточнения)
+        """
+        return bool(self.pk) and self.units.exists()
 
     @property
     def total_cost(self):
         return self.price_per_unit * self.quantity
 
     def clean(self):
-        if self.price_per_unit <= 0:
+        self._fill_product()
+        if not self.product_id:
+            raise ValidationError("Укажите товар или единицу товара")
+        if self.product_unit_id and self.product_unit.product_id != self.product_id:
+            raise ValidationError("Единица относится к другому товару")
+        if self.price_per_unit < 0 or (self.price_per_unit == 0 and not self._has_units()):
             raise ValidationError("Цена должна быть положительной")
         if self.quantity < 1:
             raise ValidationError("Количество не может быть меньше 1")
 
     def __str__(self):
-        return f"{self.product_unit.product.name} x{self.quantity} ({self.price_per_unit} ₽)"
\ No newline at end of file
+        name = self.product.name if self.product_id else '—'
+        return f"{name} x{self.quantity} ({self.price_per_unit} ₽)"
\ No newline at end of file
@@ -1,3 +1,151 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from goods.models import Product
+from unit.models import ProductUnit
+from .models import Request, RequestItem
+
+
+class RequestChangelistTotalsTest(TestCase):
+    """Итоги заявок в списке считаются в БД"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.product = Product.objects.create(code='RQ-1', name='Дрель')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_request(self, prices):
+        request = Request.objects.create()
+        units = ProductUnit.objects.bulk_create([ProductUnit(product=self.product) for _ in prices])
+        RequestItem.objects.bulk_create([
+            RequestItem(request=request, product=self.product, product_unit=unit, quantity=2, price_per_unit=price)
+            for unit, price in zip(units, prices)
+        ])
+        return request
+
+    def get_changelist(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:request_request_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_totals_and_query_count(self):
+        self.create_request([10, 20])
+        _, few_items = self.get_changelist()
+
+        big = self.create_request([5] * 50)
+        response, many_items = self.get_changelist()
+
+        self.assertEqual(few_items, many_items)
+        row = response.context['cl'].result_list.get(pk=big.pk)
+        self.assertEqual((row.items_count, row.units_total, row.amount_total), (50, 100, 500))
+
+    def test_sortable_by_amount(self):
+        cheap = self.create_request([1])
+        expensive = self.create_request([100])
+
+        response, _ = self.get_changelist(o='-5')
+
+        self.assertEqual([obj.pk for obj in response.context['cl'].result_list], [expensive.pk, cheap.pk])
+
+
+class RequestAddUnitsTest(TestCase):
+    """Единицы добавляются в заявку строками товар x цена с количеством"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.drill = Product.objects.create(code='RQ-2', name='Дрель')
+        cls.saw = Product.objects.create(code='RQ-3', name='Пила')
+
+    def test_groups_units_by_product(self):
+        ProductUnit.objects.bulk_create(
+            [ProductUnit(product=self.drill, status='candidate_in_request') for _ in range(3)]
+            + [ProductUnit(product=self.saw, status='candidate_in_request') for _ in range(2)]
+        )
+        request = Request.objects.create()
+
+        lines = request.add_units(ProductUnit.objects.filter(status='candidate_in_request'))
+
+        self.assertEqual(
+            sorted((line.product_id, line.quantity) for line in lines),
+            [(self.drill.pk, 3), (self.saw.pk, 2)]
+        )
+        self.assertFalse(ProductUnit.objects.exclude(status='in_request').exists())
+        for line in request.items.all():
+            self.assertEqual(line.units.count(), line.quantity)
+            self.assertTrue(all(unit.product_id == line.product_id for unit in line.units.all()))
+
+    def test_lines_without_known_price_pass_validation(self):
+        ProductUnit.objects.create(product=self.drill, status='candidate_in_request')
+
+        line, = Request.objects.create().add_units(ProductUnit.objects.filter(product=self.drill))
+
+        self.assertEqual(line.price_per_unit, 0)
+        line.full_clean()
+        with self.assertRaises(ValidationError):
+            RequestItem(request=line.request, product=self.drill, price_per_unit=0).full_clean()
+
+    def test_single_unit_line_links_unit(self):
+        unit = ProductUnit.objects.create(product=self.drill)
+
+        line = RequestItem.objects.create(request=Request.objects.create(), product_unit=unit, price_per_unit=10)
+
+        unit.refresh_from_db()
+        self.assertEqual(line.product, self.drill)
+        self.assertEqual((unit.status, unit.request_item_id), ('in_request', line.pk))
+
+
+class ProductUnitAutocompleteTest(TestCase):
+    """Единица в строке заявки выбирается автодополнением, а не списком всех кандидатов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.product = Product.objects.create(code='RQ-4', name='Перфоратор')
+        ProductUnit.objects.bulk_create(
+            [ProductUnit(product=cls.product, status='candidate_in_request') for _ in range(30)]
+            + [ProductUnit(product=cls.product, status='in_store') for _ in range(5)]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def autocomplete(self, **params):
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'request', 'model_name': 'requestitem', 'field_name': 'product_unit', **params
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_change_form_does_not_render_candidates(self):
+        response = self.client.get(reverse('admin:request_request_add'))
+
+        self.assertNotContains(response, 'RF-')
+
+    def test_pages_through_candidates_only(self):
+        first = self.autocomplete()
+        second = self.autocomplete(page=2)
+
+        self.assertEqual((len(first['results']), first['pagination']['more']), (20, True))
+        self.assertEqual((len(second['results']), second['pagination']['more']), (10, False))
+        ids = {int(result['id']) for result in first['results'] + second['results']}
+        self.assertEqual(
+            ids, set(ProductUnit.objects.filter(status='candidate_in_request').values_list('pk', flat=True))
+        )
+
+    def test_searches_by_product_and_serial(self):
+        unit = ProductUnit.objects.filter(status='candidate_in_request').first()
+
+        self.assertEqual(len(self.autocomplete(term='перфор')['results']), 20)
+        self.assertEqual(
+            [result['id'] for result in self.autocomplete(term=unit.serial_number)['results']], [str(unit.pk)]
+        )
@@ -82,6 +82,18 @@ WSGI_APPLICATION = 'store.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 MEDIA_URL = '/media/'  # URL-префикс для медиафайлов
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # Абсолютный путь к папке с медиа
+# Отдача медиафайлов фронтенд-сервером (см. files/serving.py), задаётся окружением:
+# * MEDIA_ACCEL_REDIRECT_PREFIX=/protected-media/ - X-Accel-Redirect для nginx,
+#   которому нужен внутренний location с этим префиксом:
+#       location /protected-media/ {
+#           internal;
+#           alias /path/to/media/;  # MEDIA_ROOT с завершающим /
+#       }
+# * MEDIA_SENDFILE=1 - X-Sendfile (Apache mod_xsendfile, lighttpd).
+# Без них файлы отдаёт Django - это только для разработки: при DEBUG = False
+# manage.py check --deploy сообщает ошибку files.E001 (files/checks.py).
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX') or None
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '').lower() in ('1', 'true', 'yes', 'on')
 
 # Настройки для статических файлов (CSS, JS и т.д.)
 STATIC_URL = '/static/'
@@ -131,3 +143,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Архив единиц товаров: закрытые единицы (продан, сломан, утерян, передан),
+# не менявшиеся дольше этого срока, переносятся командой archive_product_units
+UNIT_ARCHIVE_AFTER_DAYS = 365
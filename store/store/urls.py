@@ -15,10 +15,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from files.views import media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('delivery/', include('delivery.urls')),
+    path('api/catalog/', include('goods.urls')),
+    path('files/', include('files.urls')),
+    # Медиафайлы: в продакшене отдаёт фронтенд-сервер по X-Accel-Redirect/X-Sendfile
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:name>', media, name='media'),
+]
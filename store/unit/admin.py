@@ -4,7 +4,10 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.contrib import messages
 from django.db.models import Q
-from .models import ProductUnit
+from goods import search
+from .models import ArchivedProductUnit, InventoryCounter, ProductUnit
+from .filters import LazyFilterMixin, LazyRelatedFieldListFilter
+from .paginators import KeysetPaginationMixin, autocomplete_source, is_autocomplete
 
 
 class StatusFilter(admin.SimpleListFilter):
@@ -50,7 +53,7 @@ class CandidateFilter(admin.SimpleListFilter):
 
 
 @admin.register(ProductUnit)
-class ProductUnitAdmin(admin.ModelAdmin):
+class ProductUnitAdmin(LazyFilterMixin, KeysetPaginationMixin, admin.ModelAdmin):
     list_display = (
         'serial_number',
         'product_link',
@@ -62,7 +65,15 @@ class ProductUnitAdmin(admin.ModelAdmin):
         'created_at'
     )
     list_display_links = ('serial_number', 'product_link')
-    list_filter = (CandidateFilter, StatusFilter, 'status', 'product__category', 'request_item__request')
+    # Все колонки списка берутся одним запросом (см. тест в unit/tests.py)
+    list_select_related = ('product', 'request_item', 'delivery_item')
+    list_filter = (
+        CandidateFilter,
+        StatusFilter,
+        'status',
+        ('product__category', LazyRelatedFieldListFilter),
+        ('request_item__request', LazyRelatedFieldListFilter),
+    )
     search_fields = ('serial_number', 'product__name', 'product__code', 'request_item__request__id')
     readonly_fields = ('created_at', 'updated_at', 'request_info')
     actions = [
@@ -86,6 +97,29 @@ class ProductUnitAdmin(admin.ModelAdmin):
         }),
     )
 
+    # Поле строки заявки, для которого автодополнение предлагает только кандидатов
+    CANDIDATE_AUTOCOMPLETE_FIELDS = {('request', 'requestitem', 'product_unit')}
+
+    def get_search_results(self, request, queryset, search_term):
+        if is_autocomplete(request):
+            # Выпадающий список автодополнения: новые единицы первыми, сортировка
+            # по ключу (created_at, id) - следующие страницы выбираются по индексу
+            queryset = queryset.order_by('-created_at', '-id')
+            if autocomplete_source(request) in self.CANDIDATE_AUTOCOMPLETE_FIELDS:
+                queryset = queryset.filter(status='candidate_in_request')
+
+        # Серийный номер ищется по префиксу через его индекс, товар - через
+        # полнотекстовый индекс товаров, номер заявки - точным совпадением
+        condition = search.product_q(search_term, product_field='product', using=queryset.db)
+        if condition is None:
+            return super().get_search_results(request, queryset, search_term)
+
+        term = search_term.strip()
+        condition |= search.prefix_q('serial_number', term)
+        if term.isdigit():
+            condition |= Q(request_item__request_id=int(term))
+        return queryset.filter(condition), False
+
     # Методы для отображения в списке
     def product_link(self, obj):
         if obj.product:
@@ -128,20 +162,18 @@ class ProductUnitAdmin(admin.ModelAdmin):
     is_candidate.short_description = 'Кандидат?'
 
     def purchase_price_display(self, obj):
-        if hasattr(obj, 'get_purchase_price'):
-            price = obj.get_purchase_price()
-            return f"{price} ₽" if price else "-"
-        return "-"
+        price = obj.get_purchase_price()
+        return f"{price} ₽" if price else "-"
 
     purchase_price_display.short_description = 'Цена'
 
     def document_links(self, obj):
         links = []
-        if obj.request_item:
-            url = reverse('admin:request_requestitem_change', args=[obj.request_item.id])
+        if obj.request_item_id:
+            url = reverse('admin:request_requestitem_change', args=[obj.request_item_id])
             links.append(f'<a href="{url}">📝 Заявка</a>')
-        if obj.delivery_item:
-            url = reverse('admin:warehouse_deliveryitem_change', args=[obj.delivery_item.id])
+        if obj.delivery_item_id:
+            url = reverse('admin:delivery_deliveryitem_change', args=[obj.delivery_item_id])
             links.append(f'<a href="{url}">🚚 Поставка</a>')
         return format_html(' '.join(links)) if links else "-"
 
@@ -149,11 +181,11 @@ class ProductUnitAdmin(admin.ModelAdmin):
 
     def request_link(self, obj):
         if obj.request_item:
-            url = reverse('admin:request_request_change', args=[obj.request_item.request.id])
+            url = reverse('admin:request_request_change', args=[obj.request_item.request_id])
             return format_html(
                 '<a href="{}">📋 Заявка #{}</a>',
                 url,
-                obj.request_item.request.id
+                obj.request_item.request_id
             )
         return "-"
 
@@ -161,12 +193,14 @@ class ProductUnitAdmin(admin.ModelAdmin):
 
     def request_info(self, obj):
         if obj.request_item:
-            url = reverse('admin:request_request_change', args=[obj.request_item.request.id])
+            from request.models import RequestItem
+            request_id = obj.request_item.request_id
+            url = reverse('admin:request_request_change', args=[request_id])
             return format_html(
                 '<a href="{}">Заявка #{}</a> ({} позиций)',
                 url,
-                obj.request_item.request.id,
-                obj.request_item.request.items.count()
+                request_id,
+                RequestItem.objects.filter(request_id=request_id).count()
             )
         return "-"
 
@@ -182,10 +216,10 @@ class ProductUnitAdmin(admin.ModelAdmin):
             self.message_user(request, "Нет подходящих единиц", messages.WARNING)
             return
 
-        updated = valid_units.update(status='candidate_in_request')
+        result = valid_units.transition('candidate_in_request')
         self.message_user(
             request,
-            f"Обновлено {updated} единиц",
+            f"Обновлено {result.moved} единиц",
             messages.SUCCESS
         )
 
@@ -212,36 +246,70 @@ class ProductUnitAdmin(admin.ModelAdmin):
 
     @admin.action(description="📝 Создать заявку из кандидатов")
     def create_request_from_candidates(self, request, queryset):
-        from request.models import Request, RequestItem
+        from request.models import Request
         candidates = queryset.filter(status='candidate_in_request')
 
-        if not candidates.exists():
+        units_count = candidates.count()
+        if not units_count:
             self.message_user(request, "Нет кандидатов", messages.WARNING)
             return
 
         request_obj = Request.objects.create(
-            notes=f"Автоматически создана из {candidates.count()} кандидатов"
+            notes=f"Автоматически создана из {units_count} кандидатов"
         )
-
-        for unit in candidates:
-            RequestItem.objects.create(
-                request=request_obj,
-                product_unit=unit,
-                quantity=1,
-                price_per_unit=unit.get_purchase_price() or 0,
-                supplier=unit.product.main_supplier if hasattr(unit, 'product') else None
-            )
-            unit.status = 'in_request'
-            unit.save()
+        # Одна строка заявки на товар x цену, единицы привязываются к строкам
+        lines = request_obj.add_units(candidates)
 
         self.message_user(
             request,
-            f"Создана заявка #{request_obj.id} с {candidates.count()} позициями",
+            f"Создана заявка #{request_obj.id}: {len(lines)} позиций, {units_count} единиц",
             messages.SUCCESS
         )
         return HttpResponseRedirect(reverse('admin:request_request_change', args=[request_obj.id]))
 
     @admin.action(description="🔄 Сбросить статус")
     def reset_to_created_status(self, request, queryset):
-        queryset.update(status='created')
-        self.message_user(request, "Статусы сброшены", messages.SUCCESS)
\ No newline at end of file
+        result = queryset.transition('create_empty')
+        level = messages.WARNING if result.rejected else messages.SUCCESS
+        self.message_user(
+            request,
+            f"Статусы сброшены: {result.moved}, отклонено: {result.rejected}",
+            level
+        )
+
+
+@admin.register(InventoryCounter)
+class InventoryCounterAdmin(admin.ModelAdmin):
+    """Остатки по статусам (только просмотр - ведутся автоматически)"""
+    list_display = ('product', 'status', 'count')
+    list_filter = ('status',)
+    search_fields = ('product__name', 'product__code')
+    list_select_related = ('product',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedProductUnit)
+class ArchivedProductUnitAdmin(KeysetPaginationMixin, admin.ModelAdmin):
+    """Архив закрытых единиц (только просмотр - заполняется командой archive_product_units)"""
+    list_display = ('serial_number', 'product', 'status', 'purchase_price', 'sale_price', 'sale_date', 'archived_at')
+    list_filter = ('status',)
+    search_fields = ('serial_number',)
+    list_select_related = ('product',)
+    ordering = ('-updated_at', '-id')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,120 @@
+import hashlib
+
+from django.contrib import admin
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Count
+from django.http import Http404, JsonResponse
+from django.urls import path, reverse
+
+
+class LazyRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    Фильтр списка по связанной модели с большим числом записей (заявки, товары).
+
+    Стандартный RelatedFieldListFilter выводит в боковую панель все записи связанной
+    модели при каждой загрузке списка. Этот фильтр выводит только выбранное значение,
+    а варианты подгружает по запросу - с поиском (get_search_results админки связанной
+    модели) и постранично, вместе с числом записей для каждого варианта.
+    Админка, в которой он используется, должна подключать LazyFilterMixin.
+    """
+    template = 'admin/unit/lazy_related_filter.html'
+
+    def field_choices(self, field, request, model_admin):
+        # Сразу загружается только выбранный вариант
+        if not self.lookup_val:
+            return []
+        try:
+            objects = field.remote_field.model._default_manager.filter(pk__in=self.lookup_val)
+            return [(obj.pk, str(obj)) for obj in objects]
+        except (ValueError, ValidationError):
+            return []
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        # Ссылка на вариант: к текущим параметрам списка добавляется значение фильтра
+        self.options_url = reverse(
+            f'admin:{changelist.opts.app_label}_{changelist.opts.model_name}_filter_options',
+            args=[self.field_path]
+        )
+        self.query_string_template = changelist.get_query_string(
+            {self.lookup_kwarg: '__value__'}, [self.lookup_kwarg_isnull]
+        )
+        yield from super().choices(changelist)
+
+
+class LazyFilterMixin:
+    """Представление вариантов LazyRelatedFieldListFilter для ModelAdmin"""
+    filter_options_page_size = 20
+    filter_counts_cache_timeout = 300
+
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path(
+                'filter-options/<str:field_path>/',
+                self.admin_site.admin_view(self.filter_options_view),
+                name='%s_%s_filter_options' % info
+            ),
+        ] + super().get_urls()
+
+    def filter_options_view(self, request, field_path):
+        """
+        Страница вариантов фильтра в JSON: {results: [{id, text, count}], pagination: {more}}.
+        Параметры: term - строка поиска, page - номер страницы.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        if not any(
+            isinstance(item, (tuple, list)) and item[0] == field_path
+            and issubclass(item[1], LazyRelatedFieldListFilter)
+            for item in self.get_list_filter(request)
+        ):
+            raise Http404
+
+        related_model = get_fields_from_path(self.model, field_path)[-1].remote_field.model
+        related_admin = self.admin_site.get_model_admin(related_model)
+        ordering = related_admin.get_ordering(request) or related_model._meta.ordering
+        queryset = related_model._default_manager.order_by(*ordering, '-pk')
+        term = request.GET.get('term', '').strip()
+        if term:
+            queryset, use_distinct = related_admin.get_search_results(request, queryset, term)
+            if use_distinct:
+                queryset = queryset.distinct()
+
+        # Без COUNT(*): берётся на одну запись больше страницы, чтобы узнать, есть ли следующая
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            raise Http404
+        size = self.filter_options_page_size
+        objects = list(queryset[(page - 1) * size:page * size + 1])
+        counts = self.filter_option_counts(field_path, [obj.pk for obj in objects[:size]])
+        return JsonResponse({
+            'results': [
+                {'id': str(obj.pk), 'text': str(obj), 'count': counts.get(obj.pk, 0)}
+                for obj in objects[:size]
+            ],
+            'pagination': {'more': len(objects) > size},
+        })
+
+    def filter_option_counts(self, field_path, ids):
+        """
+        {id варианта: число записей} одним GROUP BY по вариантам страницы.
+        Считается по всей таблице (без других фильтров списка) и кэшируется.
+        """
+        if not ids:
+            return {}
+        digest = hashlib.md5(','.join(map(str, ids)).encode(), usedforsecurity=False).hexdigest()
+        key = f'lazy-filter-counts:{self.opts.label_lower}:{field_path}:{digest}'
+        counts = cache.get(key)
+        if counts is None:
+            counts = dict(
+                self.model._default_manager.filter(**{f'{field_path}__in': ids})
+                .order_by().values_list(field_path).annotate(count=Count('pk'))
+            )
+            cache.set(key, counts, self.filter_counts_cache_timeout)
+        return counts
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from unit.models import ArchivedProductUnit
+
+
+class Command(BaseCommand):
+    help = 'Переносит закрытые единицы товаров (продан, сломан, утерян, передан) в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.UNIT_ARCHIVE_AFTER_DAYS,
+            help='Архивировать единицы, не менявшиеся дольше стольких дней'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество единиц в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        archived = ArchivedProductUnit.archive(
+            timedelta(days=options['days']),
+            chunk_size=options['chunk_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f"Перенесено в архив: {archived}"))
@@ -0,0 +1,267 @@
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from customers.models import Customer
+from delivery.models import Delivery, DeliveryItem
+from goods.models import Category, Product
+from request.models import Request, RequestItem
+from suppliers.models import Supplier
+from unit.models import ProductUnit, SerialNumberCounter
+
+SCALES = {
+    'small': 10_000,
+    'medium': 1_000_000,
+    'large': 10_000_000,
+}
+
+# Распределение статусов единиц (доли), близкое к живому магазину
+STATUS_WEIGHTS = {
+    'create_empty': 3,
+    'candidate_in_request': 3,
+    'in_request': 5,
+    'in_delivery': 4,
+    'in_request_cancelled': 1,
+    'in_store': 30,
+    'sold': 45,
+    'broken': 3,
+    'lost': 1,
+    'transferred': 3,
+    'extra_add_delivery': 2,
+}
+
+# Статусы, в которых единица прошла через заявку / поставку
+# (без заявки в поставку попадают только экстренные единицы extra_add_delivery)
+REQUESTED_STATUSES = {
+    'in_request', 'in_delivery', 'in_request_cancelled', 'in_store', 'sold', 'broken', 'lost', 'transferred'
+}
+DELIVERED_STATUSES = {'in_delivery', 'in_store', 'sold', 'broken', 'lost', 'transferred', 'extra_add_delivery'}
+
+CATEGORY_WORDS = [
+    'Инструменты', 'Электроинструмент', 'Ручной инструмент', 'Крепёж', 'Сантехника', 'Электрика',
+    'Освещение', 'Сад и огород', 'Лакокрасочные материалы', 'Стройматериалы', 'Отделка',
+    'Измерительный инструмент', 'Расходные материалы', 'Хранение', 'Спецодежда', 'Клей и герметики',
+]
+PRODUCT_NOUNS = [
+    'Дрель', 'Шуруповёрт', 'Перфоратор', 'Болгарка', 'Лобзик', 'Пила', 'Рубанок', 'Молоток', 'Отвёртка',
+    'Ключ', 'Уровень', 'Рулетка', 'Степлер', 'Краскопульт', 'Фен строительный', 'Паяльник', 'Клещи',
+    'Кусачки', 'Ножовка', 'Стремянка', 'Фонарь', 'Удлинитель', 'Смеситель', 'Шланг', 'Секатор',
+]
+PRODUCT_ADJECTIVES = [
+    'аккумуляторный', 'ударный', 'сетевой', 'профессиональный', 'бытовой', 'компактный', 'усиленный',
+    'угловой', 'циркулярный', 'ёмкий', 'лёгкий', 'магнитный', 'телескопический', 'универсальный',
+]
+BRANDS = ['Зубр', 'Интерскол', 'Вихрь', 'Калибр', 'Энкор', 'Ресанта', 'Диолд', 'Кратон', 'Фиолент', 'Сибртех']
+SUPPLIER_NAMES = ['ТехноСнаб', 'СтройОпт', 'ИнструментТорг', 'МастерПоставка', 'ПромРесурс', 'ОптимаТрейд']
+CUSTOMER_NAMES = ['Иванов', 'Петров', 'Сидорова', 'Кузнецов', 'Смирнова', 'Попов', 'Васильева', 'Новиков']
+CUSTOMER_KINDS = ['ИП', 'ООО', 'Частное лицо']
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет БД согласованными синтетическими данными (категории, товары, поставщики, клиенты, '
+        'заявки, поставки, единицы) для замеров производительности'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=SCALES, default='small',
+            help='Объём: small - 10 тыс., medium - 1 млн, large - 10 млн единиц'
+        )
+        parser.add_argument('--units', type=int, help='Точное количество единиц (вместо --scale)')
+        parser.add_argument('--seed', type=int, default=42, help='Начальное значение генератора случайных чисел')
+        parser.add_argument(
+            '--prefix', default='GEN',
+            help='Префикс кодов товаров - позволяет загрузить несколько наборов в одну БД'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Единиц в одной транзакции')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        units_total = options['units'] or SCALES[options['scale']]
+        batch_size = options['batch_size']
+
+        if Product.objects.filter(code__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f'Товары с префиксом "{self.prefix}" уже есть - укажите другой --prefix')
+
+        started = time.monotonic()
+        with transaction.atomic():
+            categories = self.create_categories()
+            products = self.create_products(max(50, units_total // 40), categories)
+            self.suppliers = self.create_suppliers(min(500, max(10, units_total // 20_000)))
+            self.create_customers(min(100_000, max(100, units_total // 50)))
+        self.log(f'Справочники: {len(categories)} категорий, {len(products)} товаров', started)
+
+        # Популярность товаров убывает по закону Ципфа
+        self.product_ids = [product.pk for product in products]
+        self.product_weights = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(products))))
+        self.base_prices = {
+            product.pk: self.random.randint(5, 2000) * 10 for product in products
+        }
+        self.status_names = list(STATUS_WEIGHTS)
+        self.status_weights = list(accumulate(STATUS_WEIGHTS.values()))
+
+        created = 0
+        while created < units_total:
+            count = min(batch_size, units_total - created)
+            with transaction.atomic():
+                self.create_units_batch(count)
+            created += count
+            self.log(f'Единиц: {created} из {units_total}', started)
+
+    def log(self, message, started):
+        self.stdout.write(f'[{time.monotonic() - started:7.1f} с] {message}')
+
+    # === Справочники ===
+    def create_categories(self):
+        """Дерево категорий: корни со случайным числом потомков до третьего уровня"""
+        categories = []
+
+        def add_level(parents, depth):
+            level = []
+            for parent in parents:
+                names = CATEGORY_WORDS if parent is None else PRODUCT_NOUNS
+                for name in self.random.sample(names, self.random.randint(2, 6)):
+                    title = name if parent is None else f'{parent.name} / {name}'
+                    level.append(Category(
+                        name=title, slug=f'{self.prefix.lower()}-category-{len(categories) + len(level)}', parent=parent
+                    ))
+            Category.objects.bulk_create(level)
+            categories.extend(level)
+            if depth < 3:
+                add_level([category for category in level if self.random.random() < 0.7], depth + 1)
+
+        add_level([None], 1)
+        # bulk_create минует save() - пути дерева пересчитываются одним проходом
+        Category.rebuild_paths()
+        return categories
+
+    def create_products(self, count, categories):
+        parent_ids = {category.parent_id for category in categories}
+        leaves = [category for category in categories if category.pk not in parent_ids]
+        products = [
+            Product(
+                code=f'{self.prefix}-{index:07d}',
+                name=' '.join([
+                    self.random.choice(PRODUCT_NOUNS),
+                    self.random.choice(PRODUCT_ADJECTIVES),
+                    self.random.choice(BRANDS),
+                ]),
+                description=f'Модель {self.random.randint(100, 9999)}, гарантия {self.random.randint(1, 5)} г.',
+                category=self.random.choice(leaves),
+            )
+            for index in range(count)
+        ]
+        return Product.objects.bulk_create(products, batch_size=1000)
+
+    def create_suppliers(self, count):
+        return Supplier.objects.bulk_create([
+            Supplier(
+                name=f'{self.random.choice(SUPPLIER_NAMES)} {self.prefix}-{index}',
+                contact_person=self.random.choice(CUSTOMER_NAMES),
+                phone=f'+7{self.random.randint(10 ** 9, 10 ** 10 - 1)}',
+            )
+            for index in range(count)
+        ])
+
+    def create_customers(self, count):
+        Customer.objects.bulk_create([
+            Customer(
+                name=f'{self.random.choice(CUSTOMER_KINDS)} {self.random.choice(CUSTOMER_NAMES)} {index}',
+                phone=f'+7{self.random.randint(10 ** 9, 10 ** 10 - 1)}',
+            )
+            for index in range(count)
+        ], batch_size=1000)
+
+    # === Единицы с заявками и поставками ===
+    def create_units_batch(self, count):
+        """
+        Порция единиц вместе с заявками и поставками, через которые они прошли.
+        Число запросов на порцию не зависит от её размера (кроме разбиения bulk_create).
+        """
+        today = date.today()
+        plans = []
+        for _ in range(count):
+            status = self.random.choices(self.status_names, cum_weights=self.status_weights)[0]
+            product_id = self.random.choices(self.product_ids, cum_weights=self.product_weights)[0]
+            plans.append((product_id, status, status in REQUESTED_STATUSES))
+
+        # Заявки: по ~25 единиц, строка заявки - товар в заявке с количеством
+        requested = [plan for plan in plans if plan[2]]
+        requests = Request.objects.bulk_create([
+            Request(is_completed=self.random.random() < 0.8) for _ in range(len(requested) // 25 + 1)
+        ])
+        unit_requests = [self.random.choice(requests) for _ in requested]
+        line_quantities = Counter(
+            (request.pk, product_id) for request, (product_id, _, _) in zip(unit_requests, requested)
+        )
+        request_items = RequestItem.objects.bulk_create([
+            RequestItem(
+                request_id=request_id,
+                product_id=product_id,
+                quantity=quantity,
+                supplier=self.random.choice(self.suppliers),
+                price_per_unit=self.base_prices[product_id],
+            )
+            for (request_id, product_id), quantity in line_quantities.items()
+        ], batch_size=1000)
+        request_item_ids = {(item.request_id, item.product_id): item.pk for item in request_items}
+        request_by_unit = iter(unit_requests)
+
+        # Поставки: по ~200 единиц, позиция поставки - товар в поставке
+        delivered = [plan for plan in plans if plan[1] in DELIVERED_STATUSES]
+        deliveries = Delivery.objects.bulk_create([
+            Delivery(
+                supplier=self.random.choice(self.suppliers),
+                delivery_date=today - timedelta(days=self.random.randint(0, 730)),
+                is_confirmed=True,
+            )
+            for _ in range(len(delivered) // 200 + 1)
+        ])
+        unit_deliveries = [self.random.choice(deliveries) for _ in delivered]
+        quantities = Counter(
+            (delivery.pk, product_id) for delivery, (product_id, _, _) in zip(unit_deliveries, delivered)
+        )
+        delivery_items = DeliveryItem.objects.bulk_create([
+            DeliveryItem(
+                delivery_id=delivery_id,
+                product_id=product_id,
+                quantity_expected=quantity,
+                quantity_received=quantity,
+                price_per_unit=self.base_prices[product_id],
+            )
+            for (delivery_id, product_id), quantity in quantities.items()
+        ], batch_size=1000)
+        delivery_item_ids = {(item.delivery_id, item.product_id): item.pk for item in delivery_items}
+        delivery_by_unit = iter(unit_deliveries)
+
+        # Серийные номера резервируются одним блоком на товар
+        serial_blocks = {
+            product_id: iter(block)
+            for product_id, block in SerialNumberCounter.reserve(Counter(plan[0] for plan in plans)).items()
+        }
+
+        units = []
+        for product_id, status, from_request in plans:
+            unit = ProductUnit(
+                product_id=product_id,
+                status=status,
+                serial_number=ProductUnit.format_serial_number(product_id, next(serial_blocks[product_id])),
+                request_item_id=request_item_ids[(next(request_by_unit).pk, product_id)] if from_request else None,
+                is_extra_add_delivery_item=status == 'extra_add_delivery',
+            )
+            if status in DELIVERED_STATUSES:
+                delivery = next(delivery_by_unit)
+                unit.delivery_item_id = delivery_item_ids[(delivery.pk, product_id)]
+                unit.delivery_date = delivery.delivery_date
+            if status == 'sold':
+                unit.sale_date = min(today, unit.delivery_date + timedelta(days=self.random.randint(0, 90)))
+                unit.sale_price = round(self.base_prices[product_id] * self.random.uniform(1.2, 1.8), 2)
+            units.append(unit)
+        ProductUnit.objects.bulk_create(units, batch_size=1000)
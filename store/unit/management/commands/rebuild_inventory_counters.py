@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from unit.models import InventoryCounter
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики остатков (товар x статус) по таблице единиц'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product', type=int, action='append', dest='product_ids',
+            help='ID товара (можно указать несколько раз); по умолчанию - все товары'
+        )
+
+    def handle(self, *args, **options):
+        InventoryCounter.rebuild(product_ids=options['product_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Счётчиков после пересчёта: {InventoryCounter.objects.count()}"
+        ))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_inventory_counters(apps, schema_editor):
+    ProductUnit = apps.get_model('unit', 'ProductUnit')
+    InventoryCounter = apps.get_model('unit', 'InventoryCounter')
+    rows = ProductUnit.objects.order_by().values_list('product_id', 'status').annotate(n=Count('pk'))
+    InventoryCounter.objects.bulk_create(
+        [InventoryCounter(product_id=product_id, status=status, count=n) for product_id, status, n in rows],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0001_initial'),
+        ('unit', '0006_serialnumbercounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('create_empty', 'Создан пустым'), ('candidate_in_request', 'Кандидат на заявку'), ('in_request', 'В заявке'), ('in_delivery', 'В поставке'), ('in_request_cancelled', 'В заявке - отменен'), ('in_store', 'В магазине'), ('sold', 'Продан'), ('broken', 'Сломан'), ('lost', 'Утерян'), ('transferred', 'Передан'), ('extra_add_delivery', 'Экстренно вставлен в поставку')], max_length=25, verbose_name='Статус')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Количество')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_counters', to='goods.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Остаток по статусу',
+                'verbose_name_plural': 'Остатки по статусам',
+                'constraints': [models.UniqueConstraint(fields=('product', 'status'), name='unique_inventory_counter')],
+            },
+        ),
+        migrations.RunPython(fill_inventory_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0001_initial'),
+        ('goods', '0001_initial'),
+        ('request', '0002_remove_requestitem_product_requestitem_product_unit'),
+        ('unit', '0007_inventorycounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productunit',
+            index=models.Index(fields=['created_at', 'id'], name='unit_produc_created_e6b345_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0001_initial'),
+        ('goods', '0002_product_search_index'),
+        ('request', '0003_alter_requestitem_product_unit'),
+        ('unit', '0008_productunit_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedProductUnit',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID единицы')),
+                ('serial_number', models.CharField(max_length=100, unique=True, verbose_name='Серийный номер')),
+                ('status', models.CharField(choices=[('create_empty', 'Создан пустым'), ('candidate_in_request', 'Кандидат на заявку'), ('in_request', 'В заявке'), ('in_delivery', 'В поставке'), ('in_request_cancelled', 'В заявке - отменен'), ('in_store', 'В магазине'), ('sold', 'Продан'), ('broken', 'Сломан'), ('lost', 'Утерян'), ('transferred', 'Передан'), ('extra_add_delivery', 'Экстренно вставлен в поставку')], max_length=25, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата последнего изменения')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+                ('delivery_date', models.DateField(blank=True, null=True)),
+                ('store_arrival_date', models.DateTimeField(blank=True, null=True)),
+                ('is_extra_add_delivery_item', models.BooleanField(default=False, verbose_name='Экстренная поставка (без заявки)')),
+                ('purchase_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Цена закупки')),
+                ('sale_date', models.DateField(blank=True, null=True, verbose_name='Дата продажи')),
+                ('sale_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Цена продажи')),
+                ('delivery_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_units', to='delivery.deliveryitem', verbose_name='Позиция поставки')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_units', to='goods.product', verbose_name='Товар')),
+                ('request_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_units', to='request.requestitem', verbose_name='Позиция заявки')),
+            ],
+            options={
+                'verbose_name': 'Архивная единица товара',
+                'verbose_name_plural': 'Архив единиц товаров',
+                'ordering': ['-updated_at'],
+                'indexes': [models.Index(fields=['product', 'status'], name='unit_archiv_product_558d14_idx'), models.Index(fields=['sale_date'], name='unit_archiv_sale_da_a7f80e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('request', '0004_requestitem_product'),
+        ('unit', '0009_archivedproductunit'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productunit',
+            name='request_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='units', to='request.requestitem', verbose_name='Позиция заявки'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0002_deliveryitem_received_at'),
+        ('goods', '0002_product_search_index'),
+        ('request', '0004_requestitem_product'),
+        ('unit', '0010_alter_productunit_request_item'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productunit',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='unit_produc_status_c84134_idx'),
+        ),
+    ]
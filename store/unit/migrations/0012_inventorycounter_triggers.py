@@ -0,0 +1,64 @@
+from django.db import migrations
+from django.db.models import Count
+
+# Счётчики остатков ведут триггеры на unit_productunit: любой INSERT, DELETE
+# или UPDATE статуса/товара (в т.ч. массовый) остаётся одним запросом, а
+# прежние значения берутся из самой строки, а не из загруженного экземпляра.
+# SQL зафиксирован в миграции, как и индекс FTS в goods/0002
+INCREMENT_NEW = (
+    "INSERT INTO unit_inventorycounter (product_id, status, count) VALUES (new.product_id, new.status, 1) "
+    "ON CONFLICT (product_id, status) DO UPDATE SET count = count + 1;"
+)
+DECREMENT_OLD = (
+    "UPDATE unit_inventorycounter SET count = count - 1 "
+    "WHERE product_id = old.product_id AND status = old.status;"
+)
+
+CREATE_TRIGGERS_SQL = [
+    f"CREATE TRIGGER unit_inventorycounter_ai AFTER INSERT ON unit_productunit BEGIN {INCREMENT_NEW} END",
+    f"CREATE TRIGGER unit_inventorycounter_ad AFTER DELETE ON unit_productunit BEGIN {DECREMENT_OLD} END",
+    "CREATE TRIGGER unit_inventorycounter_au AFTER UPDATE OF product_id, status ON unit_productunit "
+    "WHEN old.product_id IS NOT new.product_id OR old.status IS NOT new.status "
+    f"BEGIN {DECREMENT_OLD} {INCREMENT_NEW} END",
+]
+DROP_TRIGGERS_SQL = [
+    "DROP TRIGGER IF EXISTS unit_inventorycounter_ai",
+    "DROP TRIGGER IF EXISTS unit_inventorycounter_ad",
+    "DROP TRIGGER IF EXISTS unit_inventorycounter_au",
+]
+
+
+def create_triggers(apps, schema_editor):
+    # Проект работает на SQLite; на других СУБД нужны свои триггеры
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_TRIGGERS_SQL:
+        schema_editor.execute(sql)
+
+    # Точка отсчёта для триггеров - счётчики, пересчитанные по таблице единиц
+    ProductUnit = apps.get_model('unit', 'ProductUnit')
+    InventoryCounter = apps.get_model('unit', 'InventoryCounter')
+    InventoryCounter.objects.all().delete()
+    rows = ProductUnit.objects.order_by().values_list('product_id', 'status').annotate(n=Count('pk'))
+    InventoryCounter.objects.bulk_create(
+        [InventoryCounter(product_id=product_id, status=status, count=n) for product_id, status, n in rows],
+        batch_size=1000
+    )
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_TRIGGERS_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unit', '0011_productunit_status_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -1,11 +1,176 @@
+from collections import namedtuple
+
 from django.db import models
 from django.core.exceptions import ValidationError
 from datetime import datetime
 from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import reverse
 
 
+class SerialNumberCounter(models.Model):
+    """
+    Счётчик серийных номеров товара.
+    Номера выдаются блоками: один UPDATE резервирует сразу весь диапазон,
+    поэтому параллельные воркеры не пересекаются.
+    """
+    product = models.OneToOneField(
+        'goods.Product',
+        on_delete=models.CASCADE,
+        related_name='serial_counter',
+        verbose_name='Товар'
+    )
+    last_value = models.PositiveBigIntegerField(
+        'Последний выданный номер',
+        default=0
+    )
+
+    # Ограничение на число товаров в одном UPDATE (лимит параметров SQLite)
+    RESERVE_CHUNK_SIZE = 500
+
+    class Meta:
+        verbose_name = 'Счётчик серийных номеров'
+        verbose_name_plural = 'Счётчики серийных номеров'
+
+    def __str__(self):
+        return f"{self.product_id}: {self.last_value}"
+
+    @classmethod
+    def reserve(cls, counts):
+        """
+        Резервирует блоки номеров.
+        Принимает {product_id: количество}, возвращает {product_id: range номеров}.
+        """
+        counts = {product_id: n for product_id, n in counts.items() if n > 0}
+        product_ids = list(counts)
+        blocks = {}
+
+        for start in range(0, len(product_ids), cls.RESERVE_CHUNK_SIZE):
+            chunk = product_ids[start:start + cls.RESERVE_CHUNK_SIZE]
+            with transaction.atomic():
+                cls.objects.bulk_create(
+                    [cls(product_id=product_id) for product_id in chunk],
+                    ignore_conflicts=True
+                )
+                # Строки счётчиков блокируются до конца транзакции
+                cls.objects.filter(product_id__in=chunk).update(
+                    last_value=F('last_value') + Case(
+                        *[When(product_id=product_id, then=Value(counts[product_id])) for product_id in chunk],
+                        output_field=models.PositiveBigIntegerField()
+                    )
+                )
+                last_values = dict(
+                    cls.objects.filter(product_id__in=chunk).values_list('product_id', 'last_value')
+                )
+            for product_id in chunk:
+                last = last_values[product_id]
+                blocks[product_id] = range(last - counts[product_id] + 1, last + 1)
+
+        return blocks
+
+
+TransitionResult = namedtuple('TransitionResult', ['moved', 'rejected'])
+
+
+class ProductUnitQuerySet(models.QuerySet):
+    def transition(self, new_status, **fields):
+        """
+        Массовый перевод единиц в статус new_status одним UPDATE.
+        Запрещённые переходы отсекаются прямо в WHERE, единицы уже в new_status не трогаются.
+        Дополнительные поля (в т.ч. выражения F/Subquery) обновляются вместе со статусом.
+        Возвращает TransitionResult(moved, rejected).
+        """
+        if new_status not in dict(self.model.STATUS_CHOICES):
+            raise ValidationError(f'Неизвестный статус "{new_status}"')
+
+        pending = self.exclude(status=new_status)
+        with transaction.atomic(using=self.db):
+            total = pending.count()
+            moved = pending.exclude(
+                status__in=self.model.FORBIDDEN_TRANSITIONS.get(new_status, [])
+            ).update(status=new_status, updated_at=timezone.now(), **fields)
+        return TransitionResult(moved, total - moved)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        bulk_create не вызывает save(), поэтому номера выдаются здесь блоками.
+        Счётчики остатков увеличивают триггеры (см. InventoryCounter).
+        """
+        objs = list(objs)
+        self.model.assign_serial_numbers(objs)
+        created = super().bulk_create(objs, *args, **kwargs)
+        InventoryCounter.invalidate_availability({unit.product_id for unit in created})
+        return created
+
+    def update(self, **kwargs):
+        """UPDATE одним запросом; при смене статуса или товара сбрасывается кэш наличия"""
+        rows = super().update(**kwargs)
+        if rows and {'status', 'product', 'product_id'} & set(kwargs):
+            # Какие товары затронуты, без чтения строк неизвестно - сбрасывается весь кэш
+            InventoryCounter.invalidate_availability()
+        return rows
+
+    def delete(self):
+        result = super().delete()
+        if result[0]:
+            InventoryCounter.invalidate_availability()
+        return result
+
+    def arrive_in_store(self, serial_numbers):
+        """
+        Приход единиц в магазин по отсканированным серийным номерам.
+        Номера разрешаются одним запросом, единицы из поставки переводятся в in_store
+        одним условным UPDATE. Возвращает {serial_number: результат}, где результат -
+        'stored', 'already_in_store', 'not_found' или 'wrong_status'.
+        """
+        serial_numbers = list(dict.fromkeys(serial_numbers))
+        arrived_at = timezone.now()
+        stored = set()
+        with transaction.atomic(using=self.db):
+            # Строки блокируются: повторный скан того же номера параллельно ждёт
+            # и видит уже in_store (где блокировки есть)
+            found = dict(
+                self.select_for_update().filter(serial_number__in=serial_numbers)
+                .values_list('serial_number', 'status')
+            )
+            arriving = [serial for serial, status in found.items() if status in self.model.ARRIVING_STATUSES]
+            if arriving:
+                self.filter(
+                    serial_number__in=arriving,
+                    status__in=self.model.ARRIVING_STATUSES
+                ).transition('in_store', store_arrival_date=arrived_at)
+                # Результаты - по строкам, которые перевёл именно этот UPDATE (отметка
+                # store_arrival_date), а не по прочитанному до него: номер, принятый
+                # параллельным сканом, получит already_in_store
+                found.update({serial: None for serial in arriving})
+                for serial, status, arrival in self.filter(serial_number__in=arriving).values_list(
+                    'serial_number', 'status', 'store_arrival_date'
+                ):
+                    found[serial] = status
+                    if status == 'in_store' and arrival == arrived_at:
+                        stored.add(serial)
+
+        results = {}
+        for serial in serial_numbers:
+            status = found.get(serial)
+            if serial in stored:
+                results[serial] = 'stored'
+            elif status is None:
+                results[serial] = 'not_found'
+            elif status == 'in_store':
+                results[serial] = 'already_in_store'
+            else:
+                results[serial] = 'wrong_status'
+        return results
+
+    def count_by_product_and_status(self):
+        """Количество единиц в наборе: {(product_id, status): n}"""
+        rows = self.order_by().values_list('product_id', 'status').annotate(n=Count('pk'))
+        return {(product_id, status): n for product_id, status, n in rows}
+
 
 class ProductUnit(models.Model):
     STATUS_CHOICES = [
@@ -22,6 +187,17 @@ class ProductUnit(models.Model):
         ('extra_add_delivery', 'Экстренно вставлен в поставку'),
     ]
 
+    # Статусы, из которых единица может прийти в магазин
+    ARRIVING_STATUSES = ['in_delivery', 'extra_add_delivery']
+
+    # Запрещённые переходы: новый статус -> список статусов, из которых в него нельзя перейти
+    FORBIDDEN_TRANSITIONS = {
+        'sold': ['create_empty', 'candidate_in_request', 'in_request', 'in_request_cancelled'],
+        'broken': ['sold'],
+        'lost': ['sold'],
+        'transferred': ['sold'],
+    }
+
     # Основные поля
     product = models.ForeignKey(
         'goods.Product',
@@ -52,7 +228,8 @@ class ProductUnit(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
-        verbose_name='Позиция заявки'
+        verbose_name='Позиция заявки',
+        related_name='units'
     )
     delivery_item = models.ForeignKey(
         'delivery.DeliveryItem',
@@ -90,6 +267,8 @@ class ProductUnit(models.Model):
     )
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductUnitQuerySet.as_manager()
+
     def mark_as_candidate(self):
         """Перевод в кандидаты на заявку"""
         if self.status == 'created':
@@ -103,6 +282,10 @@ class ProductUnit(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['serial_number']),
             models.Index(fields=['sale_date']),
+            # Постраничный поиск по ключу сортировки списка (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+            # Автодополнение кандидатов в заявку: статус + та же сортировка
+            models.Index(fields=['status', 'created_at', 'id']),
         ]
         ordering = ['-created_at']
 
@@ -110,29 +293,115 @@ class ProductUnit(models.Model):
         return f"{self.serial_number} ({self.get_status_display()})"
 
     # === Методы генерации и валидации ===
+    @staticmethod
+    def format_serial_number(product_id, number):
+        """Серийный номер формата: RF-{product_id}-{номер из счётчика}"""
+        return f"RF-{product_id}-{number:07d}"
+
     @classmethod
     def generate_serial_number(cls, product):
-        """Генерация уникального серийного номера формата: RF-{product_id}-{timestamp}-{random_part}"""
+        """Выдача одного серийного номера из счётчика товара"""
         if not product or not product.pk:
             raise ValidationError("Товар должен быть сохранён перед генерацией номера.")
 
-        base_prefix = f"RF-{product.id}-"
-        timestamp = datetime.now().strftime("%d%m%H%M%S")
-        random_part = f"{datetime.now().microsecond:06d}"[:6]
-
-        serial_number = f"{base_prefix}{timestamp}-{random_part}"
+        number = SerialNumberCounter.reserve({product.pk: 1})[product.pk][0]
+        return cls.format_serial_number(product.pk, number)
 
-        if cls.objects.filter(serial_number=serial_number).exists():
-            raise ValidationError("Не удалось сгенерировать уникальный серийный номер.")
+    @classmethod
+    def assign_serial_numbers(cls, units):
+        """Заполняет пустые serial_number у несохранённых единиц (по блоку на товар)"""
+        pending = {}
+        for unit in units:
+            if not unit.serial_number:
+                if not unit.product_id:
+                    raise ValidationError("Товар должен быть сохранён перед генерацией номера.")
+                pending.setdefault(unit.product_id, []).append(unit)
 
-        return serial_number
+        blocks = SerialNumberCounter.reserve(
+            {product_id: len(group) for product_id, group in pending.items()}
+        )
+        for product_id, group in pending.items():
+            for unit, number in zip(group, blocks[product_id]):
+                unit.serial_number = cls.format_serial_number(product_id, number)
+        return units
 
-    @transaction.atomic
     def save(self, *args, **kwargs):
-        """Автоматическая генерация serial_number при создании"""
+        """
+        Автоматическая генерация serial_number при создании.
+        Для загруженных из БД экземпляров пишутся только изменённые поля,
+        а если ничего не изменилось - запрос не выполняется вовсе.
+        """
         if not self.pk and not self.serial_number:
             self.serial_number = self.generate_serial_number(self.product)
+        elif not args and not kwargs:
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                if not dirty:
+                    return
+                kwargs['update_fields'] = [
+                    self._meta.get_field(attname).name for attname in dirty
+                ] + ['updated_at']
+
+        update_fields = kwargs.get('update_fields')
         super().save(*args, **kwargs)
+        # Счётчики остатков меняют триггеры (по строке в БД, а не по загруженной копии)
+        if update_fields is None or {'status', 'product', 'product_id'} & set(update_fields):
+            InventoryCounter.invalidate_availability(
+                {self.product_id, self.get_loaded_value('product_id', self.product_id)}
+            )
+        self._loaded_values = self._get_field_values()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        InventoryCounter.invalidate_availability([self.product_id])
+        return result
+
+    # === Отслеживание загруженного состояния ===
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминает значения полей, с которыми экземпляр был загружен"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        """Перечитанные поля становятся новой точкой отсчёта для get_dirty_fields"""
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        refreshed = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+            and (fields is None or field.name in fields or field.attname in fields)
+        }
+        self._loaded_values = {**getattr(self, '_loaded_values', {}), **refreshed}
+
+    def _get_field_values(self):
+        """Текущие значения загруженных (не отложенных) полей"""
+        return {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def get_loaded_value(self, attname, default=None):
+        """Значение поля на момент загрузки из БД (или последнего save)"""
+        return getattr(self, '_loaded_values', {}).get(attname, default)
+
+    def get_dirty_fields(self):
+        """
+        Изменённые с момента загрузки поля: {attname: старое значение}.
+        Отложенное при загрузке поле, которому присвоено значение, тоже
+        изменено (старое значение неизвестно - None).
+        None - если экземпляр не загружался из БД и сравнивать не с чем.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or not self.pk:
+            return None
+        return {
+            attname: loaded.get(attname)
+            for attname, value in self._get_field_values().items()
+            if attname not in loaded or value != loaded[attname]
+        }
 
     # === Методы для работы со статусами ===
     @transaction.atomic
@@ -182,21 +451,15 @@ class ProductUnit(models.Model):
         if not self.pk:  # Новая запись - проверка не требуется
             return
 
-        old_status = ProductUnit.objects.get(pk=self.pk).status
+        old_status = self.get_loaded_value('status')
+        if old_status is None:
+            old_status = ProductUnit.objects.get(pk=self.pk).status
         new_status = self.status
 
-        # Запрещённые переходы
-        forbidden_transitions = {
-            'sold': ['create_empty', 'candidate_in_request', 'in_request', 'in_request_cancelled'],
-            'broken': ['sold'],
-            'lost': ['sold'],
-            'transferred': ['sold'],
-        }
-
-        if old_status in forbidden_transitions.get(new_status, []):
+        if old_status in self.FORBIDDEN_TRANSITIONS.get(new_status, []):
             raise ValidationError(
                 {
-                    'status': f'Нельзя перевести статус из "{self.get_status_display(old_status)}" в "{self.get_status_display()}"'}
+                    'status': f'Нельзя перевести статус из "{dict(self.STATUS_CHOICES).get(old_status)}" в "{self.get_status_display()}"'}
             )
 
     def _validate_document_links(self):
@@ -228,4 +491,179 @@ class ProductUnit(models.Model):
             if self.sale_date or self.sale_price:
                 raise ValidationError(
                     {'status': 'Поля продажи заполнены, но статус не "sold"'}
-                )
\ No newline at end of file
+                )
+
+
+class InventoryCounter(models.Model):
+    """
+    Количество единиц товара в каждом статусе.
+    Поддерживается триггерами SQLite на таблице единиц (миграция
+    unit/0012): при вставке, удалении и смене статуса или товара - в том
+    числе в массовых операциях, которые остаются одним запросом.
+    """
+    product = models.ForeignKey(
+        'goods.Product',
+        on_delete=models.CASCADE,
+        related_name='inventory_counters',
+        verbose_name='Товар'
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=25,
+        choices=ProductUnit.STATUS_CHOICES
+    )
+    count = models.BigIntegerField('Количество', default=0)
+
+    class Meta:
+        verbose_name = 'Остаток по статусу'
+        verbose_name_plural = 'Остатки по статусам'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'status'], name='unique_inventory_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} / {self.status}: {self.count}"
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls, product_ids=None):
+        """Пересчёт счётчиков по таблице единиц (всех товаров или только product_ids)"""
+        counters = cls.objects.all()
+        units = ProductUnit.objects.all()
+        if product_ids is not None:
+            counters = counters.filter(product_id__in=product_ids)
+            units = units.filter(product_id__in=product_ids)
+
+        counters.delete()
+        rows = units.order_by().values_list('product_id', 'status').annotate(n=Count('pk'))
+        cls.objects.bulk_create(
+            [cls(product_id=product_id, status=status, count=n) for product_id, status, n in rows],
+            batch_size=1000
+        )
+        cls.invalidate_availability(product_ids)
+
+    @staticmethod
+    def invalidate_availability(product_ids=None):
+        """Сброс кэша наличия товаров - сразу и после фиксации транзакции"""
+        from goods.availability import cache
+
+        if product_ids is not None:
+            product_ids = list(product_ids)
+            if not product_ids:
+                return
+        cache.invalidate(product_ids)
+        transaction.on_commit(lambda: cache.invalidate(product_ids))
+
+    @classmethod
+    def get_counts(cls, product_id):
+        """Остатки товара по статусам: {status: count}"""
+        return dict(
+            cls.objects.filter(product_id=product_id, count__gt=0).values_list('status', 'count')
+        )
+
+
+class ArchivedProductUnit(models.Model):
+    """
+    Закрытая (проданная, списанная, переданная) единица товара, перенесённая из
+    рабочей таблицы ProductUnit. id совпадает с id исходной единицы, цена закупки
+    сохраняется копией, чтобы отчёты не зависели от позиций поставок.
+    """
+    id = models.BigIntegerField('ID единицы', primary_key=True)
+    product = models.ForeignKey(
+        'goods.Product',
+        on_delete=models.PROTECT,
+        verbose_name='Товар',
+        related_name='archived_units'
+    )
+    serial_number = models.CharField('Серийный номер', max_length=100, unique=True)
+    status = models.CharField('Статус', max_length=25, choices=ProductUnit.STATUS_CHOICES)
+    created_at = models.DateTimeField('Дата создания')
+    updated_at = models.DateTimeField('Дата последнего изменения')
+    archived_at = models.DateTimeField('Дата архивации', auto_now_add=True)
+
+    request_item = models.ForeignKey(
+        'request.RequestItem',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Позиция заявки',
+        related_name='archived_units'
+    )
+    delivery_item = models.ForeignKey(
+        'delivery.DeliveryItem',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Позиция поставки',
+        related_name='archived_units'
+    )
+    delivery_date = models.DateField(null=True, blank=True)
+    store_arrival_date = models.DateTimeField(null=True, blank=True)
+    is_extra_add_delivery_item = models.BooleanField('Экстренная поставка (без заявки)', default=False)
+
+    purchase_price = models.DecimalField('Цена закупки', max_digits=10, decimal_places=2, null=True, blank=True)
+    sale_date = models.DateField('Дата продажи', null=True, blank=True)
+    sale_price = models.DecimalField('Цена продажи', max_digits=10, decimal_places=2, null=True, blank=True)
+
+    # Статусы, после которых единица больше не меняется и может быть перенесена в архив
+    CLOSED_STATUSES = ['sold', 'broken', 'lost', 'transferred']
+
+    # Поля, копируемые из ProductUnit как есть
+    COPIED_FIELDS = [
+        'id', 'product_id', 'serial_number', 'status', 'created_at', 'updated_at',
+        'delivery_item_id', 'delivery_date', 'store_arrival_date',
+        'is_extra_add_delivery_item', 'sale_date', 'sale_price',
+    ]
+
+    class Meta:
+        verbose_name = 'Архивная единица товара'
+        verbose_name_plural = 'Архив единиц товаров'
+        indexes = [
+            models.Index(fields=['product', 'status']),
+            models.Index(fields=['sale_date']),
+        ]
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return f"{self.serial_number} ({self.get_status_display()}, архив)"
+
+    @classmethod
+    def archive(cls, older_than, statuses=None, chunk_size=1000):
+        """
+        Переносит закрытые единицы, не менявшиеся дольше older_than (timedelta),
+        из ProductUnit в архив порциями по chunk_size - каждая в своей транзакции,
+        поэтому таблица единиц не блокируется надолго. Возвращает число перенесённых.
+        """
+        from request.models import RequestItem
+
+        statuses = statuses or cls.CLOSED_STATUSES
+        candidates = ProductUnit.objects.filter(
+            status__in=statuses,
+            updated_at__lt=timezone.now() - older_than
+        ).order_by('pk')
+
+        archived = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    candidates.select_for_update(of=('self',))
+                    .values(
+                        *cls.COPIED_FIELDS,
+                        purchase_price=F('delivery_item__price_per_unit'),
+                        # Позиция заявки: ссылка единицы или позиция, ссылающаяся на единицу
+                        linked_request_item_id=Coalesce(
+                            'request_item_id',
+                            Subquery(RequestItem.objects.filter(product_unit=OuterRef('pk')).values('pk')[:1])
+                        )
+                    )[:chunk_size]
+                )
+                if not rows:
+                    break
+                cls.objects.bulk_create([
+                    cls(request_item_id=row.pop('linked_request_item_id'), **row) for row in rows
+                ])
+                # У позиций заявок ссылка на единицу обнуляется (SET_NULL),
+                # связь остаётся в ArchivedProductUnit.request_item
+                ProductUnit.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            archived += len(rows)
+        return archived
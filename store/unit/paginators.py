@@ -0,0 +1,153 @@
+import hashlib
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class KeysetPaginator(Paginator):
+    """
+    Пагинатор для больших списков админки.
+
+    Страница N выбирается поиском по ключу сортировки
+    (WHERE created_at <= x AND (created_at < x OR id < y)), а не через OFFSET:
+    последняя строка каждой отданной страницы запоминается в кэше, поэтому
+    переход на следующую страницу стоит столько же, сколько первая.
+    Если граница неизвестна (прямой переход на далёкую страницу) - один раз
+    используется OFFSET. Общее количество берётся из оценки СУБД, а точный
+    COUNT(*) для больших списков кэшируется; небольшие списки считаются честно.
+    """
+    count_cache_timeout = 300
+    boundary_cache_timeout = 3600
+    # Начиная с этого размера используется оценка СУБД (для списка без фильтров)
+    # или закэшированный COUNT(*)
+    estimate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        key = self._cache_key('count', self.object_list.order_by())
+        count = cache.get(key)
+        if count is None:
+            count = self._estimate_count()
+            if count is None:
+                count = self.object_list.count()
+            if count >= self.estimate_threshold:
+                cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        ordering = self._keyset_ordering
+        boundary = None
+        if ordering and number > 1:
+            boundary = cache.get(self._cache_key(f'page-{number - 1}', self.object_list))
+
+        if boundary is not None:
+            object_list = self.object_list.filter(self._seek_filter(ordering, boundary))[:self.per_page]
+        else:
+            bottom = (number - 1) * self.per_page
+            object_list = self.object_list[bottom:bottom + self.per_page]
+
+        page = self._get_page(list(object_list), number, self)
+        if ordering and page.object_list:
+            last = page.object_list[-1]
+            cache.set(
+                self._cache_key(f'page-{number}', self.object_list),
+                [getattr(last, attname) for attname, _ in ordering],
+                self.boundary_cache_timeout
+            )
+        return page
+
+    @cached_property
+    def _keyset_ordering(self):
+        """
+        Сортировка списка в виде [(attname, по убыванию?)], если по ней можно
+        искать ключом: только собственные NOT NULL поля модели и pk последним.
+        Иначе None - тогда используется обычный OFFSET.
+        """
+        query = self.object_list.query
+        opts = query.model._meta
+        order_by = query.order_by or (opts.ordering if query.default_ordering else ())
+
+        ordering = []
+        for item in order_by:
+            if not isinstance(item, str) or '__' in item or item == '?':
+                return None
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.null:
+                return None
+            ordering.append((field.attname, descending))
+
+        if not ordering or ordering[-1][0] != opts.pk.attname:
+            return None
+        return ordering
+
+    @staticmethod
+    def _seek_filter(ordering, boundary):
+        """Условие "строго после boundary" для лексикографической сортировки"""
+        conditions = []
+        for index, (attname, descending) in enumerate(ordering):
+            condition = Q(**{f"{attname}__{'lt' if descending else 'gt'}": boundary[index]})
+            for prev_index in range(index):
+                condition &= Q(**{ordering[prev_index][0]: boundary[prev_index]})
+            conditions.append(condition)
+
+        # Граница по первому полю позволяет СУБД сразу сузить диапазон индекса
+        first_attname, first_descending = ordering[0]
+        bound = Q(**{f"{first_attname}__{'lte' if first_descending else 'gte'}": boundary[0]})
+        return bound & reduce(or_, conditions)
+
+    def _estimate_count(self):
+        """Оценка числа строк по статистике PostgreSQL (только для списка без фильтров)"""
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if not row or row[0] < self.estimate_threshold:
+            return None
+        return row[0]
+
+    @staticmethod
+    def _cache_key(prefix, queryset):
+        try:
+            sql = str(queryset.query)
+        except EmptyResultSet:
+            sql = 'empty'
+        digest = hashlib.md5(sql.encode(), usedforsecurity=False).hexdigest()
+        return f'keyset-paginator:{queryset.model._meta.label_lower}:{prefix}:{digest}'
+
+
+class KeysetPaginationMixin:
+    """Подключение KeysetPaginator к ModelAdmin без полного COUNT(*) по таблице"""
+    paginator = KeysetPaginator
+    show_full_result_count = False
+
+
+def is_autocomplete(request):
+    """Запрос к представлению автодополнения админки (виджет autocomplete_fields)"""
+    match = request.resolver_match
+    return match is not None and match.url_name == 'autocomplete'
+
+
+def autocomplete_source(request):
+    """(app_label, model_name, field_name) поля, для которого запрошено автодополнение"""
+    if not is_autocomplete(request):
+        return None
+    return tuple(request.GET.get(name) for name in ('app_label', 'model_name', 'field_name'))
@@ -1,3 +1,437 @@
+from datetime import date, timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q, Subquery
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from delivery.models import Delivery, DeliveryItem
+from goods.models import Category, Product
+from request.models import Request, RequestItem
+from suppliers.models import Supplier
+from .models import ArchivedProductUnit, InventoryCounter, ProductUnit, SerialNumberCounter
+from .paginators import KeysetPaginator
+
+
+class ProductUnitChangelistQueriesTest(TestCase):
+    """Число запросов списка единиц не должно зависеть от количества строк на странице"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Инструменты')
+        cls.product = Product.objects.create(code='RF-1', name='Дрель', category=category)
+        supplier = Supplier.objects.create(name='Поставщик')
+        delivery = Delivery.objects.create(supplier=supplier)
+        cls.delivery_item = DeliveryItem.objects.create(
+            delivery=delivery, product=cls.product, price_per_unit=100
+        )
+        seed_unit = ProductUnit.objects.create(product=cls.product)
+        cls.request_item = RequestItem.objects.create(
+            request=Request.objects.create(), product_unit=seed_unit, price_per_unit=100
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def create_units(self, count):
+        ProductUnit.objects.bulk_create([
+            ProductUnit(
+                product=self.product,
+                status='in_delivery',
+                request_item=self.request_item,
+                delivery_item=self.delivery_item,
+            )
+            for _ in range(count)
+        ])
+
+    def count_changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:unit_productunit_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self.create_units(5)
+        small_page = self.count_changelist_queries()
+
+        self.create_units(60)
+        full_page = self.count_changelist_queries()
+
+        self.assertEqual(small_page, full_page)
+
+
+class KeysetPaginatorTest(TestCase):
+    """Страницы, выбранные по ключу, совпадают со страницами через OFFSET"""
+
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(code='KP-1', name='Шуруповёрт')
+        ProductUnit.objects.bulk_create([ProductUnit(product=product) for _ in range(25)])
+
+    def setUp(self):
+        cache.clear()
+        self.queryset = ProductUnit.objects.order_by('-created_at', '-id')
+
+    def page_ids(self, paginator, number):
+        return [unit.pk for unit in paginator.page(number).object_list]
+
+    def test_pages_match_offset_pagination(self):
+        paginator = KeysetPaginator(self.queryset, 10)
+        expected = list(self.queryset.values_list('pk', flat=True))
+
+        pages = [self.page_ids(paginator, number) for number in paginator.page_range]
+
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_next_page_seeks_from_cached_boundary(self):
+        paginator = KeysetPaginator(self.queryset, 10)
+        paginator.page(1)
+
+        with CaptureQueriesContext(connection) as queries:
+            paginator.page(2)
+
+        self.assertNotIn('OFFSET', queries[-1]['sql'])
+
+    def test_ordering_without_pk_falls_back_to_offset(self):
+        paginator = KeysetPaginator(ProductUnit.objects.order_by('-created_at'), 10)
+
+        self.assertIsNone(paginator._keyset_ordering)
+
+
+class LazyRelatedFilterTest(TestCase):
+    """Фильтр по заявке не выводит все заявки, а подгружает варианты по запросу"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        product = Product.objects.create(code='LF-1', name='Дрель')
+        cls.requests = Request.objects.bulk_create([Request() for _ in range(25)])
+        items = RequestItem.objects.bulk_create([
+            RequestItem(request=request, product=product, quantity=2, price_per_unit=10)
+            for request in cls.requests[:2]
+        ])
+        ProductUnit.objects.bulk_create([
+            ProductUnit(product=product, status='in_request', request_item=item) for item in items for _ in range(2)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def options(self, **params):
+        url = reverse('admin:unit_productunit_filter_options', args=['request_item__request'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_changelist_renders_only_selected_request(self):
+        selected = self.requests[0]
+        response = self.client.get(
+            reverse('admin:unit_productunit_changelist'), {'request_item__request__id__exact': selected.pk}
+        )
+
+        self.assertContains(response, str(selected))
+        self.assertNotContains(response, str(self.requests[-1]))
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_options_are_paginated_searchable_and_counted(self):
+        first, _ = self.options()
+        second, _ = self.options(page=2)
+        found, _ = self.options(term=str(self.requests[1].pk))
+
+        self.assertEqual((len(first['results']), first['pagination']['more']), (20, True))
+        self.assertEqual((len(second['results']), second['pagination']['more']), (5, False))
+        self.assertEqual(found['results'], [{'id': str(self.requests[1].pk), 'text': str(self.requests[1]), 'count': 2}])
+
+    def test_option_counts_are_cached(self):
+        _, cold = self.options(page=2)
+        data, warm = self.options(page=2)
+
+        self.assertEqual(warm, cold - 1)
+        self.assertEqual(sorted(option['count'] for option in data['results']), [0, 0, 0, 2, 2])
+
+    def test_unknown_filter_is_not_found(self):
+        url = reverse('admin:unit_productunit_filter_options', args=['product'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class SerialNumberTest(TestCase):
+    """Серийные номера выдаются блоками из счётчика товара"""
+
+    def setUp(self):
+        self.drill = Product.objects.create(code='SN-1', name='Дрель')
+        self.saw = Product.objects.create(code='SN-2', name='Пила')
+
+    def numbers(self, units):
+        return [int(unit.serial_number.rsplit('-', 1)[1]) for unit in units]
+
+    def test_bulk_create_fills_contiguous_blocks(self):
+        units = ProductUnit.objects.bulk_create(
+            [ProductUnit(product=self.drill) for _ in range(3)] + [ProductUnit(product=self.saw) for _ in range(2)]
+        )
+
+        self.assertEqual(units[0].serial_number, ProductUnit.format_serial_number(self.drill.pk, 1))
+        self.assertEqual(self.numbers(units), [1, 2, 3, 1, 2])
+        self.assertEqual(ProductUnit.objects.exclude(serial_number='').count(), 5)
+
+    def test_blocks_do_not_overlap_across_calls(self):
+        first = ProductUnit.objects.bulk_create([ProductUnit(product=self.drill) for _ in range(3)])
+        single = ProductUnit.objects.create(product=self.drill)
+        second = ProductUnit.objects.bulk_create([ProductUnit(product=self.drill) for _ in range(2)])
+
+        self.assertEqual(self.numbers(first + [single] + second), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(SerialNumberCounter.objects.get(product=self.drill).last_value, 6)
+
+    def test_preset_serials_are_kept_and_not_counted(self):
+        units = ProductUnit.objects.bulk_create([
+            ProductUnit(product=self.drill, serial_number='LEGACY-1'),
+            ProductUnit(product=self.drill),
+        ])
+
+        self.assertEqual(units[0].serial_number, 'LEGACY-1')
+        self.assertEqual(self.numbers(units[1:]), [1])
+        self.assertEqual(SerialNumberCounter.objects.get(product=self.drill).last_value, 1)
+
+    def test_reserve(self):
+        blocks = SerialNumberCounter.reserve({self.drill.pk: 2, self.saw.pk: 0})
+        self.assertEqual(blocks, {self.drill.pk: range(1, 3)})
+        self.assertEqual(SerialNumberCounter.reserve({self.drill.pk: 3}), {self.drill.pk: range(3, 6)})
+        self.assertFalse(SerialNumberCounter.objects.filter(product=self.saw).exists())
+
+    def test_unsaved_product_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            ProductUnit.assign_serial_numbers([ProductUnit(product=Product(code='SN-3'))])
+
+
+class ProductUnitTransitionTest(TestCase):
+    """Массовый перевод единиц в статус одним UPDATE"""
+
+    def setUp(self):
+        self.product = Product.objects.create(code='TR-1', name='Рубанок')
+        statuses = ['in_request'] * 2 + ['in_store'] * 3 + ['sold']
+        self.units = ProductUnit.objects.bulk_create(
+            [ProductUnit(product=self.product, status=status) for status in statuses]
+        )
+
+    def test_counts_moved_and_rejected(self):
+        result = ProductUnit.objects.all().transition('sold', sale_date=date(2025, 3, 1), sale_price=10)
+
+        # in_request -> sold запрещён, уже проданная единица не считается ни там, ни там
+        self.assertEqual(result, (3, 2))
+        self.assertEqual(InventoryCounter.get_counts(self.product.pk), {'in_request': 2, 'sold': 4})
+        self.assertEqual(ProductUnit.objects.filter(status='sold', sale_price=10).count(), 3)
+
+    def test_units_already_in_status_are_not_touched(self):
+        sold = self.units[-1]
+        result = ProductUnit.objects.filter(pk=sold.pk).transition('sold')
+
+        self.assertEqual((result.moved, result.rejected), (0, 0))
+        self.assertEqual(ProductUnit.objects.get(pk=sold.pk).updated_at, sold.updated_at)
+
+    def test_forbidden_transition_is_rejected_in_sql(self):
+        result = ProductUnit.objects.filter(status='sold').transition('lost')
+
+        self.assertEqual(result, (0, 1))
+        self.assertEqual(ProductUnit.objects.filter(status='sold').count(), 1)
+
+    def test_statement_count_does_not_depend_on_units(self):
+        ProductUnit.objects.bulk_create([ProductUnit(product=self.product, status='in_delivery') for _ in range(300)])
+        with CaptureQueriesContext(connection) as queries:
+            result = ProductUnit.objects.filter(status='in_delivery').transition('in_store')
+
+        self.assertEqual(result.moved, 300)
+        self.assertEqual(len([query for query in queries if 'SAVEPOINT' not in query['sql']]), 2)
+
+    def test_unknown_status(self):
+        with self.assertRaises(ValidationError):
+            ProductUnit.objects.all().transition('teleported')
+
+
+class ProductUnitDirtyFieldsTest(TestCase):
+    """save() пишет только изменённые с момента загрузки поля"""
+
+    def test_refresh_from_db_resets_loaded_state(self):
+        product = Product.objects.create(code='DF-1', name='Фрезер')
+        unit = ProductUnit.objects.get(pk=ProductUnit.objects.create(product=product).pk)
+        ProductUnit.objects.filter(pk=unit.pk).update(status='in_store')
+
+        unit.refresh_from_db()
+        self.assertEqual(unit.status, 'in_store')
+        # Значение на момент первой загрузки - но после refresh это изменение
+        unit.status = 'create_empty'
+        unit.save()
+
+        self.assertEqual(ProductUnit.objects.get(pk=unit.pk).status, 'create_empty')
+        self.assertEqual(InventoryCounter.get_counts(product.pk), {'create_empty': 1})
+
+    def test_assigned_deferred_field_is_saved(self):
+        product = Product.objects.create(code='DF-2', name='Лобзик')
+        pk = ProductUnit.objects.create(product=product).pk
+        unit = ProductUnit.objects.only('id', 'status').get(pk=pk)
+
+        unit.sale_price = 5
+        self.assertEqual(unit.get_dirty_fields(), {'sale_price': None})
+        unit.save()
+
+        self.assertEqual(ProductUnit.objects.get(pk=pk).sale_price, 5)
+        # Прочитанное (догруженное) отложенное поле не считается изменённым
+        self.assertTrue(unit.serial_number)
+        self.assertEqual(unit.get_dirty_fields(), {})
+
+
+class InventoryCounterUpdateTest(TestCase):
+    """Счётчики остатков после массового UPDATE единиц"""
+
+    def setUp(self):
+        self.drill = Product.objects.create(code='IC-1', name='Дрель')
+        self.saw = Product.objects.create(code='IC-2', name='Пила')
+        ProductUnit.objects.bulk_create(
+            [ProductUnit(product=self.drill, status='in_store') for _ in range(3)]
+            + [ProductUnit(product=self.saw, status='in_delivery') for _ in range(2)]
+        )
+
+    def test_status_change(self):
+        rows = ProductUnit.objects.filter(product=self.saw).update(status='in_store')
+
+        self.assertEqual(rows, 2)
+        self.assertEqual(InventoryCounter.get_counts(self.saw.pk), {'in_store': 2})
+        self.assertEqual(InventoryCounter.get_counts(self.drill.pk), {'in_store': 3})
+
+    def test_product_from_expression(self):
+        ProductUnit.objects.filter(product=self.drill).update(
+            product_id=Subquery(Product.objects.filter(code='IC-2').values('pk')[:1])
+        )
+
+        self.assertEqual(InventoryCounter.get_counts(self.drill.pk), {})
+        self.assertEqual(InventoryCounter.get_counts(self.saw.pk), {'in_store': 3, 'in_delivery': 2})
+
+    def test_mass_update_is_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            ProductUnit.objects.all().update(status='lost')
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(InventoryCounter.get_counts(self.drill.pk), {'lost': 3})
+        self.assertEqual(InventoryCounter.get_counts(self.saw.pk), {'lost': 2})
+
+    def test_stale_copies_of_one_unit(self):
+        pk = ProductUnit.objects.filter(product=self.saw).values_list('pk', flat=True).first()
+        first, second = ProductUnit.objects.get(pk=pk), ProductUnit.objects.get(pk=pk)
+
+        first.status = 'in_store'
+        first.save()
+        second.status = 'lost'
+        second.save()
+
+        self.assertEqual(InventoryCounter.get_counts(self.saw.pk), {'in_delivery': 1, 'lost': 1})
+
+    def test_delete_and_save(self):
+        unit = ProductUnit.objects.filter(product=self.drill).first()
+        unit.product = self.saw
+        unit.save()
+        ProductUnit.objects.filter(product=self.saw, status='in_delivery').delete()
+
+        self.assertEqual(InventoryCounter.get_counts(self.drill.pk), {'in_store': 2})
+        self.assertEqual(InventoryCounter.get_counts(self.saw.pk), {'in_store': 1})
+
+    @skipUnless(connection.vendor == 'sqlite', 'Триггеры счётчиков есть только в SQLite')
+    def test_triggers_exist_after_migrate(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'unit_productunit'"
+            )
+            names = {name for name, in cursor.fetchall()}
+        # Пересоздание таблицы миграцией (ALTER в SQLite) удаляет триггеры
+        self.assertEqual(
+            names, {'unit_inventorycounter_ai', 'unit_inventorycounter_ad', 'unit_inventorycounter_au'}
+        )
+
+
+class ArchivedProductUnitTest(TestCase):
+    """Перенос закрытых единиц в архив"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(code='AR-1', name='Перфоратор')
+        delivery = Delivery.objects.create(supplier=Supplier.objects.create(name='Поставщик'))
+        cls.delivery_item = DeliveryItem.objects.create(
+            delivery=delivery, product=cls.product, price_per_unit=150
+        )
+
+    def create_unit(self, status):
+        unit = ProductUnit.objects.create(product=self.product, delivery_item=self.delivery_item)
+        ProductUnit.objects.filter(pk=unit.pk).update(status=status)
+        return unit
+
+    def test_archives_only_closed_units_older_than_age(self):
+        sold = ProductUnit.objects.create(product=self.product, delivery_item=self.delivery_item)
+        request_item = RequestItem.objects.create(
+            request=Request.objects.create(), product_unit=sold, price_per_unit=150
+        )
+        ProductUnit.objects.filter(pk=sold.pk).update(
+            status='sold', sale_date=date(2025, 1, 10), sale_price=300
+        )
+        in_store = self.create_unit('in_store')
+        fresh_lost = self.create_unit('lost')
+        ProductUnit.objects.filter(pk__in=[sold.pk, in_store.pk]).update(
+            updated_at=timezone.now() - timedelta(days=400)
+        )
+
+        archived = ArchivedProductUnit.archive(timedelta(days=365), chunk_size=1)
+
+        self.assertEqual(archived, 1)
+        self.assertEqual(
+            set(ProductUnit.objects.values_list('pk', flat=True)), {in_store.pk, fresh_lost.pk}
+        )
+        record = ArchivedProductUnit.objects.get(pk=sold.pk)
+        self.assertEqual(record.serial_number, sold.serial_number)
+        self.assertEqual((record.purchase_price, record.sale_price), (150, 300))
+        self.assertEqual(record.request_item, request_item)
+        self.assertEqual(InventoryCounter.get_counts(self.product.pk), {'in_store': 1, 'lost': 1})
+
+        request_item.refresh_from_db()
+        self.assertIsNone(request_item.product_unit)
+        self.assertEqual(request_item.product, self.product)
+
+
+class GenerateStoreDataTest(TestCase):
+    """Синтетический набор данных согласован и воспроизводим"""
+
+    def test_generates_consistent_dataset(self):
+        call_command('generate_store_data', units=500, batch_size=200, seed=7, stdout=StringIO())
+
+        self.assertEqual(ProductUnit.objects.count(), 500)
+        self.assertEqual(sum(counter.count for counter in InventoryCounter.objects.all()), 500)
+        self.assertFalse(ProductUnit.objects.filter(status='in_request', request_item=None).exists())
+        self.assertFalse(ProductUnit.objects.filter(status='in_store', delivery_item=None).exists())
+        self.assertEqual(
+            sum(RequestItem.objects.values_list('quantity', flat=True)),
+            ProductUnit.objects.exclude(request_item=None).count()
+        )
+        self.assertFalse(
+            ProductUnit.objects.filter(status='sold').filter(Q(sale_date=None) | Q(sale_price=None)).exists()
+        )
+
+    def test_same_seed_gives_same_dataset(self):
+        call_command('generate_store_data', units=100, seed=3, prefix='A', stdout=StringIO())
+        call_command('generate_store_data', units=100, seed=3, prefix='B', stdout=StringIO())
+
+        def statuses(prefix):
+            return list(
+                ProductUnit.objects.filter(product__code__startswith=f'{prefix}-')
+                .order_by('pk').values_list('status', 'product__code')
+            )
 
-# Create your tests here.
+        self.assertEqual(
+            statuses('A'), [(status, code.replace('B-', 'A-')) for status, code in statuses('B')]
+        )